@@ -4,7 +4,9 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import streamlit as st
-from db.db_manager import init_connection
+from db.db_manager import init_connection, readonly_connection
+from services.backup_logic import start_backup_scheduler
+from services.maintenance_logic import start_maintenance_scheduler
 from views import (
     config_management,
     employee_management,
@@ -43,6 +45,10 @@ if not conn:
     st.error("資料庫連線失敗，請檢查設定。")
     st.stop()
 
+# --- 背景自動備份 ---
+start_backup_scheduler()
+start_maintenance_scheduler()
+
 # --- 頁面路由 ---
 PAGES_ADMIN = {
     "👤 員工管理": employee_management,
@@ -82,6 +88,12 @@ PAGES_REPORTING = {
 
 ALL_PAGES = {**PAGES_ADMIN, **PAGES_ATTENDANCE, **PAGES_SALARY, **PAGES_REPORTING}
 
+# 只讀取資料的報表頁面：改用唯讀連線與一致的快照，長時間查詢不會影響薪資編輯等寫入作業
+READONLY_PAGES = {
+    annual_summary, nhi_summary, nhi_accountant_report,
+    salary_report, bank_transfer_report, employee_report
+}
+
 # --- Streamlit 側邊欄 UI ---
 st.sidebar.title("HRIS 人資系統 v1.0")
 
@@ -104,7 +116,10 @@ selected_page_name = st.sidebar.radio(
 
 # 執行選定的頁面
 page_to_show = ALL_PAGES.get(selected_page_name)
-if page_to_show:
+if page_to_show in READONLY_PAGES:
+    with readonly_connection() as report_conn:
+        page_to_show.show_page(report_conn)
+elif page_to_show:
     page_to_show.show_page(conn)
 else:
     st.warning(f"頁面「{selected_page_name}」功能似乎未正確對應，請檢查 app.py。")
\ No newline at end of file
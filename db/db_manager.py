@@ -1,5 +1,7 @@
 # db/db_manager.py
 import sqlite3
+import threading
+import contextlib
 import streamlit as st
 from pathlib import Path
 import sys # 引用 sys 模組
@@ -22,18 +24,115 @@ SCHEMA_PATH = Path(__file__).parent / "schema.sql"
 
 DATA_DIR.mkdir(exist_ok=True)
 
-@st.cache_resource
+_local = threading.local()
+
 def init_connection():
-    """建立並快取資料庫連線。"""
+    """
+    取得目前執行緒的資料庫連線 (每個 Streamlit session 執行緒各一條，執行緒結束時自動關閉)。
+    資料庫使用 WAL 模式，讀取可彼此並行；所有寫入則由 db.writer 的單一寫入執行緒負責。
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        return conn
     print(f"--- [INFO] Connecting to database at: {DB_PATH} ---")
     try:
         conn = sqlite3.connect(DB_PATH, check_same_thread=False)
         conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout = 30000")
+        conn.execute("PRAGMA journal_mode = WAL")
+        _local.conn = conn
         return conn
     except sqlite3.Error as e:
         st.error(f"資料庫連線失敗: {e}")
         return None
 
+@contextlib.contextmanager
+def readonly_connection(snapshot: bool = True):
+    """
+    開啟一條唯讀 (mode=ro) 的報表專用連線，離開 with 區塊時自動關閉。
+    snapshot=True 時整段期間處於同一個讀取交易中，WAL 模式下所有查詢看到的是同一個一致的快照，
+    且不會阻擋寫入執行緒。最近的已封存年度會事先 ATTACH；頁面查詢更早的封存年度時，
+    attach_archive() 會結束目前的讀取交易、載入後重新開始 (該次查詢起讀到新的快照)。
+    """
+    conn = sqlite3.connect(f"file:{DB_PATH.as_posix()}?mode=ro", uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute("PRAGMA busy_timeout = 30000")
+        conn.execute("PRAGMA query_only = ON")
+        from db import queries_archive as q_archive
+        for year in q_archive.get_archived_years(conn)[-q_archive.MAX_ATTACHED_ARCHIVES:]:
+            q_archive.attach_archive(conn, year)
+        if snapshot:
+            conn.execute("BEGIN")
+        yield conn
+    finally:
+        conn.close()
+
+# 依年份篩選快照時會被裁切的資料表與其年份欄位 (其餘如員工、級距、歷史設定等資料表完整保留)
+_SNAPSHOT_YEAR_FILTERS = {
+    'attendance': "CAST(STRFTIME('%Y', date) AS INTEGER)",
+    'leave_record': "CAST(STRFTIME('%Y', start_date) AS INTEGER)",
+    'special_attendance': "CAST(STRFTIME('%Y', date) AS INTEGER)",
+    'salary': "year",
+    'monthly_bonus': "year",
+    'monthly_bonus_details': "year",
+    'monthly_performance_bonus': "year",
+    'monthly_loan': "year",
+    'monthly_attendance_summary': "year",
+    'monthly_leave_summary': "year",
+}
+
+@contextlib.contextmanager
+def memory_snapshot(source_conn=None, year: int = None):
+    """
+    以 backup API 將資料庫複製到記憶體 (:memory:) 中，供大量查詢的年度報表或模擬試算使用，
+    離開 with 區塊時快照即被丟棄；在快照上的寫入不會影響正式資料庫。
+    - source_conn：複製來源 (例如報表的唯讀快照連線)，未指定時另開一條唯讀連線。
+    - year：只保留該年度的出勤、請假、薪資等資料，並把已封存的該年度資料併入快照。
+    """
+    own_source = source_conn is None
+    if own_source:
+        source_conn = sqlite3.connect(f"file:{DB_PATH.as_posix()}?mode=ro", uri=True, check_same_thread=False)
+    mem = sqlite3.connect(":memory:", check_same_thread=False)
+    mem.row_factory = sqlite3.Row
+    try:
+        source_conn.backup(mem)
+        if own_source:
+            source_conn.close()
+            own_source = False
+
+        for pragma in ("journal_mode = OFF", "synchronous = OFF", "temp_store = MEMORY",
+                       "cache_size = -65536", "locking_mode = EXCLUSIVE", "foreign_keys = OFF"):
+            mem.execute(f"PRAGMA {pragma}")
+        # 快照不需要異動紀錄，先移除觸發器以免裁切資料時產生多餘的寫入
+        for (trigger,) in mem.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+            mem.execute(f"DROP TRIGGER {trigger}")
+        mem.execute("DELETE FROM change_log")
+
+        if year is not None:
+            year = int(year)
+            for table, year_expr in _SNAPSHOT_YEAR_FILTERS.items():
+                mem.execute(f"DELETE FROM {table} WHERE {year_expr} IS NOT ?", (year,))
+            mem.execute("DELETE FROM salary_detail WHERE salary_id NOT IN (SELECT id FROM salary)")
+            # 併入已封存的該年度資料，使快照自成一體
+            from db import queries_archive as q_archive
+            if q_archive.is_year_archived(mem, year):
+                mem.commit()
+                schema = q_archive.attach_archive(mem, year)
+                for table in q_archive.ARCHIVED_TABLES:
+                    cols = ', '.join(r[1] for r in mem.execute(f"PRAGMA {schema}.table_info({table})").fetchall())
+                    mem.execute(f"INSERT INTO main.{table} ({cols}) SELECT {cols} FROM {schema}.{table}")
+                mem.commit()
+                mem.execute(f"DETACH DATABASE {schema}")
+            mem.execute("DELETE FROM archive_registry")
+        mem.commit()
+        mem.execute("PRAGMA optimize")
+        yield mem
+    finally:
+        if own_source:
+            source_conn.close()
+        mem.close()
+
 def init_db():
     """讀取 schema.sql 檔案並執行以建立所有資料表。"""
     if not SCHEMA_PATH.exists():
@@ -49,6 +148,10 @@ def init_db():
             schema_sql = f.read()
         cursor.executescript(schema_sql)
         conn.commit()
+        conn.execute("PRAGMA journal_mode = WAL")
+        # 重建每月出勤/請假彙總表，確保既有資料也有對應的彙總
+        from db.queries_monthly_summary import rebuild_monthly_summaries
+        rebuild_monthly_summaries(conn)
         print("--- [SUCCESS] Database tables initialized successfully. ---")
     except sqlite3.Error as e:
         print(f"資料庫初始化時發生錯誤: {e}")
@@ -3,6 +3,9 @@
 資料庫查詢：專門處理員工的「常態薪資項設定(employee_salary_item)」，如固定津貼/扣款。
 """
 import pandas as pd
+from . import queries_employee as q_emp
+from . import queries_salary_items as q_items
+from db.writer import serialized_write
 
 def get_employee_recurring_items(conn, emp_id, year, month):
     """
@@ -81,6 +84,7 @@ def get_settings_grouped_by_amount(conn, salary_item_id):
         for amount, group in df.groupby('amount')
     }
 
+@serialized_write
 def batch_add_or_update_employee_salary_items(conn, employee_ids, salary_item_id, amount, start_date, end_date, note):
     """批次新增或更新員工的常態薪資設定"""
     cursor = conn.cursor()
@@ -104,13 +108,14 @@ def batch_add_or_update_employee_salary_items(conn, employee_ids, salary_item_id
         conn.rollback()
         raise e
 
+@serialized_write
 def batch_upsert_allowances(conn, df: pd.DataFrame):
     """從 DataFrame 批次新增或更新員工常態薪資項。"""
     cursor = conn.cursor()
     report = {'inserted': 0, 'updated': 0, 'failed': 0, 'errors': []}
     
-    emp_map = pd.read_sql("SELECT name_ch, id FROM employee", conn).set_index('name_ch')['id'].to_dict()
-    item_map = pd.read_sql("SELECT name, id FROM salary_item", conn).set_index('name')['id'].to_dict()
+    emp_map = q_emp.get_employee_id_map(conn)
+    item_map = q_items.get_item_id_map(conn)
 
     sql = """
     INSERT INTO employee_salary_item (employee_id, salary_item_id, amount, start_date, end_date, note)
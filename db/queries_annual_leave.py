@@ -0,0 +1,93 @@
+# db/queries_annual_leave.py
+"""
+資料庫查詢：特休台帳 (annual_leave_ledger)。
+台帳由 services/annual_leave_logic.sync_annual_leave_ledger() 維護：
+第一次 (或 change_log 水位過期時) 整批重建，之後只重寫請假或到職/離職日有異動的員工。
+"""
+import pandas as pd
+from db.writer import serialized_write
+
+LEDGER_COLUMNS = [
+    'employee_id', 'cycle_no', 'period_start', 'period_end', 'entitled_days',
+    'used_hours', 'used_days', 'remaining_days', 'settle_year', 'settle_month', 'status',
+]
+
+
+def get_ledger_state(conn):
+    """取得台帳的維護狀態 {watermark, as_of, rebuilt_at}；尚未建立過時回傳 None。"""
+    row = conn.execute(
+        "SELECT watermark, as_of, rebuilt_at FROM annual_leave_ledger_state WHERE id = 1"
+    ).fetchone()
+    if not row:
+        return None
+    return {'watermark': row[0], 'as_of': row[1], 'rebuilt_at': row[2]}
+
+
+def get_ledger_cycles(conn):
+    """取得台帳中所有員工的週期與已休時數 (供比對應有的週期是否已存在、沿用未受異動影響的已休時數)。"""
+    return pd.read_sql_query(
+        "SELECT employee_id, cycle_no, period_start, period_end, entitled_days, used_hours, status FROM annual_leave_ledger",
+        conn
+    )
+
+
+def get_employee_ledger(conn, employee_id):
+    """
+    取得單一員工的特休台帳 (新到舊)。
+    可結算的週期若在結算月份已有定版 (final) 的薪資單，狀態顯示為「已結算」。
+    """
+    query = """
+    SELECT l.cycle_no, l.period_start, l.period_end, l.entitled_days, l.used_days, l.remaining_days,
+           l.settle_year, l.settle_month,
+           CASE WHEN l.status = '過期 (可結算)' AND EXISTS (
+                    SELECT 1 FROM salary s
+                    WHERE s.employee_id = l.employee_id AND s.year = l.settle_year
+                      AND s.month = l.settle_month AND s.status = 'final')
+                THEN '已結算' ELSE l.status END as status
+    FROM annual_leave_ledger l
+    WHERE l.employee_id = ?
+    ORDER BY l.cycle_no DESC
+    """
+    return pd.read_sql_query(query, conn, params=(int(employee_id),))
+
+
+def get_unused_leave_for_settlement(conn, year, month):
+    """取得在指定薪資月份應折發工資的未休特休天數 (依員工加總)。"""
+    query = """
+    SELECT employee_id, SUM(remaining_days) as remaining_days
+    FROM annual_leave_ledger
+    WHERE settle_year = ? AND settle_month = ? AND remaining_days > 0
+    GROUP BY employee_id
+    """
+    return pd.read_sql_query(query, conn, params=(int(year), int(month)))
+
+
+@serialized_write
+def replace_ledger_rows(conn, ledger_df: pd.DataFrame, employee_ids, watermark: int, as_of: str):
+    """
+    寫入台帳並更新水位：employee_ids 為 None 時整表重建，否則只刪除並重寫這些員工的週期。
+    ledger_df 需含 LEDGER_COLUMNS 的所有欄位。
+    """
+    cursor = conn.cursor()
+    try:
+        if employee_ids is None:
+            cursor.execute("DELETE FROM annual_leave_ledger")
+        else:
+            cursor.executemany(
+                "DELETE FROM annual_leave_ledger WHERE employee_id = ?", [(int(e),) for e in employee_ids]
+            )
+        rows = ledger_df[LEDGER_COLUMNS].astype(object).itertuples(index=False, name=None)
+        cursor.executemany(
+            f"INSERT INTO annual_leave_ledger ({', '.join(LEDGER_COLUMNS)}) VALUES ({', '.join('?' for _ in LEDGER_COLUMNS)})",
+            list(rows)
+        )
+        rebuilt_at = "CURRENT_TIMESTAMP" if employee_ids is None else "rebuilt_at"
+        cursor.execute(f"""
+            INSERT INTO annual_leave_ledger_state (id, watermark, as_of, rebuilt_at) VALUES (1, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(id) DO UPDATE SET watermark = excluded.watermark, as_of = excluded.as_of, rebuilt_at = {rebuilt_at}
+        """, (int(watermark), as_of))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(ledger_df)
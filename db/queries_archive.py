@@ -0,0 +1,240 @@
+# db/queries_archive.py
+"""
+資料庫查詢：年度封存 (archive)。
+已完全定版的過去年度，其 attendance、salary_detail、leave_record 會被搬移到
+data/archive/hr_archive_{年份}.db，主資料庫只保留近期資料。
+
+讀取端以 archived_source() 取得資料來源：若查詢的年份已封存，會自動 ATTACH 對應的封存檔，
+並回傳「主資料庫 UNION ALL 封存檔」的子查詢，原本的 SQL 只需把資料表名稱替換掉即可。
+"""
+import sqlite3
+from pathlib import Path
+import pandas as pd
+from db.reference_cache import cached_reference, bump_data_version
+from db.writer import serialized_write
+
+ARCHIVED_TABLES = ('attendance', 'salary_detail', 'leave_record')
+MAX_ATTACHED_ARCHIVES = 8  # SQLite 預設最多同時 ATTACH 10 個資料庫
+
+# 各資料表屬於哪個年度的判斷條件 (? 為年份字串)
+_YEAR_CONDITIONS = {
+    'attendance': "STRFTIME('%Y', {alias}date) = ?",
+    'leave_record': "STRFTIME('%Y', {alias}start_date) = ?",
+    'salary_detail': "{alias}salary_id IN (SELECT id FROM main.salary WHERE year = CAST(? AS INTEGER))",
+}
+
+_ARCHIVE_INDEXES = {
+    'attendance': ["employee_id", "date"],
+    'leave_record': ["employee_id", "start_date"],
+    'salary_detail': ["salary_id"],
+}
+
+
+def get_archive_dir() -> Path:
+    from db.db_manager import DATA_DIR
+    archive_dir = DATA_DIR / "archive"
+    archive_dir.mkdir(exist_ok=True)
+    return archive_dir
+
+
+def get_archive_path(year: int) -> Path:
+    return get_archive_dir() / f"hr_archive_{int(year)}.db"
+
+
+def _schema_name(year: int) -> str:
+    return f"arch_{int(year)}"
+
+
+@cached_reference('archive_registry')
+def get_archive_registry(conn):
+    """查詢所有已封存的年度。"""
+    return pd.read_sql_query("SELECT * FROM archive_registry ORDER BY year", conn)
+
+
+def get_archived_years(conn) -> list:
+    return [int(y) for y in get_archive_registry(conn)['year'].tolist()]
+
+
+def is_year_archived(conn, year: int) -> bool:
+    return int(year) in get_archived_years(conn)
+
+
+def ensure_years_not_archived(conn, years):
+    """寫入前檢查：已封存的年度為唯讀，不可再新增或修改其資料。"""
+    archived = set(get_archived_years(conn))
+    if not archived:
+        return
+    blocked = sorted({int(y) for y in years if pd.notna(y)} & archived)
+    if blocked:
+        raise ValueError(f"{', '.join(map(str, blocked))} 年的資料已封存，無法再寫入或修改。")
+
+
+def _attached_schemas(conn) -> list:
+    return [row[1] for row in conn.execute("PRAGMA database_list").fetchall()]
+
+
+def attach_archive(conn, year: int, keep=()) -> str:
+    """
+    確保指定年度的封存檔已 ATTACH 到此連線，回傳 schema 名稱。
+    超過上限時會先卸載較早載入的封存檔，但 keep 中的 schema (同一個查詢正在使用) 不會被卸載。
+    唯讀連線在讀取交易中遇到尚未載入的年度時，會結束目前的快照、載入後再開始新的讀取交易。
+    """
+    schema = _schema_name(year)
+    attached = _attached_schemas(conn)
+    if schema in attached:
+        return schema
+    path = get_archive_path(year)
+    if not path.exists():
+        raise FileNotFoundError(f"找不到 {year} 年的封存檔: {path}")
+    restart_read = False
+    if conn.in_transaction:
+        # 唯讀連線 (query_only) 的讀取交易沒有未寫入的異動，可先結束交易、載入後再重新開始 (之後的查詢讀到新的快照)
+        if not conn.execute("PRAGMA query_only").fetchone()[0]:
+            raise sqlite3.OperationalError(f"交易進行中無法載入 {year} 年的封存檔，請先呼叫 attach_archive()。")
+        conn.commit()
+        restart_read = True
+
+    try:
+        # 超過上限時先卸載其他封存檔
+        archive_schemas = [s for s in attached if s.startswith('arch_')]
+        removable = [s for s in archive_schemas if s not in keep]
+        excess = len(archive_schemas) - MAX_ATTACHED_ARCHIVES + 1
+        if excess > len(removable):
+            raise ValueError(f"同一個查詢最多只能同時使用 {MAX_ATTACHED_ARCHIVES} 個年度的封存檔。")
+        for old in removable[:max(0, excess)]:
+            conn.execute(f"DETACH DATABASE {old}")
+        conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+    finally:
+        if restart_read:
+            conn.execute("BEGIN")
+    return schema
+
+
+def _columns(conn, schema: str, table: str) -> list:
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})").fetchall()]
+
+
+def _wanted_archived_years(conn, years) -> list:
+    archived = get_archived_years(conn)
+    if years is not None:
+        wanted = {int(y) for y in years}
+        archived = [y for y in archived if y in wanted]
+    return archived
+
+
+def archive_year_batches(conn, years=None) -> list:
+    """
+    把查詢涉及的已封存年份切成每批最多 MAX_ATTACHED_ARCHIVES 個年度。
+    年份超過上限的查詢可逐批以 archived_source(..., include_main=False) 查詢封存檔後再合併。
+    """
+    archived = _wanted_archived_years(conn, years)
+    return [archived[i:i + MAX_ATTACHED_ARCHIVES] for i in range(0, len(archived), MAX_ATTACHED_ARCHIVES)]
+
+
+def archived_source(conn, table: str, years=None, include_main: bool = True) -> str:
+    """
+    回傳可放在 FROM 之後的資料來源。
+    years 為查詢涉及的年份 (None 代表全部年份)；其中已封存的年份會以 UNION ALL 併入。
+    沒有任何相關封存時直接回傳資料表名稱；include_main=False 時只包含封存檔。
+    涉及的封存年度超過 MAX_ATTACHED_ARCHIVES 時無法放進同一個查詢，會拋出 ValueError，
+    呼叫端需以 archive_year_batches() 分批查詢。
+    """
+    archived = _wanted_archived_years(conn, years)
+    if not archived:
+        return table if include_main else f"(SELECT * FROM main.{table} WHERE 0)"
+    if len(archived) > MAX_ATTACHED_ARCHIVES:
+        raise ValueError(
+            f"查詢涉及 {len(archived)} 個已封存年度，超過同時載入上限 {MAX_ATTACHED_ARCHIVES}，請分批查詢。"
+        )
+
+    main_cols = _columns(conn, 'main', table)
+    parts = [f"SELECT {', '.join(main_cols)} FROM main.{table}"] if include_main else []
+    schemas = []
+    for year in archived:
+        schema = attach_archive(conn, year, keep=schemas)
+        schemas.append(schema)
+        arch_cols = set(_columns(conn, schema, table))
+        select_list = ', '.join(c if c in arch_cols else f"NULL AS {c}" for c in main_cols)
+        parts.append(f"SELECT {select_list} FROM {schema}.{table}")
+    return "(" + " UNION ALL ".join(parts) + ")"
+
+
+def get_year_row_counts(conn, year: int) -> dict:
+    """統計主資料庫中屬於指定年度、可被封存的資料筆數。"""
+    counts = {}
+    for table in ARCHIVED_TABLES:
+        cond = _YEAR_CONDITIONS[table].format(alias='')
+        counts[table] = conn.execute(f"SELECT COUNT(*) FROM main.{table} WHERE {cond}", (str(year),)).fetchone()[0]
+    return counts
+
+
+def get_archivable_years(conn, current_year: int) -> list:
+    """回傳可封存的年度：早於今年、12 個月薪資皆已定版 (無草稿)，且尚未封存。"""
+    query = """
+    SELECT year FROM salary
+    WHERE year < ?
+    GROUP BY year
+    HAVING COUNT(DISTINCT CASE WHEN status = 'final' THEN month END) = 12
+       AND SUM(CASE WHEN status != 'final' THEN 1 ELSE 0 END) = 0
+    ORDER BY year
+    """
+    years = [int(r[0]) for r in conn.execute(query, (int(current_year),)).fetchall()]
+    archived = set(get_archived_years(conn))
+    return [y for y in years if y not in archived]
+
+
+@serialized_write(exclusive=True)
+def archive_year(conn, year: int):
+    """
+    將指定年度的資料搬移到封存檔。
+    分兩個階段進行 (WAL 模式下跨資料庫交易不保證整體原子性)：
+    1. 複製到封存檔並 commit (封存檔先清空該年度，因此中斷後可安全重跑)。
+    2. 核對筆數後，從主資料庫刪除並寫入 archive_registry。
+    回傳各資料表搬移的筆數。
+    """
+    year = int(year)
+    year_str = str(year)
+    path = get_archive_path(year)
+    schema = 'arch_target'
+
+    if schema in _attached_schemas(conn):
+        conn.execute(f"DETACH DATABASE {schema}")
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+    try:
+        cursor = conn.cursor()
+        # 階段 1：複製
+        cursor.execute("BEGIN IMMEDIATE")
+        copied = {}
+        for table in ARCHIVED_TABLES:
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {schema}.{table} AS SELECT * FROM main.{table} WHERE 0")
+            for col in _ARCHIVE_INDEXES[table]:
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_{col}_on_{table} ON {table} ({col})")
+            cols = ', '.join(_columns(conn, 'main', table))
+            cond = _YEAR_CONDITIONS[table].format(alias='')
+            cursor.execute(f"DELETE FROM {schema}.{table}")
+            cursor.execute(f"INSERT INTO {schema}.{table} ({cols}) SELECT {cols} FROM main.{table} WHERE {cond}", (year_str,))
+            copied[table] = cursor.rowcount
+        cursor.execute("COMMIT")
+
+        # 階段 2：核對並自主資料庫刪除
+        cursor.execute("BEGIN IMMEDIATE")
+        for table in ARCHIVED_TABLES:
+            archived_count = cursor.execute(f"SELECT COUNT(*) FROM {schema}.{table}").fetchone()[0]
+            if archived_count != copied[table]:
+                raise Exception(f"{table} 封存筆數不一致 ({archived_count} != {copied[table]})，已中止。")
+            cond = _YEAR_CONDITIONS[table].format(alias='')
+            cursor.execute(f"DELETE FROM main.{table} WHERE {cond}", (year_str,))
+        cursor.execute("""
+            INSERT OR REPLACE INTO archive_registry
+                (year, file_name, attendance_rows, salary_detail_rows, leave_record_rows, archived_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, (year, path.name, copied['attendance'], copied['salary_detail'], copied['leave_record']))
+        cursor.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        conn.execute(f"DETACH DATABASE {schema}")
+    bump_data_version()
+    return copied
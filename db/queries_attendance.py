@@ -3,10 +3,17 @@
 資料庫查詢：專門處理「出勤(attendance)」、「特別出勤(special_attendance)」
 與「請假(leave_record)」相關的資料庫操作。
 """
+import numpy as np
 import pandas as pd
 from datetime import time
-from utils.helpers import get_monthly_dates
+from . import queries_employee as q_emp
+from . import queries_change_log as q_cl
+from . import queries_monthly_summary as q_summary
+from . import queries_archive as q_archive
+from db.reference_cache import bump_data_version
+from db.writer import serialized_write
 
+@serialized_write
 def update_attendance_record(conn, record_id: int, checkin: time, checkout: time, minutes: dict):
     """
     更新單筆出勤紀錄的簽到退時間與所有分鐘數。
@@ -33,42 +40,152 @@ def update_attendance_record(conn, record_id: int, checkin: time, checkout: time
         minutes['overtime3_minutes'],
         record_id
     )
+    watermark = q_cl.get_latest_watermark(conn)
     cursor = conn.cursor()
     cursor.execute(sql, params)
+    rowcount = cursor.rowcount
+    q_summary.refresh_monthly_summaries_since(conn, watermark)
     conn.commit()
-    return cursor.rowcount
+    return rowcount
+
+@serialized_write
+def batch_update_attendance_minutes(conn, df: pd.DataFrame, note: str = None):
+    """
+    批次更新出勤紀錄的簽到退時間與遲到/早退/加班分鐘數 (df 需含 id 欄位)。
+    note 有值時一併更新備註 (例如 '手動修改')，否則保留原備註。
+    """
+    if df.empty:
+        return 0
+    sql = """
+    UPDATE attendance SET
+        checkin_time = ?, checkout_time = ?,
+        late_minutes = ?, early_leave_minutes = ?,
+        overtime1_minutes = ?, overtime2_minutes = ?, overtime3_minutes = ?,
+        note = COALESCE(?, note)
+    WHERE id = ?
+    """
+    cols = ['checkin_time', 'checkout_time', 'late_minutes', 'early_leave_minutes',
+            'overtime1_minutes', 'overtime2_minutes', 'overtime3_minutes']
+    data = df[cols + ['id']].astype(object).where(df[cols + ['id']].notna(), None)
+    data_tuples = [(*row[:-1], note, int(row[-1])) for row in data.itertuples(index=False, name=None)]
+
+    cursor = conn.cursor()
+    try:
+        years = pd.read_sql_query(
+            f"SELECT DISTINCT STRFTIME('%Y', date) AS year FROM attendance WHERE id IN ({','.join('?' * len(df))})",
+            conn, params=[int(i) for i in df['id']]
+        )['year']
+        q_archive.ensure_years_not_archived(conn, years.dropna().astype(int))
+        watermark = q_cl.get_latest_watermark(conn)
+        cursor.executemany(sql, data_tuples)
+        rowcount = cursor.rowcount
+        q_summary.refresh_monthly_summaries_since(conn, watermark)
+        conn.commit()
+        return rowcount
+    except Exception as e:
+        conn.rollback()
+        raise e
+
+def get_attendance_for_recalculation(conn, year: int, month: int, employee_ids=None):
+    """查詢指定月份 (可限定員工) 的出勤紀錄與員工部門，供依班表重新計算分鐘數。"""
+    month_str = f"{year}-{month:02d}"
+    query = """
+    SELECT a.id, a.employee_id, e.dept, a.date, a.checkin_time, a.checkout_time,
+           a.late_minutes, a.early_leave_minutes, a.overtime1_minutes, a.overtime2_minutes, a.overtime3_minutes
+    FROM attendance a
+    JOIN employee e ON a.employee_id = e.id
+    WHERE STRFTIME('%Y-%m', a.date) = ?
+    """
+    params = [month_str]
+    if employee_ids is not None:
+        employee_ids = [int(i) for i in employee_ids]
+        if not employee_ids:
+            query += " AND 0"
+        else:
+            query += f" AND a.employee_id IN ({','.join('?' * len(employee_ids))})"
+            params += employee_ids
+    return pd.read_sql_query(query + " ORDER BY a.date, a.employee_id", conn, params=params)
 
 def get_attendance_by_month(conn, year, month):
     """根據年月查詢出勤紀錄，並一併顯示員工姓名與編號。"""
     month_str = f"{year}-{month:02d}"
+    attendance_src = q_archive.archived_source(conn, 'attendance', [year])
     # [核心修改] 在 SELECT 語句中加入了 e.id as employee_id
-    query = """
+    query = f"""
     SELECT
         a.id, e.id as employee_id, e.hr_code, e.name_ch, a.date, a.checkin_time, a.checkout_time,
         a.late_minutes, a.early_leave_minutes, a.absent_minutes, a.leave_minutes, 
         a.overtime1_minutes, a.overtime2_minutes, a.overtime3_minutes, a.note
-    FROM attendance a
+    FROM {attendance_src} a
     JOIN employee e ON a.employee_id = e.id
     WHERE STRFTIME('%Y-%m', a.date) = ?
     ORDER BY a.date DESC, e.hr_code
     """
     return pd.read_sql_query(query, conn, params=(month_str,))
 
+ATTENDANCE_IMPORT_TIME_COLS = ['checkin_time', 'checkout_time']
+ATTENDANCE_IMPORT_MINUTE_COLS = [
+    'late_minutes', 'early_leave_minutes', 'absent_minutes', 'leave_minutes',
+    'overtime1_minutes', 'overtime2_minutes', 'overtime3_minutes'
+]
+
+def _normalize_attendance_import(df: pd.DataFrame) -> pd.DataFrame:
+    """統一匯入資料與資料庫既有資料的型別，以便逐欄比對。"""
+    out = pd.DataFrame({'employee_id': df['employee_id'].astype(int), 'date': df['date'].astype(str)})
+    for col in ATTENDANCE_IMPORT_TIME_COLS:
+        values = df[col] if col in df.columns else pd.Series(None, index=df.index)
+        out[col] = values.astype('string').str.strip().replace('', pd.NA)
+    for col in ATTENDANCE_IMPORT_MINUTE_COLS:
+        out[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int) if col in df.columns else 0
+    return out
+
+@serialized_write
 def batch_insert_or_update_attendance(conn, df: pd.DataFrame):
     """
-    批次插入或更新出勤紀錄。
+    批次插入或更新出勤紀錄，只寫入新增或內容有變動的紀錄。
+    回傳匯入報告：{'inserted', 'updated', 'unchanged', 'processed', 'field_changes': {欄位: 變動筆數}}。
     """
+    report = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'processed': 0, 'field_changes': {}}
     df_to_insert = df[pd.notna(df['employee_id'])].copy()
     if df_to_insert.empty:
-        return 0
+        return report
 
     df_to_insert['employee_id'] = pd.to_numeric(df_to_insert['employee_id'], errors='coerce').fillna(0).astype(int)
+    q_archive.ensure_years_not_archived(conn, pd.to_datetime(df_to_insert['date'], errors='coerce').dt.year.unique())
+
+    # 同一員工同一天出現多次時，以檔案中最後一筆為準 (與逐筆 upsert 的結果相同)
+    incoming = _normalize_attendance_import(df_to_insert).drop_duplicates(['employee_id', 'date'], keep='last')
+    report['processed'] = len(incoming)
+    compare_cols = ATTENDANCE_IMPORT_TIME_COLS + ATTENDANCE_IMPORT_MINUTE_COLS
+
+    # 一次讀出檔案日期區間內的既有紀錄，向量化比對
+    existing = pd.read_sql_query(
+        f"SELECT employee_id, date, {', '.join(compare_cols)} FROM attendance WHERE date BETWEEN ? AND ?",
+        conn, params=(incoming['date'].min(), incoming['date'].max())
+    )
+    existing = _normalize_attendance_import(existing)
+    merged = incoming.merge(existing, on=['employee_id', 'date'], how='left', suffixes=('', '_old'), indicator=True)
+    is_new = (merged['_merge'] == 'left_only').to_numpy()
+
+    changed = pd.Series(False, index=merged.index)
+    for col in compare_cols:
+        new_vals, old_vals = merged[col], merged[f'{col}_old']
+        diff = ((new_vals != old_vals) & ~(new_vals.isna() & old_vals.isna())).fillna(True) & ~is_new
+        report['field_changes'][col] = int(diff.sum())
+        changed |= diff
+
+    to_write = merged.loc[is_new | changed.to_numpy(), ['employee_id', 'date'] + compare_cols]
+    report['inserted'] = int(is_new.sum())
+    report['updated'] = int(changed.sum())
+    report['unchanged'] = report['processed'] - report['inserted'] - report['updated']
+    if to_write.empty:
+        return report
 
     sql = """
         INSERT INTO attendance (
             employee_id, date, checkin_time, checkout_time, late_minutes, early_leave_minutes,
             absent_minutes, leave_minutes, overtime1_minutes, overtime2_minutes, overtime3_minutes, source_file
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'excel_import')
         ON CONFLICT(employee_id, date) DO UPDATE SET
             checkin_time=excluded.checkin_time,
             checkout_time=excluded.checkout_time,
@@ -81,22 +198,16 @@ def batch_insert_or_update_attendance(conn, df: pd.DataFrame):
             overtime3_minutes=excluded.overtime3_minutes,
             source_file=excluded.source_file;
     """
-
-    data_tuples = [
-        (
-            row['employee_id'], row['date'], row.get('checkin_time'), row.get('checkout_time'),
-            row.get('late_minutes', 0), row.get('early_leave_minutes', 0), row.get('absent_minutes', 0),
-            row.get('leave_minutes', 0),
-            row.get('overtime1_minutes', 0), row.get('overtime2_minutes', 0), row.get('overtime3_minutes', 0),
-            'excel_import'
-        ) for _, row in df_to_insert.iterrows()
-    ]
+    to_write = to_write.astype(object).where(to_write.notna(), None)
+    data_tuples = list(to_write.itertuples(index=False, name=None))
 
     cursor = conn.cursor()
     try:
+        watermark = q_cl.get_latest_watermark(conn)
         cursor.executemany(sql, data_tuples)
+        q_summary.refresh_monthly_summaries_since(conn, watermark)
         conn.commit()
-        return cursor.rowcount
+        return report
     except Exception as e:
         conn.rollback()
         raise e
@@ -126,82 +237,141 @@ def get_special_attendance_for_month(conn, employee_id, year, month):
     return conn.execute(query, (employee_id, month_str)).fetchall()
 
 def get_employee_leave_summary(conn, emp_id, year, month):
-    """查詢員工當月的請假總結。"""
-    month_str = f"{year}-{month:02d}"
-    sql = "SELECT leave_type, SUM(duration) FROM leave_record WHERE employee_id = ? AND strftime('%Y-%m', start_date) = ? AND status = '已通過' GROUP BY leave_type"
-    return conn.execute(sql, (emp_id, month_str)).fetchall()
+    """查詢員工當月的請假總結 (讀取每月請假彙總表)。"""
+    sql = "SELECT leave_type, hours FROM monthly_leave_summary WHERE employee_id = ? AND year = ? AND month = ? ORDER BY leave_type"
+    return conn.execute(sql, (emp_id, int(year), int(month))).fetchall()
 
 def get_monthly_attendance_summary(conn, year, month):
-    """獲取指定月份的考勤總結，用於薪資計算。"""
-    _, month_end = get_monthly_dates(year, month)
-    month_str = month_end[:7]
+    """獲取指定月份的考勤總結 (讀取每月出勤彙總表)，用於薪資計算。"""
     query = """
-    SELECT employee_id, 
-           SUM(overtime1_minutes) as overtime1_minutes, SUM(overtime2_minutes) as overtime2_minutes, 
-           SUM(late_minutes) as late_minutes, SUM(early_leave_minutes) as early_leave_minutes,
-           SUM(leave_minutes) as leave_minutes
-    FROM attendance WHERE STRFTIME('%Y-%m', date) = ? GROUP BY employee_id
+    SELECT employee_id,
+           overtime1_minutes, overtime2_minutes,
+           late_minutes, early_leave_minutes,
+           leave_minutes
+    FROM monthly_attendance_summary WHERE year = ? AND month = ? ORDER BY employee_id
     """
-    return pd.read_sql_query(query, conn, params=(month_str,)).set_index('employee_id')
+    return pd.read_sql_query(query, conn, params=(int(year), int(month))).set_index('employee_id')
+
+LEAVE_IMPORT_COMPARE_COLS = ['employee_id', 'leave_type', 'start_date', 'end_date', 'duration', 'status', 'reason', 'approver']
+LEAVE_WRITE_CHUNK_ROWS = 2000
+
+
+def _optional_text_column(df: pd.DataFrame, col: str) -> pd.Series:
+    """取出選用的文字欄位 (不存在時為空值)，空值統一為 None。"""
+    if col not in df.columns:
+        return pd.Series(None, index=df.index, dtype=object)
+    values = df[col].astype(object)
+    return values.where(values.notna(), None)
+
+
+def _format_datetime_column(values: pd.Series, fmt: str) -> pd.Series:
+    parsed = pd.to_datetime(values, format='mixed', errors='coerce')
+    return parsed.dt.strftime(fmt).astype(object).where(parsed.notna(), None)
+
+
+def _normalize_leave_import(df: pd.DataFrame) -> pd.DataFrame:
+    """將核對後的假單 (Request ID、Start Date ... 等欄位) 整欄轉為 leave_record 的欄位格式。"""
+    return pd.DataFrame({
+        'employee_id': df['employee_id'].astype(int),
+        'request_id': _optional_text_column(df, 'Request ID'),
+        'leave_type': _optional_text_column(df, 'Type of Leave'),
+        'start_date': _format_datetime_column(df['Start Date'], '%Y-%m-%d %H:%M:%S'),
+        'end_date': _format_datetime_column(df['End Date'], '%Y-%m-%d %H:%M:%S'),
+        'duration': pd.to_numeric(df['核算時數'], errors='coerce').astype(object),
+        'reason': _optional_text_column(df, 'Reason'),
+        'status': _optional_text_column(df, 'Status'),
+        'approver': _optional_text_column(df, 'Approver'),
+        'submit_date': _format_datetime_column(df['Submission Date'], '%Y-%m-%d') if 'Submission Date' in df.columns else None,
+        'note': _optional_text_column(df, '備註'),
+    }, index=df.index)
 
+
+def _get_leave_records_by_request_ids(conn, request_ids: list) -> pd.DataFrame:
+    """依 Request ID 分批查詢既有的請假紀錄 (避免超過 SQLite 參數數量上限)。"""
+    frames = [pd.DataFrame(columns=['request_id'] + LEAVE_IMPORT_COMPARE_COLS)]
+    for i in range(0, len(request_ids), 900):
+        chunk = request_ids[i:i + 900]
+        frames.append(pd.read_sql_query(
+            f"SELECT request_id, {', '.join(LEAVE_IMPORT_COMPARE_COLS)} FROM leave_record "
+            f"WHERE request_id IN ({', '.join('?' for _ in chunk)})",
+            conn, params=chunk
+        ))
+    return pd.concat(frames, ignore_index=True)
+
+
+@serialized_write
 def batch_insert_or_update_leave_records(conn, df: pd.DataFrame):
     """
-    批次插入或更新請假紀錄。
+    批次插入或更新請假紀錄 (以 Request ID 為鍵)，只寫入新增或內容有變動的假單。
+    回傳匯入報告：{'inserted', 'updated', 'unchanged', 'processed', 'unmatched': [找不到員工的姓名],
+    'results': {Request ID: 'inserted' / 'updated' / 'unchanged'}}。
     """
+    report = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'processed': 0, 'unmatched': [], 'results': {}}
+    df_to_import = df.copy()
+    emp_dict = q_emp.get_employee_id_map(conn)
+    df_to_import['employee_id'] = df_to_import['Employee Name'].map(emp_dict)
+    report['unmatched'] = sorted(df_to_import.loc[df_to_import['employee_id'].isna(), 'Employee Name'].dropna().unique().tolist())
+    df_to_import = df_to_import.dropna(subset=['employee_id'])
+    if df_to_import.empty:
+        return report
+    q_archive.ensure_years_not_archived(conn, pd.to_datetime(df_to_import['Start Date'], format='mixed', errors='coerce').dt.year.unique())
+
+    incoming = _normalize_leave_import(df_to_import)
+    # 同一 Request ID 出現多次時，以最後一筆為準 (與逐筆 upsert 的結果相同)
+    has_id = incoming['request_id'].notna()
+    incoming = pd.concat([incoming[has_id].drop_duplicates('request_id', keep='last'), incoming[~has_id]])
+    report['processed'] = len(incoming)
+
+    existing = _get_leave_records_by_request_ids(conn, incoming.loc[incoming['request_id'].notna(), 'request_id'].tolist())
+    existing['employee_id'] = pd.to_numeric(existing['employee_id'], errors='coerce')
+    existing['duration'] = pd.to_numeric(existing['duration'], errors='coerce')
+    merged = incoming.reset_index(drop=True).merge(
+        existing.astype(object), on='request_id', how='left', suffixes=('', '_old'), indicator=True
+    )
+    is_new = (merged['_merge'] == 'left_only') | merged['request_id'].isna()
+    changed = pd.Series(False, index=merged.index)
+    for col in LEAVE_IMPORT_COMPARE_COLS:
+        new_vals, old_vals = merged[col], merged[f'{col}_old']
+        if col == 'duration':
+            new_vals, old_vals = pd.to_numeric(new_vals, errors='coerce'), pd.to_numeric(old_vals, errors='coerce')
+        both_missing = new_vals.isna() & old_vals.isna()
+        changed |= (new_vals != old_vals) & ~both_missing & ~is_new
+
+    status = np.select([is_new, changed], ['inserted', 'updated'], default='unchanged')
+    for key in ('inserted', 'updated', 'unchanged'):
+        report[key] = int((status == key).sum())
+    report['results'] = {rid: result for rid, result in zip(merged['request_id'], status) if rid is not None}
+
+    to_write = merged.loc[status != 'unchanged', list(incoming.columns)]
+    if to_write.empty:
+        return report
+
+    sql = """
+    INSERT INTO leave_record (
+        employee_id, request_id, leave_type, start_date, end_date,
+        duration, reason, status, approver, submit_date, note
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(request_id) DO UPDATE SET
+        employee_id=excluded.employee_id,
+        leave_type=excluded.leave_type,
+        start_date=excluded.start_date,
+        end_date=excluded.end_date,
+        duration=excluded.duration,
+        status=excluded.status,
+        reason=excluded.reason,
+        approver=excluded.approver,
+        note='UPDATED_FROM_UI'
+    """
+    to_write = to_write.astype(object).where(to_write.notna(), None)
     cursor = conn.cursor()
     try:
-        cursor.execute("BEGIN TRANSACTION")
-        
-        df_to_import = df.copy()
-        
-        emp_map = pd.read_sql_query("SELECT name_ch, id FROM employee", conn)
-        emp_dict = dict(zip(emp_map['name_ch'], emp_map['id']))
-        df_to_import['employee_id'] = df_to_import['Employee Name'].map(emp_dict)
-
-        df_to_import.dropna(subset=['employee_id'], inplace=True)
-        df_to_import['employee_id'] = df_to_import['employee_id'].astype(int)
-
-        sql = """
-        INSERT INTO leave_record (
-            employee_id, request_id, leave_type, start_date, end_date,
-            duration, reason, status, approver, submit_date, note
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(request_id) DO UPDATE SET
-            employee_id=excluded.employee_id,
-            leave_type=excluded.leave_type,
-            start_date=excluded.start_date,
-            end_date=excluded.end_date,
-            duration=excluded.duration,
-            status=excluded.status,
-            reason=excluded.reason,
-            approver=excluded.approver,
-            note='UPDATED_FROM_UI'
-        """
-        
-        data_tuples = []
-        for _, row in df_to_import.iterrows():
-            submit_date_val = row.get('Submission Date')
-            parsed_submit_date = pd.to_datetime(submit_date_val, errors='coerce')
-            submit_date_str = parsed_submit_date.strftime('%Y-%m-%d') if pd.notna(parsed_submit_date) else None
-            
-            data_tuples.append((
-                row['employee_id'],
-                row['Request ID'],
-                row['Type of Leave'],
-                pd.to_datetime(row['Start Date']).strftime('%Y-%m-%d %H:%M:%S'),
-                pd.to_datetime(row['End Date']).strftime('%Y-%m-%d %H:%M:%S'),
-                row['核算時數'],
-                row.get('Reason'),
-                row.get('Status'),
-                row.get('Approver'),
-                submit_date_str,
-                row.get('備註')
-            ))
-
-        cursor.executemany(sql, data_tuples)
+        watermark = q_cl.get_latest_watermark(conn)
+        for i in range(0, len(to_write), LEAVE_WRITE_CHUNK_ROWS):
+            cursor.executemany(sql, to_write.iloc[i:i + LEAVE_WRITE_CHUNK_ROWS].itertuples(index=False, name=None))
+        q_summary.refresh_monthly_summaries_since(conn, watermark)
         conn.commit()
-        return len(data_tuples)
-        
+        bump_data_version('leave_record')
+        return report
     except Exception as e:
         conn.rollback()
         raise e
@@ -211,22 +381,25 @@ def get_monthly_attendance_and_leave_data(conn, year: int, month: int):
     獲取指定月份所有員工的出勤紀錄和請假紀錄。
     """
     month_str = f"{year}-{month:02d}"
+    attendance_src = q_archive.archived_source(conn, 'attendance', [year])
+    # 跨年度的假單以開始日期封存，查詢一月時需一併查詢前一年度
+    leave_src = q_archive.archived_source(conn, 'leave_record', [year - 1, year] if month == 1 else [year])
     
-    attendance_query = """
+    attendance_query = f"""
     SELECT 
         e.id as employee_id, e.name_ch, a.date,
         a.checkin_time, a.checkout_time, a.absent_minutes
-    FROM attendance a
+    FROM {attendance_src} a
     JOIN employee e ON a.employee_id = e.id
     WHERE STRFTIME('%Y-%m', a.date) = ?
     """
     attendance_df = pd.read_sql_query(attendance_query, conn, params=(month_str,))
     
-    leave_query = """
+    leave_query = f"""
     SELECT
         e.id as employee_id, lr.leave_type, lr.start_date,
         lr.end_date, lr.duration
-    FROM leave_record lr
+    FROM {leave_src} lr
     JOIN employee e ON lr.employee_id = e.id
     WHERE (STRFTIME('%Y-%m', lr.start_date) = ? OR STRFTIME('%Y-%m', lr.end_date) = ?)
     AND lr.status = '已通過'
@@ -240,12 +413,13 @@ def get_leave_records_by_month(conn, year: int, month: int):
     根據年月查詢所有已匯入的請假紀錄。
     """
     month_str = f"{year}-{month:02d}"
-    query = """
+    leave_src = q_archive.archived_source(conn, 'leave_record', [year])
+    query = f"""
     SELECT
         e.name_ch as '員工姓名', lr.leave_type as '假別', lr.start_date as '開始時間',
         lr.end_date as '結束時間', lr.duration as '時數', lr.reason as '事由',
         lr.status as '狀態', lr.approver as '簽核人', lr.request_id as '假單ID'
-    FROM leave_record lr
+    FROM {leave_src} lr
     JOIN employee e ON lr.employee_id = e.id
     WHERE STRFTIME('%Y-%m', lr.start_date) = ?
     ORDER BY e.name_ch, lr.start_date
@@ -257,12 +431,13 @@ def get_leave_records_by_year(conn, year: int):
     根據年份查詢所有已匯入的請假紀錄。
     """
     year_str = str(year)
-    query = """
+    leave_src = q_archive.archived_source(conn, 'leave_record', [year])
+    query = f"""
     SELECT
         e.name_ch as '員工姓名', lr.leave_type as '假別', lr.start_date as '開始時間',
         lr.end_date as '結束時間', lr.duration as '時數', lr.reason as '事由',
         lr.status as '狀態', lr.approver as '簽核人', lr.request_id as '假單ID'
-    FROM leave_record lr
+    FROM {leave_src} lr
     JOIN employee e ON lr.employee_id = e.id
     WHERE STRFTIME('%Y', lr.start_date) = ? AND lr.status = '已通過'
     ORDER BY e.name_ch, lr.start_date
@@ -271,9 +446,11 @@ def get_leave_records_by_year(conn, year: int):
 
 def get_leave_hours_for_period(conn, employee_id, leave_type, start_date, end_date):
     """查詢指定員工在特定時間區間內，特定假別的總時數。"""
-    sql = """
+    years = range(pd.to_datetime(start_date).year, pd.to_datetime(end_date).year + 1)
+    leave_src = q_archive.archived_source(conn, 'leave_record', years)
+    sql = f"""
     SELECT SUM(duration) 
-    FROM leave_record 
+    FROM {leave_src} 
     WHERE employee_id = ? 
       AND leave_type = ? 
       AND status = '已通過' 
@@ -283,20 +460,60 @@ def get_leave_hours_for_period(conn, employee_id, leave_type, start_date, end_da
     result = cursor.execute(sql, (employee_id, leave_type, start_date, end_date)).fetchone()
     return result[0] if result and result[0] is not None else 0
 
+LEAVE_WINDOW_CHUNK_ROWS = 300
+
+
+def get_leave_hours_for_windows(conn, windows: pd.DataFrame, leave_type: str) -> pd.DataFrame:
+    """
+    一次查詢多位員工各自區間內、特定假別的已通過請假時數 (以開始日期判斷是否落在區間內)。
+    windows 需含 employee_id、period_start、period_end (YYYY-MM-DD)；
+    回傳 employee_id、period_start、hours (沒有請假為 0)。
+    """
+    if windows.empty:
+        return pd.DataFrame(columns=['employee_id', 'period_start', 'hours'])
+    windows = windows[['employee_id', 'period_start', 'period_end']].astype(object)
+    years = range(int(windows['period_start'].min()[:4]), int(windows['period_end'].max()[:4]) + 1)
+    # 涉及的封存年度超過同時載入上限時，主資料庫與各批封存檔分開查詢後再加總
+    batches = q_archive.archive_year_batches(conn, years)
+    sources = [(years, True)] if len(batches) <= 1 else [([], True)] + [(batch, False) for batch in batches]
+    frames = []
+    for source_years, include_main in sources:
+        leave_src = q_archive.archived_source(conn, 'leave_record', source_years, include_main=include_main)
+        for i in range(0, len(windows), LEAVE_WINDOW_CHUNK_ROWS):
+            chunk = windows.iloc[i:i + LEAVE_WINDOW_CHUNK_ROWS]
+            sql = f"""
+            WITH windows (employee_id, period_start, period_end) AS (VALUES {', '.join('(?, ?, ?)' for _ in range(len(chunk)))})
+            SELECT w.employee_id, w.period_start, COALESCE(SUM(l.duration), 0) as hours
+            FROM windows w
+            LEFT JOIN {leave_src} l
+              ON l.employee_id = w.employee_id
+             AND l.leave_type = ?
+             AND l.status = '已通過'
+             AND date(l.start_date) BETWEEN w.period_start AND w.period_end
+            GROUP BY w.employee_id, w.period_start
+            """
+            params = [v for row in chunk.itertuples(index=False, name=None) for v in row] + [leave_type]
+            frames.append(pd.read_sql_query(sql, conn, params=params))
+    result = pd.concat(frames, ignore_index=True)
+    if len(sources) > 1:
+        result = result.groupby(['employee_id', 'period_start'], as_index=False)['hours'].sum()
+    return result
+
 def get_leave_details_by_month(conn, year: int, month: int):
     """
     獲取指定月份所有員工的每日請假紀錄，包含時間，用於報表生成。
     (V2: 不再群組，而是回傳詳細紀錄)
     """
     month_str = f"{year}-{month:02d}"
-    query = """
+    leave_src = q_archive.archived_source(conn, 'leave_record', [year - 1, year] if month == 1 else [year])
+    query = f"""
     SELECT
         employee_id,
         leave_type,
         start_date,
         end_date,
         duration
-    FROM leave_record
+    FROM {leave_src}
     WHERE (strftime('%Y-%m', start_date) = ? OR strftime('%Y-%m', end_date) = ?)
       AND status = '已通過'
     ORDER BY employee_id, start_date;
@@ -308,12 +525,13 @@ def get_leave_details_by_month(conn, year: int, month: int):
 def get_attendance_by_employee_month(conn, employee_id: int, year: int, month: int):
     """根據員工ID和年月查詢其所有出勤紀錄。"""
     month_str = f"{year}-{month:02d}"
-    query = """
+    attendance_src = q_archive.archived_source(conn, 'attendance', [year])
+    query = f"""
     SELECT
         id, employee_id, date, checkin_time, checkout_time,
         late_minutes, early_leave_minutes,
         overtime1_minutes, overtime2_minutes
-    FROM attendance
+    FROM {attendance_src}
     WHERE employee_id = ? AND STRFTIME('%Y-%m', date) = ?
     ORDER BY date ASC
     """
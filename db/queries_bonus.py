@@ -4,12 +4,14 @@
 【V2 版】：新增支援草稿(draft)與鎖定(final)狀態的函式。
 """
 import pandas as pd
+from db.writer import serialized_write
 
 def get_employee_bonus(conn, emp_id, year, month):
     """從中繼站讀取預先算好的業務獎金。"""
     sql = "SELECT bonus_amount FROM monthly_bonus WHERE employee_id = ? AND year = ? AND month = ?"
     return conn.execute(sql, (emp_id, year, month)).fetchone()
 
+@serialized_write
 def save_bonuses_to_monthly_table(conn, year, month, summary_df):
     """將計算好的獎金總結存入 monthly_bonus 中繼站。"""
     cursor = conn.cursor()
@@ -30,6 +32,7 @@ def save_bonuses_to_monthly_table(conn, year, month, summary_df):
         conn.rollback()
         raise e
 
+@serialized_write
 def upsert_bonus_details_draft(conn, year: int, month: int, details_df: pd.DataFrame):
     """
     將抓取或手動編輯的獎金明細草稿存入歷史紀錄表。
@@ -72,6 +75,7 @@ def upsert_bonus_details_draft(conn, year: int, month: int, details_df: pd.DataF
         conn.rollback()
         raise e
 
+@serialized_write
 def finalize_bonus_details(conn, year: int, month: int):
     """ 將指定月份的所有獎金明細草稿狀態更新為 'final'。"""
     sql = "UPDATE monthly_bonus_details SET status = 'final' WHERE year = ? AND month = ? AND status = 'draft'"
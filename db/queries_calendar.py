@@ -0,0 +1,77 @@
+# db/queries_calendar.py
+"""
+資料庫查詢：國定假日行事曆 (calendar_day)。
+每個年度整批寫入 (同一年度重新匯入時整年覆蓋)，讀取端以 calendar_day 的資料版本快取。
+"""
+import pandas as pd
+from db.reference_cache import cached_reference, bump_data_version
+from db.writer import serialized_write
+
+
+@cached_reference('calendar_day')
+def get_calendar_days(conn):
+    """取得行事曆所有日期的放假/補班註記 (依日期排序)。"""
+    return pd.read_sql_query(
+        "SELECT date, is_holiday, is_makeup_workday FROM calendar_day ORDER BY date", conn
+    )
+
+
+def get_calendar_year_summary(conn):
+    """各年度的行事曆筆數、平日放假與補班日數、資料來源 (新到舊)。"""
+    query = """
+    SELECT substr(date, 1, 4) as '年度', COUNT(*) as '天數',
+           SUM(CASE WHEN is_holiday = 1 AND strftime('%w', date) NOT IN ('0', '6') THEN 1 ELSE 0 END) as '平日放假日數',
+           SUM(is_makeup_workday) as '補班日數',
+           GROUP_CONCAT(DISTINCT source) as '來源', MAX(updated_at) as '更新時間'
+    FROM calendar_day GROUP BY substr(date, 1, 4) ORDER BY 1 DESC
+    """
+    return pd.read_sql_query(query, conn)
+
+
+def get_calendar_exceptions(conn, year: int):
+    """列出指定年度的平日放假日與週末補班日。"""
+    query = """
+    SELECT date as '日期',
+           CASE WHEN is_makeup_workday = 1 THEN '補班' ELSE '放假' END as '類型',
+           description as '說明'
+    FROM calendar_day
+    WHERE date BETWEEN ? AND ?
+      AND (is_makeup_workday = 1 OR (is_holiday = 1 AND strftime('%w', date) NOT IN ('0', '6')))
+    ORDER BY date
+    """
+    return pd.read_sql_query(query, conn, params=(f"{int(year)}-01-01", f"{int(year)}-12-31"))
+
+
+@serialized_write
+def replace_calendar_years(conn, days_df: pd.DataFrame, source: str):
+    """
+    寫入行事曆：days_df 需含 date (YYYY-MM-DD)、is_holiday、is_makeup_workday、description。
+    資料涵蓋的年度會先整年刪除再寫入，回傳 {年度: 寫入天數}。
+    """
+    if days_df.empty:
+        return {}
+    years = days_df['date'].str[:4]
+    cursor = conn.cursor()
+    try:
+        for year in sorted(years.unique()):
+            cursor.execute("DELETE FROM calendar_day WHERE date BETWEEN ? AND ?", (f"{year}-01-01", f"{year}-12-31"))
+        cursor.executemany(
+            "INSERT INTO calendar_day (date, is_holiday, is_makeup_workday, description, source) VALUES (?, ?, ?, ?, ?)",
+            [(r.date, int(r.is_holiday), int(r.is_makeup_workday), r.description or None, source)
+             for r in days_df.itertuples(index=False)]
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    bump_data_version('calendar_day')
+    return {int(year): int(count) for year, count in years.value_counts().sort_index().items()}
+
+
+@serialized_write
+def delete_calendar_year(conn, year: int):
+    """刪除指定年度的行事曆資料，回傳刪除筆數。"""
+    cursor = conn.execute("DELETE FROM calendar_day WHERE date BETWEEN ? AND ?", (f"{int(year)}-01-01", f"{int(year)}-12-31"))
+    conn.commit()
+    bump_data_version('calendar_day')
+    return cursor.rowcount
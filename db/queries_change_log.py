@@ -0,0 +1,76 @@
+# db/queries_change_log.py
+"""
+資料庫查詢：讀取由觸發器維護的異動紀錄 (change_log)。
+增量計算的使用方式：
+    1. 記下上次處理到的水位 watermark (change_log.id)。
+    2. 以 is_watermark_expired() 確認該水位之後的紀錄仍完整保留，否則改為全量重算。
+    3. 以 get_changes_since() / get_changed_keys_since() 取得異動，處理完畢後把水位更新為 get_latest_watermark()。
+"""
+import pandas as pd
+from db.writer import serialized_write
+
+DEFAULT_RETENTION_DAYS = 90
+
+
+def get_latest_watermark(conn) -> int:
+    """回傳目前最新的異動紀錄 id (沒有任何紀錄時為已清除到的 id)。"""
+    row = conn.execute("""
+        SELECT MAX(COALESCE((SELECT MAX(id) FROM change_log), 0),
+                   COALESCE((SELECT pruned_through FROM change_log_state WHERE id = 1), 0))
+    """).fetchone()
+    return int(row[0] or 0)
+
+
+def is_watermark_expired(conn, watermark: int) -> bool:
+    """水位之後的部分異動紀錄已被清除時回傳 True，呼叫端應改為全量重算。"""
+    row = conn.execute("SELECT pruned_through FROM change_log_state WHERE id = 1").fetchone()
+    pruned_through = int(row[0]) if row else 0
+    return int(watermark) < pruned_through
+
+
+def get_changes_since(conn, watermark: int, tables: list = None, limit: int = None):
+    """取得 id 大於水位的異動紀錄，可依資料表篩選。"""
+    sql = """
+        SELECT id, table_name, row_id, employee_id, year, month, operation, changed_at
+        FROM change_log WHERE id > ?
+    """
+    params = [int(watermark)]
+    if tables:
+        sql += f" AND table_name IN ({','.join('?' for _ in tables)})"
+        params.extend(tables)
+    sql += " ORDER BY id"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return pd.read_sql_query(sql, conn, params=params)
+
+
+def get_changed_keys_since(conn, watermark: int, tables: list = None):
+    """取得水位之後受影響的 (employee_id, year, month) 組合 (不重複)。"""
+    sql = "SELECT DISTINCT employee_id, year, month FROM change_log WHERE id > ?"
+    params = [int(watermark)]
+    if tables:
+        sql += f" AND table_name IN ({','.join('?' for _ in tables)})"
+        params.extend(tables)
+    return pd.read_sql_query(sql + " ORDER BY employee_id, year, month", conn, params=params)
+
+
+@serialized_write
+def prune_change_log(conn, retention_days: int = None):
+    """手動清除超過保留天數的異動紀錄 (一般情況下由觸發器自動清除)，回傳刪除筆數。"""
+    if retention_days is None:
+        row = conn.execute("SELECT value FROM system_config WHERE key = 'CHANGE_LOG_RETENTION_DAYS'").fetchone()
+        retention_days = int(float(row[0])) if row and row[0] else DEFAULT_RETENTION_DAYS
+    cursor = conn.cursor()
+    row = cursor.execute(
+        "SELECT MAX(id) FROM change_log WHERE changed_at < datetime('now', ?)",
+        (f"-{int(retention_days)} days",)
+    ).fetchone()
+    cutoff_id = row[0]
+    if cutoff_id is None:
+        return 0
+    cursor.execute("UPDATE change_log_state SET pruned_through = MAX(pruned_through, ?) WHERE id = 1", (cutoff_id,))
+    cursor.execute("DELETE FROM change_log WHERE id <= ?", (cutoff_id,))
+    deleted = cursor.rowcount
+    conn.commit()
+    return deleted
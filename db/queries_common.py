@@ -2,7 +2,12 @@
 """
 資料庫查詢：包含通用的、可重複使用的 CRUD (Create, Read, Update, Delete) 函式。
 """
+import numpy as np
 import pandas as pd
+from db.reference_cache import bump_data_version
+from db.writer import serialized_write
+from db import queries_change_log as q_cl
+from db import queries_monthly_summary as q_summary
 
 def get_all(conn, table_name, order_by="id"):
     """通用函式：取得一個資料表中的所有紀錄。"""
@@ -14,29 +19,49 @@ def get_by_id(conn, table_name, record_id):
     # 使用 .to_dict('records')[0] 確保回傳的是字典，而不是 DataFrame 的 Series
     return df.to_dict('records')[0] if not df.empty else None
 
+def _sql_values(values) -> list:
+    """把 numpy 純量轉回 Python 型別 (numpy.int64 直接綁定時 sqlite 會存成 BLOB)。"""
+    return [v.item() if isinstance(v, np.generic) else v for v in values]
+
+@serialized_write
 def add_record(conn, table_name, data: dict):
     """通用函式：在指定的資料表中新增一筆紀錄。"""
     cursor = conn.cursor()
     cols = ', '.join(data.keys())
     placeholders = ', '.join('?' for _ in data)
     sql = f'INSERT INTO {table_name} ({cols}) VALUES ({placeholders})'
-    cursor.execute(sql, list(data.values()))
+    watermark = q_cl.get_latest_watermark(conn)
+    cursor.execute(sql, _sql_values(data.values()))
+    if table_name in q_summary.SUMMARY_SOURCE_TABLES:
+        q_summary.refresh_monthly_summaries_since(conn, watermark)
     conn.commit()
+    bump_data_version(table_name)
     return cursor.lastrowid
 
+@serialized_write
 def update_record(conn, table_name, record_id, data: dict):
     """通用函式：根據 ID 更新一筆紀錄。"""
     cursor = conn.cursor()
     updates = ', '.join([f"{key} = ?" for key in data.keys()])
     sql = f'UPDATE {table_name} SET {updates} WHERE id = ?'
-    cursor.execute(sql, list(data.values()) + [record_id])
+    watermark = q_cl.get_latest_watermark(conn)
+    cursor.execute(sql, _sql_values(data.values()) + [record_id])
+    if table_name in q_summary.SUMMARY_SOURCE_TABLES:
+        q_summary.refresh_monthly_summaries_since(conn, watermark)
     conn.commit()
+    bump_data_version(table_name)
     return cursor.rowcount
 
+@serialized_write
 def delete_record(conn, table_name, record_id):
     """通用函式：根據 ID 刪除一筆紀錄。"""
     cursor = conn.cursor()
     cursor.execute("PRAGMA foreign_keys = ON;")
+    watermark = q_cl.get_latest_watermark(conn)
     cursor.execute(f'DELETE FROM {table_name} WHERE id = ?', (record_id,))
+    if table_name in q_summary.SUMMARY_SOURCE_TABLES:
+        q_summary.refresh_monthly_summaries_since(conn, watermark)
     conn.commit()
+    # 刪除可能透過 ON DELETE CASCADE 影響其他資料表，因此使全部快取失效
+    bump_data_version()
     return cursor.rowcount
\ No newline at end of file
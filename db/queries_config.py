@@ -1,6 +1,9 @@
 # db/queries_config.py
 import pandas as pd
+from db.reference_cache import cached_reference, bump_data_version
+from db.writer import serialized_write
 
+@cached_reference('minimum_wage_history')
 def get_minimum_wage_for_year(conn, year: int):
     """查詢指定年份的有效基本工資。如果當年沒有，則找最近的一年。"""
     sql = """
@@ -12,10 +15,12 @@ def get_minimum_wage_for_year(conn, year: int):
     result = conn.execute(sql, (year,)).fetchone()
     return result['wage'] if result else 0
 
+@cached_reference('minimum_wage_history')
 def get_all_minimum_wages(conn):
     """取得所有歷史基本工資紀錄。"""
     return pd.read_sql_query("SELECT * FROM minimum_wage_history ORDER BY year DESC", conn)
 
+@serialized_write
 def add_or_update_minimum_wage(conn, year: int, wage: int, effective_date, note: str):
     """新增或更新指定年份的基本工資。"""
     sql = """
@@ -29,13 +34,16 @@ def add_or_update_minimum_wage(conn, year: int, wage: int, effective_date, note:
     cursor = conn.cursor()
     cursor.execute(sql, (year, wage, effective_date, note))
     conn.commit()
+    bump_data_version('minimum_wage_history')
     return cursor.rowcount
 
+@cached_reference('system_config')
 def get_all_configs(conn):
     """取得所有系統通用參數設定。"""
     df = pd.read_sql_query("SELECT key, value FROM system_config", conn)
     return dict(zip(df['key'], df['value']))
 
+@serialized_write
 def batch_update_configs(conn, data_tuples: list):
     """批次更新或插入系統通用參數。"""
     sql = """
@@ -46,4 +54,5 @@ def batch_update_configs(conn, data_tuples: list):
     """
     cursor = conn.cursor()
     cursor.executemany(sql, data_tuples)
-    conn.commit()
\ No newline at end of file
+    conn.commit()
+    bump_data_version('system_config')
\ No newline at end of file
@@ -4,16 +4,34 @@
 """
 import pandas as pd
 from utils.helpers import get_monthly_dates
+from db.reference_cache import cached_reference, bump_data_version
+from db.writer import serialized_write
 
 def get_all_employees(conn):
     """取得所有員工的資料，並按員工編號排序。"""
     return pd.read_sql_query("SELECT * FROM employee ORDER BY hr_code", conn)
 
+@cached_reference('employee')
 def get_employee_map(conn):
     """獲取員工姓名與ID的對應表，並包含一個用於匹配的「淨化姓名」。"""
     df = pd.read_sql_query("SELECT id as employee_id, name_ch FROM employee", conn)
     df['clean_name'] = df['name_ch'].str.replace(r'\s+', '', regex=True)
     return df
+
+@cached_reference('employee')
+def get_employee_match_index(conn):
+    """
+    取得出勤匯入用的姓名索引：以去除空白後的姓名 (match_key) 為索引，欄位為 id 與 dept。
+    同名時以最後一筆為準。
+    """
+    df = pd.read_sql_query("SELECT id, name_ch, dept FROM employee ORDER BY id", conn)
+    df['match_key'] = df['name_ch'].astype(str).str.replace(r'\s+', '', regex=True)
+    return df.drop_duplicates('match_key', keep='last').set_index('match_key')[['id', 'dept']]
+
+@cached_reference('employee')
+def get_employee_id_map(conn):
+    """取得員工姓名 (name_ch) 對應員工 ID 的字典，供各批次匯入與薪資寫入使用。"""
+    return pd.read_sql_query("SELECT id, name_ch FROM employee", conn).set_index('name_ch')['id'].to_dict()
     
 def get_active_employees_for_month(conn, year, month):
     """查詢指定月份仍在職的員工，並包含健保狀態與職稱。"""
@@ -29,10 +47,12 @@ def get_active_employees_for_month(conn, year, month):
     """
     return conn.execute(query, (end_date, start_date)).fetchall()
     
+@cached_reference('company')
 def get_all_companies(conn):
     """取得所有公司的資料，並按公司名稱排序。"""
     return pd.read_sql_query("SELECT * FROM company ORDER BY name", conn)
 
+@serialized_write
 def batch_add_or_update_employees(conn, df: pd.DataFrame):
     """
     批次新增或更新員工資料。
@@ -64,6 +84,7 @@ def batch_add_or_update_employees(conn, df: pd.DataFrame):
             cursor.execute(sql, data_tuple)
             
         conn.commit()
+        bump_data_version('employee')
         report['processed'] = len(df)
         report['updated'] = cursor.rowcount
         
@@ -0,0 +1,75 @@
+# db/queries_import_archive.py
+"""
+資料庫查詢：上傳檔案匯入封存 (import_archive)。
+每個匯入過的檔案以 (內容雜湊值, 匯入類型) 為鍵，記錄匯入結果與匯入前後的 change_log 水位，
+可據此查出該次匯入產生的異動。
+"""
+import json
+import pandas as pd
+from db import queries_change_log as q_cl
+from db.writer import serialized_write
+
+
+def _to_record(row) -> dict:
+    record = dict(row)
+    record['result'] = json.loads(record['result']) if record.get('result') else {}
+    return record
+
+
+def get_import_by_hash(conn, content_hash: str, import_type: str):
+    """查詢指定內容雜湊值的匯入紀錄，未匯入過時回傳 None。"""
+    cursor = conn.execute(
+        "SELECT * FROM import_archive WHERE content_hash = ? AND import_type = ?", (content_hash, import_type)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return _to_record(dict(zip([c[0] for c in cursor.description], row)))
+
+
+def get_import_by_id(conn, record_id: int):
+    cursor = conn.execute("SELECT * FROM import_archive WHERE id = ?", (int(record_id),))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return _to_record(dict(zip([c[0] for c in cursor.description], row)))
+
+
+def get_import_archive(conn, import_type: str = None):
+    """列出匯入封存 (新到舊)，可依匯入類型篩選。"""
+    query = "SELECT id, import_type, file_name, file_size, content_hash, import_count, imported_at FROM import_archive"
+    params = []
+    if import_type:
+        query += " WHERE import_type = ?"
+        params.append(import_type)
+    return pd.read_sql_query(query + " ORDER BY imported_at DESC, id DESC", conn, params=params)
+
+
+def get_import_changes(conn, record: dict):
+    """取得該次匯入期間產生的異動紀錄；水位已過期 (異動紀錄已清除) 時回傳 None。"""
+    before, after = record.get('watermark_before'), record.get('watermark_after')
+    if before is None or after is None or q_cl.is_watermark_expired(conn, before):
+        return None
+    changes = q_cl.get_changes_since(conn, before)
+    return changes[changes['id'] <= int(after)]
+
+
+@serialized_write
+def upsert_import_record(conn, content_hash: str, import_type: str, file_name: str, file_size: int,
+                         stored_file: str, watermark_before: int, watermark_after: int, result: dict):
+    """新增匯入紀錄；同一檔案再次匯入時更新水位、結果與匯入次數。"""
+    sql = """
+    INSERT INTO import_archive
+        (content_hash, import_type, file_name, file_size, stored_file, watermark_before, watermark_after, result)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(content_hash, import_type) DO UPDATE SET
+        file_name = excluded.file_name,
+        watermark_before = excluded.watermark_before,
+        watermark_after = excluded.watermark_after,
+        result = excluded.result,
+        import_count = import_count + 1,
+        imported_at = CURRENT_TIMESTAMP
+    """
+    conn.execute(sql, (content_hash, import_type, file_name, int(file_size), stored_file,
+                       watermark_before, watermark_after, json.dumps(result, ensure_ascii=False, default=str)))
+    conn.commit()
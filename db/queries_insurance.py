@@ -6,6 +6,9 @@
 import pandas as pd
 from datetime import timedelta, date
 from utils.helpers import get_monthly_dates
+from db.reference_cache import cached_reference, bump_data_version
+from . import queries_employee as q_emp
+from db.writer import serialized_write
 
 def get_all_insurance_history(conn):
     """取得所有員工的加退保歷史紀錄 (包含 employee_id)。""" # <-- 修改註解
@@ -28,44 +31,47 @@ def get_all_insurance_history(conn):
 def get_employee_insurance_fee(conn, insurance_salary: int, year: int, month: int):
     """
     根據投保薪資、年份和月份，查詢員工應負擔的勞健保費用。
+    (使用快取的級距表比對，避免每位員工都重新查詢資料庫)
     """
     if not insurance_salary or insurance_salary <= 0:
         return 0, 0
         
-    cursor = conn.cursor()
     month_end_date = get_monthly_dates(year, month)[1]
+    grades_df = _get_grade_table(conn)
 
     def get_fee_by_type(ins_type: str):
-        query = """
-        SELECT g.employee_fee
-        FROM insurance_grade g
-        WHERE g.type = ?
-          AND g.start_date = (
-              SELECT MAX(start_date) 
-              FROM insurance_grade 
-              WHERE type = ? AND start_date <= ?
-          )
-          AND (
-              ? BETWEEN g.salary_min AND g.salary_max
-              OR 
-              g.grade = (SELECT MAX(grade) FROM insurance_grade WHERE type = ? AND start_date = g.start_date) AND ? > g.salary_max
-          )
-        LIMIT 1;
-        """
-        params = (ins_type, ins_type, month_end_date, insurance_salary, ins_type, insurance_salary)
-        fee_row = cursor.execute(query, params).fetchone()
-        
-        return fee_row[0] if fee_row else 0
+        type_df = grades_df[grades_df['type'] == ins_type]
+        effective_dates = type_df.loc[type_df['start_date'] <= month_end_date, 'start_date']
+        if effective_dates.empty:
+            return 0
+        version_df = type_df[type_df['start_date'] == effective_dates.max()]
+        top_grade = version_df['grade'].max()
+        matched = version_df[
+            ((version_df['salary_min'] <= insurance_salary) & (insurance_salary <= version_df['salary_max'])) |
+            ((version_df['grade'] == top_grade) & (insurance_salary > version_df['salary_max']))
+        ]
+        if matched.empty:
+            return 0
+        fee = matched['employee_fee'].iloc[0]
+        # 轉回 Python 數值，numpy.int64 直接寫入 sqlite 會被存成 BLOB
+        return None if pd.isna(fee) else fee.item()
 
     labor_fee = get_fee_by_type('labor')
     health_fee = get_fee_by_type('health')
     
     return labor_fee, health_fee
 
+@cached_reference('insurance_grade')
+def _get_grade_table(conn):
+    """取得完整級距表 (依 id 排序)，供費用與級距比對使用。"""
+    return pd.read_sql_query("SELECT * FROM insurance_grade ORDER BY id", conn)
+
+@cached_reference('insurance_grade')
 def get_insurance_grades(conn):
     """取得所有勞健保級距資料。"""
     return pd.read_sql_query("SELECT * FROM insurance_grade ORDER BY start_date DESC, type, grade", conn)
 
+@serialized_write
 def batch_insert_or_replace_grades(conn, df: pd.DataFrame, grade_type: str, start_date):
     """批次插入或替換指定適用日期的級距資料。"""
     cursor = conn.cursor()
@@ -97,17 +103,19 @@ def batch_insert_or_replace_grades(conn, df: pd.DataFrame, grade_type: str, star
             
         cursor.executemany(sql, data_tuples)
         conn.commit()
+        bump_data_version('insurance_grade')
         return cursor.rowcount
     except Exception as e:
         conn.rollback()
         raise e
     
+@serialized_write
 def batch_add_or_update_insurance_history(conn, df: pd.DataFrame):
     cursor = conn.cursor()
     report = {'inserted': 0, 'updated': 0, 'errors': []}
     
-    emp_map = pd.read_sql("SELECT name_ch, id FROM employee", conn).set_index('name_ch')['id'].to_dict()
-    comp_map = pd.read_sql("SELECT name, id FROM company", conn).set_index('name')['id'].to_dict()
+    emp_map = q_emp.get_employee_id_map(conn)
+    comp_map = q_emp.get_all_companies(conn).set_index('name')['id'].to_dict()
 
     sql_insert = "INSERT INTO employee_company_history (employee_id, company_id, start_date, end_date, note) VALUES (?, ?, ?, ?, ?)"
     sql_update = "UPDATE employee_company_history SET end_date = ?, note = ? WHERE id = ?"
@@ -163,18 +171,14 @@ def get_insurance_salary_level(conn, base_salary: float):
     if not base_salary or base_salary <= 0:
         return base_salary
         
-    sql = """
-    SELECT salary_max 
-    FROM insurance_grade 
-    WHERE type = 'health' 
-      AND ? BETWEEN salary_min AND salary_max 
-    ORDER BY start_date DESC 
-    LIMIT 1
-    """
-    result = conn.execute(sql, (base_salary,)).fetchone()
+    grades_df = _get_grade_table(conn)
+    matched = grades_df[
+        (grades_df['type'] == 'health') &
+        (grades_df['salary_min'] <= base_salary) & (base_salary <= grades_df['salary_max'])
+    ]
     
-    if result:
-        return result[0]
+    if not matched.empty:
+        return matched.sort_values('start_date', ascending=False, kind='stable')['salary_max'].iloc[0].item()
     else:
         return base_salary
     
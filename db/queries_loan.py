@@ -1,5 +1,6 @@
 # db/queries_loan.py
 import pandas as pd
+from db.writer import serialized_write
 
 def get_loans_by_month(conn, year: int, month: int):
     """查詢指定月份的所有借支紀錄。"""
@@ -24,6 +25,7 @@ def get_employee_loan(conn, emp_id: int, year: int, month: int):
     result = conn.execute(sql, (emp_id, year, month)).fetchone()
     return result['amount'] if result else 0
 
+@serialized_write
 def upsert_loan_record(conn, data: dict):
     """新增或更新一筆借支紀錄。"""
     sql = """
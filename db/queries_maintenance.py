@@ -0,0 +1,41 @@
+# db/queries_maintenance.py
+"""
+資料庫查詢：資料庫維護紀錄 (maintenance_log)。
+"""
+import pandas as pd
+from db.writer import serialized_write
+
+
+def get_maintenance_log(conn, limit: int = 50):
+    """查詢最近的維護紀錄 (新到舊)。"""
+    query = """
+    SELECT started_at as '開始時間', trigger_source as '觸發方式', tasks as '執行項目',
+           duration_seconds as '耗時(秒)', size_before_bytes as '維護前大小',
+           size_after_bytes as '維護後大小', reclaimed_bytes as '回收空間',
+           integrity_result as '完整性檢查', status as '狀態', message as '訊息'
+    FROM maintenance_log ORDER BY id DESC LIMIT ?
+    """
+    return pd.read_sql_query(query, conn, params=(int(limit),))
+
+
+def get_last_maintenance_attempt(conn):
+    """
+    回傳 (最近一次維護的開始時間字串, 其後連續失敗的次數)，不論成功與否；沒有紀錄時回傳 (None, 0)。
+    連續失敗次數為最近一次成功之後的失敗紀錄筆數。
+    """
+    row = conn.execute("""
+        SELECT MAX(started_at),
+               SUM(CASE WHEN status != 'success' AND id > COALESCE(
+                   (SELECT MAX(id) FROM maintenance_log WHERE status = 'success'), 0) THEN 1 ELSE 0 END)
+        FROM maintenance_log
+    """).fetchone()
+    return (row[0], int(row[1] or 0)) if row else (None, 0)
+
+
+@serialized_write
+def add_maintenance_log(conn, record: dict):
+    """寫入一筆維護紀錄。"""
+    cols = ', '.join(record.keys())
+    placeholders = ', '.join('?' for _ in record)
+    conn.execute(f"INSERT INTO maintenance_log ({cols}) VALUES ({placeholders})", list(record.values()))
+    conn.commit()
@@ -0,0 +1,108 @@
+# db/queries_monthly_summary.py
+"""
+資料庫查詢：維護每月出勤彙總 (monthly_attendance_summary) 與每月請假彙總 (monthly_leave_summary)。
+彙總表以 (employee_id, year, month) 為鍵，由出勤/請假的寫入函式在同一個交易中增量更新：
+寫入前記下 change_log 水位，寫入後只重算水位之後受影響的員工月份。
+"""
+from db import queries_change_log as q_cl
+from db import queries_archive as q_archive
+
+SUMMARY_SOURCE_TABLES = ('attendance', 'leave_record')
+
+_ATTENDANCE_AGGREGATE = """
+    SELECT a.employee_id, k.year, k.month,
+           SUM(a.late_minutes), SUM(a.early_leave_minutes), SUM(a.absent_minutes), SUM(a.leave_minutes),
+           SUM(a.overtime1_minutes), SUM(a.overtime2_minutes), SUM(a.overtime3_minutes), COUNT(*)
+    FROM attendance a
+    JOIN temp._summary_keys k ON a.employee_id = k.employee_id AND STRFTIME('%Y-%m', a.date) = k.ym
+    GROUP BY a.employee_id, k.year, k.month
+"""
+
+_LEAVE_AGGREGATE = """
+    SELECT l.employee_id, k.year, k.month, l.leave_type, SUM(l.duration)
+    FROM leave_record l
+    JOIN temp._summary_keys k ON l.employee_id = k.employee_id AND STRFTIME('%Y-%m', l.start_date) = k.ym
+    WHERE l.status = '已通過'
+    GROUP BY l.employee_id, k.year, k.month, l.leave_type
+"""
+
+_SUMMARY_COLUMNS = """(employee_id, year, month, late_minutes, early_leave_minutes, absent_minutes, leave_minutes,
+                       overtime1_minutes, overtime2_minutes, overtime3_minutes, days_recorded)"""
+
+
+def _load_keys(cursor, keys):
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS _summary_keys (employee_id INTEGER, year INTEGER, month INTEGER, ym TEXT)")
+    cursor.execute("DELETE FROM temp._summary_keys")
+    cursor.executemany(
+        "INSERT INTO temp._summary_keys VALUES (?, ?, ?, ?)",
+        [(int(e), int(y), int(m), f"{int(y)}-{int(m):02d}") for e, y, m in keys]
+    )
+
+
+def refresh_monthly_summaries(conn, attendance_keys=(), leave_keys=()):
+    """
+    重算指定 (employee_id, year, month) 的彙總列 (不 commit，由呼叫端的交易一併提交)。
+    來源資料已不存在的鍵會被刪除。
+    """
+    cursor = conn.cursor()
+    attendance_keys = list(attendance_keys)
+    leave_keys = list(leave_keys)
+    key_filter = "(employee_id, year, month) IN (SELECT employee_id, year, month FROM temp._summary_keys)"
+
+    if attendance_keys:
+        _load_keys(cursor, attendance_keys)
+        cursor.execute(f"DELETE FROM monthly_attendance_summary WHERE {key_filter}")
+        cursor.execute(f"INSERT INTO monthly_attendance_summary {_SUMMARY_COLUMNS} {_ATTENDANCE_AGGREGATE}")
+    if leave_keys:
+        _load_keys(cursor, leave_keys)
+        cursor.execute(f"DELETE FROM monthly_leave_summary WHERE {key_filter}")
+        cursor.execute(f"INSERT INTO monthly_leave_summary (employee_id, year, month, leave_type, hours) {_LEAVE_AGGREGATE}")
+    if attendance_keys or leave_keys:
+        cursor.execute("DELETE FROM temp._summary_keys")
+
+
+def refresh_monthly_summaries_since(conn, watermark: int):
+    """依 change_log 中水位之後的出勤/請假異動，重算受影響的彙總列。"""
+    changes = q_cl.get_changes_since(conn, watermark, tables=list(SUMMARY_SOURCE_TABLES))
+    changes = changes.dropna(subset=['employee_id', 'year', 'month'])
+    if changes.empty:
+        return
+    key_cols = ['employee_id', 'year', 'month']
+    att_keys = changes.loc[changes['table_name'] == 'attendance', key_cols].drop_duplicates()
+    leave_keys = changes.loc[changes['table_name'] == 'leave_record', key_cols].drop_duplicates()
+    refresh_monthly_summaries(
+        conn,
+        attendance_keys=att_keys.itertuples(index=False, name=None),
+        leave_keys=leave_keys.itertuples(index=False, name=None),
+    )
+
+
+def rebuild_monthly_summaries(conn):
+    """全量重建彙總表 (初始化資料庫或資料修復時使用)，已封存的年度也一併納入。"""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM monthly_attendance_summary")
+    cursor.execute("DELETE FROM monthly_leave_summary")
+    # 每個年度的資料只存在於主資料庫或其中一個封存檔，可逐一來源彙總後寫入；
+    # 封存年度以每批最多 MAX_ATTACHED_ARCHIVES 個查詢，換批前先 commit (交易中無法 ATTACH)
+    for batch in [None] + q_archive.archive_year_batches(conn):
+        if batch is None:
+            attendance_src, leave_src = 'attendance', 'leave_record'
+        else:
+            attendance_src = q_archive.archived_source(conn, 'attendance', batch, include_main=False)
+            leave_src = q_archive.archived_source(conn, 'leave_record', batch, include_main=False)
+        cursor.execute(f"""
+            INSERT INTO monthly_attendance_summary {_SUMMARY_COLUMNS}
+            SELECT employee_id, CAST(STRFTIME('%Y', date) AS INTEGER), CAST(STRFTIME('%m', date) AS INTEGER),
+                   SUM(late_minutes), SUM(early_leave_minutes), SUM(absent_minutes), SUM(leave_minutes),
+                   SUM(overtime1_minutes), SUM(overtime2_minutes), SUM(overtime3_minutes), COUNT(*)
+            FROM {attendance_src} WHERE STRFTIME('%Y-%m', date) IS NOT NULL
+            GROUP BY employee_id, STRFTIME('%Y-%m', date)
+        """)
+        cursor.execute(f"""
+            INSERT INTO monthly_leave_summary (employee_id, year, month, leave_type, hours)
+            SELECT employee_id, CAST(STRFTIME('%Y', start_date) AS INTEGER), CAST(STRFTIME('%m', start_date) AS INTEGER),
+                   leave_type, SUM(duration)
+            FROM {leave_src} WHERE status = '已通過' AND STRFTIME('%Y-%m', start_date) IS NOT NULL
+            GROUP BY employee_id, STRFTIME('%Y-%m', start_date), leave_type
+        """)
+        conn.commit()
@@ -1,6 +1,8 @@
 # db/queries_performance_bonus.py
 import pandas as pd
+from db.writer import serialized_write
 
+@serialized_write
 def save_performance_bonuses(conn, year: int, month: int, bonus_df: pd.DataFrame):
     """
     將計算好的績效獎金批次存入資料庫。
@@ -1,6 +1,7 @@
 # db/queries_report.py
 import pandas as pd
 from datetime import date
+from utils.helpers import get_monthly_dates
 
 def get_employee_basic_data_for_report(conn):
     """
@@ -40,4 +41,25 @@ def get_employee_basic_data_for_report(conn):
     ORDER BY c.name, e.hr_code;
     """
     df = pd.read_sql_query(query, conn)
-    return df
\ No newline at end of file
+    return df
+
+
+def get_employee_groups_for_month(conn, year: int, month: int):
+    """
+    查詢每位員工的部門 (dept) 與該月份有效的最新加保公司名稱 (company)，供報表分組使用。
+    """
+    month_start, month_end = get_monthly_dates(year, month)
+    query = """
+    WITH month_insurance AS (
+        SELECT employee_id, company_id,
+               ROW_NUMBER() OVER(PARTITION BY employee_id ORDER BY start_date DESC) as rn
+        FROM employee_company_history
+        WHERE date(start_date) <= date(?)
+          AND (end_date IS NULL OR TRIM(end_date) = '' OR date(end_date) >= date(?))
+    )
+    SELECT e.id as employee_id, e.dept, c.name as company
+    FROM employee e
+    LEFT JOIN month_insurance mi ON e.id = mi.employee_id AND mi.rn = 1
+    LEFT JOIN company c ON mi.company_id = c.id
+    """
+    return pd.read_sql_query(query, conn, params=(month_end, month_start))
@@ -5,6 +5,8 @@
 import pandas as pd
 import re
 from utils.helpers import get_monthly_dates
+from . import queries_employee as q_emp
+from db.writer import serialized_write
 
 def get_salary_base_history(conn):
     """取得所有員工的薪資基準歷史紀錄，並包含健保狀態與手動調整欄位。"""
@@ -53,6 +55,7 @@ def get_employees_below_minimum_wage(conn, new_minimum_wage: int):
     """
     return pd.read_sql_query(query, conn, params=(new_minimum_wage,))
 
+@serialized_write
 def batch_update_base_salary(conn, preview_df: pd.DataFrame, new_wage: int, effective_date):
     """根據預覽 DataFrame，為指定員工批次新增一筆調薪紀錄。"""
     cursor = conn.cursor()
@@ -91,13 +94,12 @@ def get_batch_employee_insurance_salary(conn, emp_ids: list, year: int, month: i
         salaries[emp_id] = base_info['insurance_salary'] if base_info and base_info['insurance_salary'] else (base_info['base_salary'] if base_info else 0)
     return salaries
 
+@serialized_write
 def batch_add_or_update_salary_base_history(conn, df: pd.DataFrame):
     cursor = conn.cursor()
     report = {'inserted': 0, 'updated': 0, 'failed': 0, 'errors': []}
     
-    emp_df_db = pd.read_sql("SELECT name_ch, id FROM employee", conn)
-    emp_df_db['clean_name'] = emp_df_db['name_ch'].astype(str).str.replace(r'\s+', '', regex=True)
-    emp_map = emp_df_db.set_index('clean_name')['id'].to_dict()
+    emp_map = q_emp.get_employee_map(conn).set_index('clean_name')['employee_id'].to_dict()
 
     sql = """
     INSERT INTO salary_base_history 
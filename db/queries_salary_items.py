@@ -4,7 +4,10 @@
 """
 import pandas as pd
 import sqlite3
+from db.reference_cache import cached_reference, bump_data_version
+from db.writer import serialized_write
 
+@cached_reference('salary_item')
 def get_all_salary_items(conn, active_only=False):
     """取得所有薪資項目。"""
     query = "SELECT * FROM salary_item ORDER BY type, id"
@@ -12,20 +15,25 @@ def get_all_salary_items(conn, active_only=False):
         query = "SELECT * FROM salary_item WHERE is_active = 1"
     return pd.read_sql_query(query, conn)
 
+@serialized_write
 def add_salary_item(conn, data: dict):
     """新增一個薪資項目。"""
     cursor = conn.cursor()
     sql = "INSERT INTO salary_item (name, type, is_active) VALUES (?, ?, ?)"
     cursor.execute(sql, (data['name'], data['type'], data['is_active']))
     conn.commit()
+    bump_data_version('salary_item')
 
+@serialized_write
 def update_salary_item(conn, item_id: int, data: dict):
     """更新一個現有的薪資項目。"""
     cursor = conn.cursor()
     sql = "UPDATE salary_item SET name = ?, type = ?, is_active = ? WHERE id = ?"
     cursor.execute(sql, (data['name'], data['type'], data['is_active'], item_id))
     conn.commit()
+    bump_data_version('salary_item')
 
+@serialized_write
 def delete_salary_item(conn, item_id: int):
     """刪除一個薪資項目。"""
     cursor = conn.cursor()
@@ -34,16 +42,24 @@ def delete_salary_item(conn, item_id: int):
         sql = "DELETE FROM salary_item WHERE id = ?"
         cursor.execute(sql, (item_id,))
         conn.commit()
+        bump_data_version()
         return cursor.rowcount
     except sqlite3.IntegrityError:
         conn.rollback()
         raise Exception("此項目已被薪資單引用，無法刪除。您可以將其狀態改為「停用」。")
 
+@cached_reference('salary_item')
 def get_item_types(conn):
     """獲取薪資項目的名稱與類型對應字典。"""
     return pd.read_sql("SELECT name, type FROM salary_item", conn).set_index('name')['type'].to_dict()
 
+@cached_reference('salary_item')
+def get_item_id_map(conn):
+    """獲取薪資項目的名稱與 ID 對應字典。"""
+    return pd.read_sql("SELECT id, name FROM salary_item", conn).set_index('name')['id'].to_dict()
+
 # --- [新增函式] ---
+@serialized_write
 def batch_add_or_update_salary_items(conn, df: pd.DataFrame):
     """批次新增或更新薪資項目。"""
     cursor = conn.cursor()
@@ -60,6 +76,7 @@ def batch_add_or_update_salary_items(conn, df: pd.DataFrame):
         ]
         cursor.executemany(sql, data_tuples)
         conn.commit()
+        bump_data_version('salary_item')
         # 在SQLite中，executemany後的rowcount不準確，但此處回報受影響行數
         return {'inserted': cursor.rowcount, 'updated': 0} 
     except Exception as e:
@@ -4,6 +4,8 @@
 """
 import pandas as pd
 from utils.helpers import get_monthly_dates
+from . import queries_salary_items as q_items
+from . import queries_archive as q_archive
 
 def get_salary_report_for_editing(conn, year, month):
     """
@@ -33,9 +35,10 @@ def get_salary_report_for_editing(conn, year, month):
         WHERE year = ? AND month = ?
     """, conn, params=(year, month))
 
-    details_query = """
+    detail_src = q_archive.archived_source(conn, 'salary_detail', [year])
+    details_query = f"""
     SELECT s.employee_id, si.name as item_name, sd.amount
-    FROM salary_detail sd
+    FROM {detail_src} sd
     JOIN salary_item si ON sd.salary_item_id = si.id
     JOIN salary s ON sd.salary_id = s.id
     WHERE s.year = ? AND s.month = ?
@@ -51,7 +54,7 @@ def get_salary_report_for_editing(conn, year, month):
         report_df = pd.merge(report_df, pivot_details, on='employee_id', how='left')
 
     report_df['status'] = report_df['status'].fillna('draft')
-    item_types = pd.read_sql("SELECT name, type FROM salary_item", conn).set_index('name')['type'].to_dict()
+    item_types = q_items.get_item_types(conn)
 
     all_items = list(item_types.keys())
     for item in all_items:
@@ -111,10 +114,11 @@ def get_annual_salary_summary_data(conn, year: int, item_ids: list, include_id_n
     if include_id_no:
         select_cols += ", e.id_no as '身分證字號'"
     
+    detail_src = q_archive.archived_source(conn, 'salary_detail', [year])
     query = f"""
     SELECT
         {select_cols}, s.month, SUM(sd.amount) as monthly_total
-    FROM salary_detail sd
+    FROM {detail_src} sd
     JOIN salary s ON sd.salary_id = s.id
     JOIN employee e ON s.employee_id = e.id
     WHERE s.year = ? AND sd.salary_item_id IN ({placeholders}) AND s.status = 'final'
@@ -129,10 +133,11 @@ def get_cumulative_bonus_for_period(conn, employee_id: int, year: int, start_mon
         return 0, 0
         
     placeholders = ','.join('?' for _ in bonus_item_names)
+    detail_src = q_archive.archived_source(conn, 'salary_detail', [year])
     
     bonus_query = f"""
     SELECT SUM(sd.amount)
-    FROM salary_detail sd
+    FROM {detail_src} sd
     JOIN salary s ON sd.salary_id = s.id
     JOIN salary_item si ON sd.salary_item_id = si.id
     WHERE s.employee_id = ? AND s.year = ? AND s.month BETWEEN ? AND ? AND si.name IN ({placeholders});
@@ -141,9 +146,9 @@ def get_cumulative_bonus_for_period(conn, employee_id: int, year: int, start_mon
     cursor = conn.cursor()
     cumulative_bonus = cursor.execute(bonus_query, bonus_params).fetchone()[0] or 0
     
-    premium_query = """
+    premium_query = f"""
     SELECT SUM(sd.amount)
-    FROM salary_detail sd
+    FROM {detail_src} sd
     JOIN salary s ON sd.salary_id = s.id
     JOIN salary_item si ON sd.salary_item_id = si.id
     WHERE s.employee_id = ? AND s.year = ? AND s.month BETWEEN ? AND ? AND si.name = '二代健保(高額獎金)';
@@ -156,9 +161,10 @@ def get_cumulative_bonus_for_period(conn, employee_id: int, year: int, start_mon
 def get_cumulative_bonus_for_year(conn, employee_id: int, year: int, bonus_item_names: list):
     if not bonus_item_names: return 0, 0
     placeholders = ','.join('?' for _ in bonus_item_names)
+    detail_src = q_archive.archived_source(conn, 'salary_detail', [year])
     bonus_query = f"""
     SELECT SUM(sd.amount)
-    FROM salary_detail sd
+    FROM {detail_src} sd
     JOIN salary s ON sd.salary_id = s.id
     JOIN salary_item si ON sd.salary_item_id = si.id
     WHERE s.employee_id = ? AND s.year = ? AND si.name IN ({placeholders});
@@ -166,9 +172,9 @@ def get_cumulative_bonus_for_year(conn, employee_id: int, year: int, bonus_item_
     bonus_params = [employee_id, year] + bonus_item_names
     cursor = conn.cursor()
     cumulative_bonus = cursor.execute(bonus_query, bonus_params).fetchone()[0] or 0
-    premium_query = """
+    premium_query = f"""
     SELECT SUM(sd.amount)
-    FROM salary_detail sd
+    FROM {detail_src} sd
     JOIN salary s ON sd.salary_id = s.id
     JOIN salary_item si ON sd.salary_item_id = si.id
     WHERE s.employee_id = ? AND s.year = ? AND si.name = '二代健保(高額獎金)';
@@ -4,7 +4,12 @@
 """
 import pandas as pd
 from . import queries_insurance as q_ins
+from . import queries_employee as q_emp
+from . import queries_salary_items as q_items
+from . import queries_archive as q_archive
+from db.writer import serialized_write
 
+@serialized_write
 def delete_salary_drafts(conn, year: int, month: int):
     """
     刪除指定月份所有狀態為 'draft' 的薪資主紀錄。
@@ -81,10 +86,12 @@ def _recalculate_and_save_salary_summaries(conn, salary_ids: list, year: int, mo
     cursor.executemany(update_sql, summary_updates)
 
 
+@serialized_write
 def save_salary_draft(conn, year, month, df: pd.DataFrame):
+    q_archive.ensure_years_not_archived(conn, [year])
     cursor = conn.cursor()
-    emp_map = pd.read_sql("SELECT id, name_ch FROM employee", conn).set_index('name_ch')['id'].to_dict()
-    item_map = pd.read_sql("SELECT id, name FROM salary_item", conn).set_index('name')['id'].to_dict()
+    emp_map = q_emp.get_employee_id_map(conn)
+    item_map = q_items.get_item_id_map(conn)
     
     try:
         cursor.execute("BEGIN TRANSACTION")
@@ -133,9 +140,11 @@ def save_salary_draft(conn, year, month, df: pd.DataFrame):
         conn.rollback()
         raise e
 
+@serialized_write
 def finalize_salary_records(conn, year, month, df: pd.DataFrame):
+    q_archive.ensure_years_not_archived(conn, [year])
     cursor = conn.cursor()
-    emp_map = pd.read_sql("SELECT id, name_ch FROM employee", conn).set_index('name_ch')['id'].to_dict()
+    emp_map = q_emp.get_employee_id_map(conn)
 
     for _, row in df.iterrows():
         emp_id = emp_map.get(row['員工姓名'])
@@ -162,8 +171,10 @@ def finalize_salary_records(conn, year, month, df: pd.DataFrame):
 
     conn.commit()
 
+@serialized_write
 def revert_salary_to_draft(conn, year, month, employee_ids: list):
     if not employee_ids: return 0
+    q_archive.ensure_years_not_archived(conn, [year])
     cursor = conn.cursor()
     placeholders = ','.join('?' for _ in employee_ids)
     sql = f"UPDATE salary SET status = 'draft' WHERE year = ? AND month = ? AND employee_id IN ({placeholders}) AND status = 'final'"
@@ -172,6 +183,7 @@ def revert_salary_to_draft(conn, year, month, employee_ids: list):
     conn.commit()
     return cursor.rowcount
 
+@serialized_write
 def batch_upsert_salary_details(conn, data_to_upsert: list):
     if not data_to_upsert: return 0
     cursor = conn.cursor()
@@ -0,0 +1,121 @@
+# db/reference_cache.py
+"""
+參照資料快取：salary_item、system_config、minimum_wage_history、insurance_grade、
+company 與員工姓名對照表等「讀多寫少」的資料表，會在每個頁面與每次薪資試算中被重複讀取。
+
+- 快取為行程層級 (process-wide)，所有 Streamlit session 共用。
+- 每個資料表都有一個資料版本號 (data version)，任何寫入路徑在 commit 之後必須呼叫
+  bump_data_version()；快取項目只有在其依賴的資料表版本完全一致時才會被使用，
+  因此寫入之後不可能讀到舊資料。
+- 快取以資料庫檔案路徑區分，記憶體資料庫 (:memory:) 不會被快取。
+"""
+import contextlib
+import copy
+import functools
+import threading
+
+_lock = threading.RLock()
+_local = threading.local()
+_table_versions = {}
+_global_version = 0
+_entries = {}
+
+
+def bump_data_version(*tables):
+    """
+    在寫入 commit 之後呼叫，使相關快取失效。
+    未指定資料表時，視為所有資料表皆已變更。
+    若目前執行緒處於 defer_version_bumps() 之中，則延後到交易真正 commit 後才生效。
+    """
+    global _global_version
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending.append(tables)
+        return
+    with _lock:
+        if not tables:
+            _global_version += 1
+            return
+        for table in tables:
+            _table_versions[table] = _table_versions.get(table, 0) + 1
+
+
+@contextlib.contextmanager
+def defer_version_bumps():
+    """
+    收集區塊內所有的 bump_data_version() 呼叫而不立即生效，
+    由呼叫端在交易 commit 之後以 apply_version_bumps() 套用。
+    """
+    pending = []
+    _local.pending = pending
+    try:
+        yield pending
+    finally:
+        _local.pending = None
+
+
+def apply_version_bumps(pending):
+    """套用 defer_version_bumps() 收集到的版本遞增。"""
+    for tables in pending:
+        bump_data_version(*tables)
+
+
+def get_data_version(*tables):
+    """回傳指定資料表目前的版本快照，可作為外部快取的比對依據。"""
+    with _lock:
+        return (_global_version,) + tuple(_table_versions.get(t, 0) for t in tables)
+
+
+def clear_cache():
+    """清除所有快取項目 (例如還原資料庫之後)。"""
+    with _lock:
+        _entries.clear()
+    bump_data_version()
+
+
+def main_database_path(conn):
+    """回傳連線主資料庫 (main) 的檔案路徑；記憶體資料庫回傳 None。"""
+    try:
+        for row in conn.execute("PRAGMA database_list").fetchall():
+            if row[1] == 'main':
+                return row[2] or None
+    except Exception:
+        return None
+    return None
+
+
+def _copy_result(value):
+    """回傳結果的複本，避免呼叫端修改到快取中的物件。"""
+    if hasattr(value, 'copy') and callable(value.copy):
+        return value.copy()
+    return copy.deepcopy(value)
+
+
+def cached_reference(*tables):
+    """
+    裝飾器：快取 `func(conn, *args)` 的結果，直到任一依賴資料表的版本改變。
+    版本快照在查詢「之前」取得，確保與寫入同時進行的讀取不會以新版本號存入舊資料。
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(conn, *args, **kwargs):
+            db_key = main_database_path(conn)
+            if db_key is None:
+                return func(conn, *args, **kwargs)
+
+            key = (func.__module__, func.__qualname__, db_key, args, tuple(sorted(kwargs.items())))
+            version = get_data_version(*tables)
+            with _lock:
+                entry = _entries.get(key)
+            if entry is not None and entry[0] == version:
+                return _copy_result(entry[1])
+
+            result = func(conn, *args, **kwargs)
+            if getattr(conn, 'in_transaction', False):
+                # 交易中讀到的可能是尚未 commit 的資料，不可存入共用快取
+                return result
+            with _lock:
+                _entries[key] = (version, result)
+            return _copy_result(result)
+        return wrapper
+    return decorator
@@ -196,6 +196,104 @@ CREATE TABLE IF NOT EXISTS monthly_loan (
     UNIQUE(employee_id, year, month)
 );
 
+-- 每月出勤彙總表 (由出勤寫入函式增量維護，供薪資計算與報表讀取)
+CREATE TABLE IF NOT EXISTS monthly_attendance_summary (
+    employee_id INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    late_minutes INTEGER, early_leave_minutes INTEGER, absent_minutes INTEGER, leave_minutes INTEGER,
+    overtime1_minutes INTEGER, overtime2_minutes INTEGER, overtime3_minutes INTEGER,
+    days_recorded INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (employee_id, year, month)
+);
+
+-- 每月請假彙總表 (僅統計已通過的假單，單位：小時)
+CREATE TABLE IF NOT EXISTS monthly_leave_summary (
+    employee_id INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    leave_type TEXT NOT NULL,
+    hours REAL,
+    PRIMARY KEY (employee_id, year, month, leave_type)
+);
+
+-- 年度封存紀錄表 (attendance、salary_detail、leave_record 已搬移至 data/archive/ 下的年度封存檔)
+CREATE TABLE IF NOT EXISTS archive_registry (
+    year INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    attendance_rows INTEGER DEFAULT 0,
+    salary_detail_rows INTEGER DEFAULT 0,
+    leave_record_rows INTEGER DEFAULT 0,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 資料庫維護紀錄表 (ANALYZE / 增量 VACUUM / 完整性檢查)
+CREATE TABLE IF NOT EXISTS maintenance_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TIMESTAMP NOT NULL,
+    duration_seconds REAL,
+    trigger_source TEXT, -- 'scheduled' 或 'manual'
+    tasks TEXT,
+    size_before_bytes INTEGER,
+    size_after_bytes INTEGER,
+    reclaimed_bytes INTEGER,
+    integrity_result TEXT,
+    status TEXT NOT NULL, -- 'success' 或 'failed'
+    message TEXT
+);
+
+-- 上傳檔案匯入封存表 (以內容雜湊值辨識重複上傳，原始檔壓縮保存於 data/imports/)
+CREATE TABLE IF NOT EXISTS import_archive (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content_hash TEXT NOT NULL, -- SHA-256
+    import_type TEXT NOT NULL, -- 'attendance', 'leave' ...
+    file_name TEXT,
+    file_size INTEGER,
+    stored_file TEXT NOT NULL,
+    watermark_before INTEGER, -- 匯入前的 change_log 水位
+    watermark_after INTEGER, -- 匯入後的 change_log 水位
+    result TEXT, -- 匯入結果 (JSON)
+    import_count INTEGER NOT NULL DEFAULT 1,
+    imported_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (content_hash, import_type)
+);
+
+-- 國定假日行事曆 (每日一列，來源為政府行政機關辦公日曆表；計算請假時數時不需連網)
+CREATE TABLE IF NOT EXISTS calendar_day (
+    date DATE PRIMARY KEY,
+    is_holiday INTEGER NOT NULL DEFAULT 0, -- 放假日 (含週末)
+    is_makeup_workday INTEGER NOT NULL DEFAULT 0, -- 週末補班日
+    description TEXT,
+    source TEXT, -- 'data.gov.tw' 或匯入的檔名
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 特休台帳 (週年制)：每位員工每個特休週期一列，依請假異動 (change_log) 與到職/離職日增量維護
+CREATE TABLE IF NOT EXISTS annual_leave_ledger (
+    employee_id INTEGER NOT NULL,
+    cycle_no INTEGER NOT NULL, -- 0 為滿半年 (6個月-1年)，N 為滿 N 年
+    period_start DATE NOT NULL,
+    period_end DATE NOT NULL, -- 週期最後一天 (下一個週期起日的前一天)
+    entitled_days REAL NOT NULL,
+    used_hours REAL NOT NULL DEFAULT 0,
+    used_days REAL NOT NULL DEFAULT 0,
+    remaining_days REAL NOT NULL DEFAULT 0,
+    settle_year INTEGER NOT NULL, -- 未休天數折發工資的薪資年月 (週期結束隔天所在月份)
+    settle_month INTEGER NOT NULL,
+    status TEXT NOT NULL, -- '進行中 (目前年度)'、'過期 (可結算)'、'過期 (已休完)'
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (employee_id, cycle_no),
+    FOREIGN KEY(employee_id) REFERENCES employee(id) ON DELETE CASCADE
+);
+
+-- 特休台帳的維護狀態：watermark 為已處理到的 change_log 水位，as_of 為狀態計算的基準日
+CREATE TABLE IF NOT EXISTS annual_leave_ledger_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    watermark INTEGER,
+    as_of DATE,
+    rebuilt_at TIMESTAMP
+);
+
 -- --- 索引優化 (Index Optimizations) ---
 CREATE INDEX IF NOT EXISTS idx_employee_id_on_attendance ON attendance (employee_id);
 CREATE INDEX IF NOT EXISTS idx_employee_id_on_special_attendance ON special_attendance (employee_id);
@@ -209,4 +307,230 @@ CREATE INDEX IF NOT EXISTS idx_date_on_attendance ON attendance (date);
 CREATE INDEX IF NOT EXISTS idx_date_on_leave_record ON leave_record (start_date);
 CREATE INDEX IF NOT EXISTS idx_year_month_on_monthly_bonus_details ON monthly_bonus_details (year, month);
 CREATE INDEX IF NOT EXISTS idx_employee_id_on_monthly_performance_bonus ON monthly_performance_bonus (employee_id);
-CREATE INDEX IF NOT EXISTS idx_employee_id_on_monthly_loan ON monthly_loan (employee_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_employee_id_on_monthly_loan ON monthly_loan (employee_id);
+CREATE INDEX IF NOT EXISTS idx_year_month_on_monthly_attendance_summary ON monthly_attendance_summary (year, month);
+CREATE INDEX IF NOT EXISTS idx_settle_month_on_annual_leave_ledger ON annual_leave_ledger (settle_year, settle_month);
+
+-- --- 異動紀錄 (Change Data Capture) ---
+-- 由下方觸發器自動寫入，供增量計算 (月彙總、特休台帳等) 以 id 作為水位 (watermark) 讀取異動。
+-- year/month 為該筆資料所屬的月份 (以日期欄位或 year/month 欄位推得)。
+CREATE TABLE IF NOT EXISTS change_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    row_id INTEGER NOT NULL,
+    employee_id INTEGER,
+    year INTEGER,
+    month INTEGER,
+    operation TEXT NOT NULL, -- 'INSERT', 'UPDATE', 'DELETE'
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 異動紀錄清理狀態：pruned_through 之前 (含) 的紀錄已被刪除，水位低於此值的讀取端必須全量重算。
+CREATE TABLE IF NOT EXISTS change_log_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    pruned_through INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO change_log_state (id, pruned_through) VALUES (1, 0);
+
+-- 每寫入 500 筆異動紀錄，自動清除超過保留天數 (system_config.CHANGE_LOG_RETENTION_DAYS，預設 90 天) 的紀錄
+CREATE TRIGGER IF NOT EXISTS trg_change_log_auto_prune AFTER INSERT ON change_log
+WHEN NEW.id % 500 = 0
+BEGIN
+    UPDATE change_log_state SET pruned_through = MAX(pruned_through, COALESCE((
+        SELECT MAX(id) FROM change_log
+        WHERE changed_at < datetime('now', '-' || COALESCE(
+            (SELECT CAST(value AS INTEGER) FROM system_config WHERE key = 'CHANGE_LOG_RETENTION_DAYS'), 90) || ' days')
+    ), 0)) WHERE id = 1;
+    DELETE FROM change_log WHERE id <= (SELECT pruned_through FROM change_log_state WHERE id = 1);
+END;
+
+-- attendance
+CREATE TRIGGER IF NOT EXISTS trg_attendance_change_log_insert AFTER INSERT ON attendance
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('attendance', NEW.id, NEW.employee_id, CAST(substr(replace(NEW.date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(NEW.date, '/', '-'), 6, 2) AS INTEGER), 'INSERT');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_attendance_change_log_update AFTER UPDATE ON attendance
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('attendance', NEW.id, NEW.employee_id, CAST(substr(replace(NEW.date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(NEW.date, '/', '-'), 6, 2) AS INTEGER), 'UPDATE');
+    -- 員工或月份被改動時，舊的月份也同樣受影響
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    SELECT 'attendance', OLD.id, OLD.employee_id, CAST(substr(replace(OLD.date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(OLD.date, '/', '-'), 6, 2) AS INTEGER), 'UPDATE'
+    WHERE OLD.employee_id IS NOT NEW.employee_id OR substr(replace(OLD.date, '/', '-'), 1, 7) IS NOT substr(replace(NEW.date, '/', '-'), 1, 7);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_attendance_change_log_delete AFTER DELETE ON attendance
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('attendance', OLD.id, OLD.employee_id, CAST(substr(replace(OLD.date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(OLD.date, '/', '-'), 6, 2) AS INTEGER), 'DELETE');
+END;
+
+-- leave_record
+CREATE TRIGGER IF NOT EXISTS trg_leave_record_change_log_insert AFTER INSERT ON leave_record
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('leave_record', NEW.id, NEW.employee_id, CAST(substr(replace(NEW.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(NEW.start_date, '/', '-'), 6, 2) AS INTEGER), 'INSERT');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_leave_record_change_log_update AFTER UPDATE ON leave_record
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('leave_record', NEW.id, NEW.employee_id, CAST(substr(replace(NEW.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(NEW.start_date, '/', '-'), 6, 2) AS INTEGER), 'UPDATE');
+    -- 員工或月份被改動時，舊的月份也同樣受影響
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    SELECT 'leave_record', OLD.id, OLD.employee_id, CAST(substr(replace(OLD.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(OLD.start_date, '/', '-'), 6, 2) AS INTEGER), 'UPDATE'
+    WHERE OLD.employee_id IS NOT NEW.employee_id OR substr(replace(OLD.start_date, '/', '-'), 1, 7) IS NOT substr(replace(NEW.start_date, '/', '-'), 1, 7);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_leave_record_change_log_delete AFTER DELETE ON leave_record
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('leave_record', OLD.id, OLD.employee_id, CAST(substr(replace(OLD.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(OLD.start_date, '/', '-'), 6, 2) AS INTEGER), 'DELETE');
+END;
+
+-- special_attendance
+CREATE TRIGGER IF NOT EXISTS trg_special_attendance_change_log_insert AFTER INSERT ON special_attendance
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('special_attendance', NEW.id, NEW.employee_id, CAST(substr(replace(NEW.date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(NEW.date, '/', '-'), 6, 2) AS INTEGER), 'INSERT');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_special_attendance_change_log_update AFTER UPDATE ON special_attendance
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('special_attendance', NEW.id, NEW.employee_id, CAST(substr(replace(NEW.date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(NEW.date, '/', '-'), 6, 2) AS INTEGER), 'UPDATE');
+    -- 員工或月份被改動時，舊的月份也同樣受影響
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    SELECT 'special_attendance', OLD.id, OLD.employee_id, CAST(substr(replace(OLD.date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(OLD.date, '/', '-'), 6, 2) AS INTEGER), 'UPDATE'
+    WHERE OLD.employee_id IS NOT NEW.employee_id OR substr(replace(OLD.date, '/', '-'), 1, 7) IS NOT substr(replace(NEW.date, '/', '-'), 1, 7);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_special_attendance_change_log_delete AFTER DELETE ON special_attendance
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('special_attendance', OLD.id, OLD.employee_id, CAST(substr(replace(OLD.date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(OLD.date, '/', '-'), 6, 2) AS INTEGER), 'DELETE');
+END;
+
+-- salary_base_history
+CREATE TRIGGER IF NOT EXISTS trg_salary_base_history_change_log_insert AFTER INSERT ON salary_base_history
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('salary_base_history', NEW.id, NEW.employee_id, CAST(substr(replace(NEW.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(NEW.start_date, '/', '-'), 6, 2) AS INTEGER), 'INSERT');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_salary_base_history_change_log_update AFTER UPDATE ON salary_base_history
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('salary_base_history', NEW.id, NEW.employee_id, CAST(substr(replace(NEW.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(NEW.start_date, '/', '-'), 6, 2) AS INTEGER), 'UPDATE');
+    -- 員工或月份被改動時，舊的月份也同樣受影響
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    SELECT 'salary_base_history', OLD.id, OLD.employee_id, CAST(substr(replace(OLD.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(OLD.start_date, '/', '-'), 6, 2) AS INTEGER), 'UPDATE'
+    WHERE OLD.employee_id IS NOT NEW.employee_id OR substr(replace(OLD.start_date, '/', '-'), 1, 7) IS NOT substr(replace(NEW.start_date, '/', '-'), 1, 7);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_salary_base_history_change_log_delete AFTER DELETE ON salary_base_history
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('salary_base_history', OLD.id, OLD.employee_id, CAST(substr(replace(OLD.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(OLD.start_date, '/', '-'), 6, 2) AS INTEGER), 'DELETE');
+END;
+
+-- employee_salary_item
+CREATE TRIGGER IF NOT EXISTS trg_employee_salary_item_change_log_insert AFTER INSERT ON employee_salary_item
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('employee_salary_item', NEW.id, NEW.employee_id, CAST(substr(replace(NEW.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(NEW.start_date, '/', '-'), 6, 2) AS INTEGER), 'INSERT');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_employee_salary_item_change_log_update AFTER UPDATE ON employee_salary_item
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('employee_salary_item', NEW.id, NEW.employee_id, CAST(substr(replace(NEW.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(NEW.start_date, '/', '-'), 6, 2) AS INTEGER), 'UPDATE');
+    -- 員工或月份被改動時，舊的月份也同樣受影響
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    SELECT 'employee_salary_item', OLD.id, OLD.employee_id, CAST(substr(replace(OLD.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(OLD.start_date, '/', '-'), 6, 2) AS INTEGER), 'UPDATE'
+    WHERE OLD.employee_id IS NOT NEW.employee_id OR substr(replace(OLD.start_date, '/', '-'), 1, 7) IS NOT substr(replace(NEW.start_date, '/', '-'), 1, 7);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_employee_salary_item_change_log_delete AFTER DELETE ON employee_salary_item
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('employee_salary_item', OLD.id, OLD.employee_id, CAST(substr(replace(OLD.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(OLD.start_date, '/', '-'), 6, 2) AS INTEGER), 'DELETE');
+END;
+
+-- employee_company_history
+CREATE TRIGGER IF NOT EXISTS trg_employee_company_history_change_log_insert AFTER INSERT ON employee_company_history
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('employee_company_history', NEW.id, NEW.employee_id, CAST(substr(replace(NEW.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(NEW.start_date, '/', '-'), 6, 2) AS INTEGER), 'INSERT');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_employee_company_history_change_log_update AFTER UPDATE ON employee_company_history
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('employee_company_history', NEW.id, NEW.employee_id, CAST(substr(replace(NEW.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(NEW.start_date, '/', '-'), 6, 2) AS INTEGER), 'UPDATE');
+    -- 員工或月份被改動時，舊的月份也同樣受影響
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    SELECT 'employee_company_history', OLD.id, OLD.employee_id, CAST(substr(replace(OLD.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(OLD.start_date, '/', '-'), 6, 2) AS INTEGER), 'UPDATE'
+    WHERE OLD.employee_id IS NOT NEW.employee_id OR substr(replace(OLD.start_date, '/', '-'), 1, 7) IS NOT substr(replace(NEW.start_date, '/', '-'), 1, 7);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_employee_company_history_change_log_delete AFTER DELETE ON employee_company_history
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('employee_company_history', OLD.id, OLD.employee_id, CAST(substr(replace(OLD.start_date, '/', '-'), 1, 4) AS INTEGER), CAST(substr(replace(OLD.start_date, '/', '-'), 6, 2) AS INTEGER), 'DELETE');
+END;
+
+-- monthly_loan
+CREATE TRIGGER IF NOT EXISTS trg_monthly_loan_change_log_insert AFTER INSERT ON monthly_loan
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('monthly_loan', NEW.id, NEW.employee_id, NEW.year, NEW.month, 'INSERT');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_monthly_loan_change_log_update AFTER UPDATE ON monthly_loan
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('monthly_loan', NEW.id, NEW.employee_id, NEW.year, NEW.month, 'UPDATE');
+    -- 員工或月份被改動時，舊的月份也同樣受影響
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    SELECT 'monthly_loan', OLD.id, OLD.employee_id, OLD.year, OLD.month, 'UPDATE'
+    WHERE OLD.employee_id IS NOT NEW.employee_id OR OLD.year IS NOT NEW.year OR OLD.month IS NOT NEW.month;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_monthly_loan_change_log_delete AFTER DELETE ON monthly_loan
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('monthly_loan', OLD.id, OLD.employee_id, OLD.year, OLD.month, 'DELETE');
+END;
+
+-- monthly_bonus
+CREATE TRIGGER IF NOT EXISTS trg_monthly_bonus_change_log_insert AFTER INSERT ON monthly_bonus
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('monthly_bonus', NEW.id, NEW.employee_id, NEW.year, NEW.month, 'INSERT');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_monthly_bonus_change_log_update AFTER UPDATE ON monthly_bonus
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('monthly_bonus', NEW.id, NEW.employee_id, NEW.year, NEW.month, 'UPDATE');
+    -- 員工或月份被改動時，舊的月份也同樣受影響
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    SELECT 'monthly_bonus', OLD.id, OLD.employee_id, OLD.year, OLD.month, 'UPDATE'
+    WHERE OLD.employee_id IS NOT NEW.employee_id OR OLD.year IS NOT NEW.year OR OLD.month IS NOT NEW.month;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_monthly_bonus_change_log_delete AFTER DELETE ON monthly_bonus
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('monthly_bonus', OLD.id, OLD.employee_id, OLD.year, OLD.month, 'DELETE');
+END;
+
+-- monthly_performance_bonus
+CREATE TRIGGER IF NOT EXISTS trg_monthly_performance_bonus_change_log_insert AFTER INSERT ON monthly_performance_bonus
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('monthly_performance_bonus', NEW.id, NEW.employee_id, NEW.year, NEW.month, 'INSERT');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_monthly_performance_bonus_change_log_update AFTER UPDATE ON monthly_performance_bonus
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('monthly_performance_bonus', NEW.id, NEW.employee_id, NEW.year, NEW.month, 'UPDATE');
+    -- 員工或月份被改動時，舊的月份也同樣受影響
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    SELECT 'monthly_performance_bonus', OLD.id, OLD.employee_id, OLD.year, OLD.month, 'UPDATE'
+    WHERE OLD.employee_id IS NOT NEW.employee_id OR OLD.year IS NOT NEW.year OR OLD.month IS NOT NEW.month;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_monthly_performance_bonus_change_log_delete AFTER DELETE ON monthly_performance_bonus
+BEGIN
+    INSERT INTO change_log (table_name, row_id, employee_id, year, month, operation)
+    VALUES ('monthly_performance_bonus', OLD.id, OLD.employee_id, OLD.year, OLD.month, 'DELETE');
+END;
+
+CREATE INDEX IF NOT EXISTS idx_table_name_on_change_log ON change_log (table_name, id);
@@ -0,0 +1,344 @@
+# db/writer.py
+"""
+單一寫入執行緒 (single writer)：所有對主資料庫的寫入都排入同一個佇列，
+由一條專屬執行緒與專屬連線依序執行。
+
+- Streamlit 的每個 session 都在自己的執行緒中執行，過去多個 session 共用同一條連線直接寫入，
+  同時匯入時容易出現 "database is locked" 或交易互相交錯。
+- 佇列中同時等待的多個寫入工作會合併成一個交易 (group commit)，
+  每個工作各自包在一個 SAVEPOINT 中：單一工作失敗只會退回該工作本身，其他工作照常 commit。
+- 在合併交易中，工作函式內的 conn.commit() 不會真的 commit，conn.rollback() 只會退回到該工作的 SAVEPOINT，
+  "BEGIN TRANSACTION" 也會被略過，因此既有的寫入函式不需要修改。
+- 需要獨佔連線的操作 (例如 ATTACH、VACUUM、還原資料庫) 以 exclusive 工作提交，會單獨執行。
+- 寫入函式以 @serialized_write 裝飾後，呼叫端的用法不變 (同步回傳結果)；
+  若需要非同步，可改呼叫 `func.submit(conn, ...)` 取得 concurrent.futures.Future。
+"""
+import atexit
+import functools
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+from db.reference_cache import apply_version_bumps, defer_version_bumps, main_database_path
+
+DEFAULT_BUSY_TIMEOUT_MS = 30000
+MAX_BATCH_JOBS = 64
+_TRANSACTION_KEYWORDS = ('BEGIN', 'COMMIT', 'END', 'ROLLBACK')
+_STOP = object()
+
+
+def _is_transaction_control(sql: str) -> bool:
+    """判斷是否為交易控制語句 (ROLLBACK TO 除外)。"""
+    head = sql.lstrip().upper()
+    if not head.startswith(_TRANSACTION_KEYWORDS):
+        return False
+    return not (head.startswith('ROLLBACK') and ' TO ' in f" {head} ")
+
+
+class _WriterCursor(sqlite3.Cursor):
+    """合併交易中略過工作函式自行下達的 BEGIN/COMMIT/ROLLBACK。"""
+
+    def execute(self, sql, parameters=()):
+        if self.connection._savepoint is not None and _is_transaction_control(sql):
+            return self
+        return super().execute(sql, parameters)
+
+
+class _WriterConnection(sqlite3.Connection):
+    """寫入執行緒專用連線：在合併交易中把 commit/rollback 轉換為 SAVEPOINT 操作。"""
+
+    _savepoint = None
+
+    def cursor(self, factory=_WriterCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        # 內建的 Connection.execute 不會經過 cursor()，需在此轉交
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        if self._savepoint is None:
+            super().commit()
+
+    def rollback(self):
+        if self._savepoint is None:
+            super().rollback()
+        else:
+            super().execute(f"ROLLBACK TO SAVEPOINT {self._savepoint}")
+
+
+class _Job:
+    __slots__ = ('func', 'args', 'kwargs', 'exclusive', 'future')
+
+    def __init__(self, func, args, kwargs, exclusive):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.exclusive = exclusive
+        self.future = Future()
+
+
+class DatabaseWriter:
+    """擁有唯一寫入連線的背景執行緒。"""
+
+    def __init__(self, db_path, busy_timeout_ms: int = DEFAULT_BUSY_TIMEOUT_MS, max_batch_jobs: int = MAX_BATCH_JOBS):
+        self.db_path = str(db_path)
+        self.busy_timeout_ms = busy_timeout_ms
+        self.max_batch_jobs = max_batch_jobs
+        self._queue = queue.Queue()
+        self._ready = threading.Event()
+        self._startup_error = None
+        self.last_activity = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="hr-db-writer", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._startup_error is not None:
+            raise self._startup_error
+
+    # --- 公開介面 ---
+    def submit(self, func, *args, **kwargs) -> Future:
+        """提交一般寫入工作 `func(conn, *args, **kwargs)`，可與其他工作合併為同一交易。"""
+        return self._enqueue(_Job(func, args, kwargs, exclusive=False))
+
+    def submit_exclusive(self, func, *args, **kwargs) -> Future:
+        """提交需獨佔連線的工作，在交易之外單獨執行，交易由工作函式自行控制。"""
+        return self._enqueue(_Job(func, args, kwargs, exclusive=True))
+
+    def is_writer_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def pending_jobs(self) -> int:
+        return self._queue.qsize()
+
+    def shutdown(self, wait: bool = True):
+        """送出停止訊號；已排入的工作仍會先執行完畢。"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            if wait and not self.is_writer_thread():
+                self._thread.join()
+
+    # --- 內部實作 ---
+    def _enqueue(self, job):
+        if not self._thread.is_alive():
+            raise RuntimeError("資料庫寫入執行緒已停止。")
+        self._queue.put(job)
+        return job.future
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False, factory=_WriterConnection)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        # 交易中無法切換 foreign_keys，因此在連線建立時即開啟 (原本由刪除函式逐次開啟)
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            self._startup_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        carry = None
+        try:
+            while True:
+                job = carry if carry is not None else self._queue.get()
+                carry = None
+                if job is _STOP:
+                    break
+                if job.exclusive:
+                    self._run_exclusive(conn, job)
+                    continue
+
+                batch = [job]
+                while len(batch) < self.max_batch_jobs:
+                    try:
+                        nxt = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt is _STOP or nxt.exclusive:
+                        carry = nxt
+                        break
+                    batch.append(nxt)
+                self._run_batch(conn, batch)
+        finally:
+            self._drain_after_stop()
+            conn.close()
+
+    def _drain_after_stop(self):
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is not _STOP and job.future.set_running_or_notify_cancel():
+                job.future.set_exception(RuntimeError("資料庫寫入執行緒已停止。"))
+
+    def _run_batch(self, conn, batch):
+        try:
+            self._run_batch_jobs(conn, batch)
+        except BaseException as e:
+            # SAVEPOINT/RELEASE 失敗 (磁碟已滿、I/O 錯誤、工作自行結束了交易) 或更新資料版本時出錯：
+            # 退回交易並讓尚未完成的工作都收到例外，避免呼叫端永遠等待、寫入執行緒也不會因此停止
+            self._fail_unfinished(conn, batch, e)
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            self.last_activity = time.monotonic()
+
+    @staticmethod
+    def _fail_unfinished(conn, batch, error):
+        try:
+            if conn.in_transaction:
+                sqlite3.Connection.rollback(conn)
+        except Exception:
+            pass
+        for job in batch:
+            if not job.future.done():
+                job.future.set_exception(error)
+
+    def _run_batch_jobs(self, conn, batch):
+        base = sqlite3.Connection
+        outcomes = []
+        try:
+            base.execute(conn, "BEGIN IMMEDIATE")
+        except Exception as e:
+            for job in batch:
+                if job.future.set_running_or_notify_cancel():
+                    job.future.set_exception(e)
+            return
+
+        with defer_version_bumps() as pending_bumps:
+            for i, job in enumerate(batch):
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                savepoint = f"job_{i}"
+                base.execute(conn, f"SAVEPOINT {savepoint}")
+                conn._savepoint = savepoint
+                try:
+                    result = job.func(conn, *job.args, **job.kwargs)
+                    error = None
+                except BaseException as e:
+                    result, error = None, e
+                finally:
+                    conn._savepoint = None
+                if error is not None:
+                    base.execute(conn, f"ROLLBACK TO SAVEPOINT {savepoint}")
+                base.execute(conn, f"RELEASE SAVEPOINT {savepoint}")
+                outcomes.append((job, result, error))
+
+        try:
+            base.commit(conn)
+        except Exception as e:
+            if conn.in_transaction:
+                base.rollback(conn)
+            for job, _, _ in outcomes:
+                job.future.set_exception(e)
+            return
+
+        apply_version_bumps(pending_bumps)
+        for job, result, error in outcomes:
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+
+    def _run_exclusive(self, conn, job):
+        if not job.future.set_running_or_notify_cancel():
+            return
+        # 獨佔工作沿用 Python sqlite3 預設的隱含交易行為，由工作函式自行 commit
+        conn.isolation_level = ''
+        try:
+            result = job.func(conn, *job.args, **job.kwargs)
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.rollback()
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(result)
+        finally:
+            conn.isolation_level = None
+            self.last_activity = time.monotonic()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> DatabaseWriter:
+    """取得 (必要時啟動) 主資料庫的寫入執行緒。"""
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer._thread.is_alive():
+            from db.db_manager import DB_PATH
+            _writer = DatabaseWriter(DB_PATH)
+            atexit.register(_writer.shutdown)
+        return _writer
+
+
+def _writer_for(conn):
+    """
+    判斷此次寫入是否應交給寫入執行緒：
+    已在寫入執行緒中 (巢狀呼叫)、或連線不是主資料庫 (例如記憶體資料庫、其他檔案) 時直接執行。
+    """
+    if _writer is not None and _writer.is_writer_thread():
+        return None
+    path = main_database_path(conn)
+    if not path:
+        return None
+    from db.db_manager import DB_PATH
+    try:
+        if Path(path).resolve() != Path(DB_PATH).resolve():
+            return None
+    except OSError:
+        return None
+    return get_writer()
+
+
+def serialized_write(func=None, *, exclusive: bool = False):
+    """
+    裝飾器：將 `func(conn, ...)` 交由寫入執行緒執行並等待結果。
+    傳入的 conn 只用來判斷目標資料庫，實際寫入使用寫入執行緒自己的連線。
+    """
+    def decorator(func):
+        def _dispatch(writer, conn, args, kwargs) -> Future:
+            if exclusive:
+                return writer.submit_exclusive(func, *args, **kwargs)
+            return writer.submit(func, *args, **kwargs)
+
+        def _submit(conn, *args, **kwargs) -> Future:
+            writer = _writer_for(conn)
+            if writer is not None:
+                return _dispatch(writer, conn, args, kwargs)
+            future = Future()
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(func(conn, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+
+        @functools.wraps(func)
+        def wrapper(conn, *args, **kwargs):
+            writer = _writer_for(conn)
+            if writer is None:
+                return func(conn, *args, **kwargs)
+            return _dispatch(writer, conn, args, kwargs).result()
+
+        wrapper.submit = _submit
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
@@ -1,5 +1,6 @@
 # run.py (v2 - 修正版)
 import streamlit.web.cli as stcli
+import multiprocessing
 import sys
 import os
 
@@ -18,6 +19,9 @@ def get_streamlit_file_path(file_name):
     return os.path.join(application_path, file_name)
 
 if __name__ == "__main__":
+    # 打包成 .exe 後，出勤檔平行解析的子行程需要此呼叫才能正確啟動
+    multiprocessing.freeze_support()
+
     # 獲取主程式 app.py 的路徑
     app_path = get_streamlit_file_path('app.py')
     
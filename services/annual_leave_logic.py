@@ -0,0 +1,317 @@
+# services/annual_leave_logic.py
+"""
+特休 (週年制) 試算。
+- 到職週年區間與年資以整欄日期運算一次算出 (結果與 dateutil.relativedelta 相同)。
+- 所有員工本期已休的特休時數以一次查詢 (區間 JOIN 請假紀錄) 取得。
+- 試算結果依 employee、leave_record 的資料版本快取，員工或假單異動後自動重新計算。
+- 特休台帳 (annual_leave_ledger)：每位員工每個週期的應有、已休、剩餘與結算狀態，
+  第一次整批建立，之後依 change_log 的請假異動與到職/離職日的變更增量更新；薪資的「特休未休」由台帳讀取。
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from db import queries_employee as q_emp
+from db import queries_attendance as q_att
+from db import queries_annual_leave as q_al
+from db import queries_archive as q_archive
+from db import queries_change_log as q_cl
+from db.reference_cache import cached_reference
+
+ANNUAL_LEAVE_TYPE = '特休'
+ANNUAL_LEAVE_DEPTS = ['服務', '行政']
+HOURS_PER_DAY = 8
+HALF_YEAR_ENTITLED_DAYS = 3
+LEDGER_SOURCE_TABLES = ['leave_record']
+STATUS_CURRENT = '進行中 (目前年度)'
+STATUS_SETTLEABLE = '過期 (可結算)'
+STATUS_USED_UP = '過期 (已休完)'
+
+
+def calculate_leave_entitlement(years_of_service):
+    """依勞基法第 38 條，以年資 (年) 計算應給特休天數。"""
+    if years_of_service < 0.5: return 0
+    if years_of_service < 1: return 3
+    if years_of_service < 2: return 7
+    if years_of_service < 3: return 10
+    if years_of_service < 5: return 14
+    if years_of_service < 10: return 15
+    return min(15 + (int(years_of_service) - 9), 30)
+
+
+def leave_entitlement_days(service_years: pd.Series) -> pd.Series:
+    """calculate_leave_entitlement 的向量化版本。"""
+    years = service_years.to_numpy(dtype=float)
+    days = np.select(
+        [years < 0.5, years < 1, years < 2, years < 3, years < 5, years < 10],
+        [0, 3, 7, 10, 14, 15],
+        default=np.minimum(15 + (np.floor(np.nan_to_num(years)) - 9), 30),
+    )
+    return pd.Series(days.astype(int), index=service_years.index)
+
+
+def add_months(dates: pd.Series, months) -> pd.Series:
+    """整欄加上月數，日期超過該月最後一天時取月底 (與 relativedelta(months=n) 相同)。"""
+    months = np.asarray(months, dtype=np.int64)
+    total = dates.dt.year.to_numpy(dtype=np.int64) * 12 + dates.dt.month.to_numpy(dtype=np.int64) - 1 + months
+    first = pd.to_datetime(pd.DataFrame({'year': total // 12, 'month': total % 12 + 1, 'day': 1}))
+    day = np.minimum(dates.dt.day.to_numpy(), first.dt.days_in_month.to_numpy())
+    return pd.Series((first + pd.to_timedelta(day - 1, unit='D')).to_numpy(), index=dates.index)
+
+
+def relative_delta(later: pd.Series, earlier: pd.Series) -> pd.DataFrame:
+    """整欄計算 relativedelta(later, earlier) 的 years、months、days。"""
+    months = ((later.dt.year - earlier.dt.year) * 12 + (later.dt.month - earlier.dt.month)).to_numpy(dtype=np.int64)
+    shifted = add_months(earlier, months)
+    forward = (later >= earlier).to_numpy()
+    overshoot = np.where(forward, (later < shifted).to_numpy(), (later > shifted).to_numpy())
+    months = months + np.where(overshoot, np.where(forward, -1, 1), 0)
+    shifted = add_months(earlier, months)
+    sign = np.sign(months)
+    return pd.DataFrame({
+        'years': sign * (np.abs(months) // 12),
+        'months': sign * (np.abs(months) % 12),
+        'days': (later - shifted).dt.days.to_numpy(),
+    }, index=later.index)
+
+
+def anniversary_windows(entry_dates: pd.Series, as_of: date) -> pd.DataFrame:
+    """
+    計算各員工在 as_of 當天所屬的特休週年區間。
+    回傳欄位：period_start、period_end (週年起日與前一天)、service_years (週年起日時的年資)、
+    total_years / total_months (到 as_of 為止的總年資)。
+    """
+    entry = pd.to_datetime(entry_dates).dt.normalize()
+    today = pd.Series(pd.Timestamp(as_of), index=entry.index)
+    # 週年起日 = as_of 當年的週年日 (2/29 到職者於平年取 2/28)，as_of 尚未到達時取前一年
+    years = today.dt.year.to_numpy() - entry.dt.year.to_numpy()
+    this_year = add_months(entry, years * 12)
+    years_back = (today < this_year).to_numpy().astype(np.int64)
+    period_start = add_months(entry, (years - years_back) * 12)
+    period_end = add_months(entry, (years - years_back + 1) * 12) - pd.Timedelta(days=1)
+    at_start = relative_delta(period_start, entry)
+    total = relative_delta(today, entry)
+    return pd.DataFrame({
+        'period_start': period_start,
+        'period_end': period_end,
+        'service_years': at_start['years'] + at_start['months'] / 12 + at_start['days'] / 365.25,
+        'total_years': total['years'],
+        'total_months': total['months'],
+    }, index=entry.index)
+
+
+@cached_reference('employee', 'leave_record')
+def _annual_leave_summary(conn, as_of: date):
+    employees = q_emp.get_all_employees(conn)
+    on_duty_employees = employees[(pd.isnull(employees['resign_date'])) | (employees['resign_date'] == '')]
+    if on_duty_employees.empty:
+        return pd.DataFrame(), [], []
+
+    # 只計算 "服務" 或 "行政" 部門的員工，並記錄下所有不符合資格的員工
+    is_eligible = on_duty_employees['dept'].isin(ANNUAL_LEAVE_DEPTS)
+    ineligible_employees = on_duty_employees.loc[~is_eligible, 'name_ch'].tolist()
+    eligible_employees = on_duty_employees[is_eligible]
+    has_entry = eligible_employees['entry_date'].notna() & (eligible_employees['entry_date'] != '')
+    skipped_employees = eligible_employees.loc[~has_entry, 'name_ch'].tolist()
+    emps = eligible_employees[has_entry]
+    if emps.empty:
+        return pd.DataFrame(), skipped_employees, ineligible_employees
+
+    windows = anniversary_windows(emps['entry_date'], as_of)
+    windows['employee_id'] = emps['id']
+    windows['period_start'] = windows['period_start'].dt.strftime('%Y-%m-%d')
+    windows['period_end'] = windows['period_end'].dt.strftime('%Y-%m-%d')
+    used = q_att.get_leave_hours_for_windows(conn, windows, ANNUAL_LEAVE_TYPE)
+    used_hours = windows[['employee_id', 'period_start']].merge(
+        used, on=['employee_id', 'period_start'], how='left'
+    )['hours'].fillna(0).to_numpy(dtype=float)
+
+    total_days = leave_entitlement_days(windows['service_years'])
+    used_days = np.round(used_hours / HOURS_PER_DAY, 2)
+    summary_df = pd.DataFrame({
+        '員工編號': emps['hr_code'],
+        '員工姓名': emps['name_ch'],
+        '到職日': pd.to_datetime(emps['entry_date']).dt.strftime('%Y-%m-%d'),
+        '年資': windows['total_years'].astype(str) + "年 " + windows['total_months'].astype(str) + "月",
+        '本期特休年度': windows['period_start'] + " ~ " + windows['period_end'],
+        '本期應有特休天數': total_days,
+        '本期已休特休天數': used_days,
+        '本期剩餘特休天數': total_days - used_days,
+    }).reset_index(drop=True)
+    return summary_df, skipped_employees, ineligible_employees
+
+
+def get_annual_leave_summary(conn, as_of: date = None):
+    """
+    計算所有在職的服務/行政部門員工本期 (週年制) 的特休應有、已休與剩餘天數。
+    回傳 (試算表, 缺少到職日的員工, 非服務/行政部門的員工)。
+    """
+    return _annual_leave_summary(conn, as_of or date.today())
+
+
+def ledger_cycles(employees: pd.DataFrame, as_of: date) -> pd.DataFrame:
+    """
+    整批展開各員工到 as_of (已離職者到離職日) 為止已開始的特休週期。
+    週期 0 為滿半年 (到職後 6 個月起至滿 1 年前一天，3 天)，週期 N 為滿 N 年 (至滿 N+1 年前一天)。
+    employees 需含 id、entry_date、resign_date；回傳 employee_id、cycle_no、period_start、period_end、entitled_days。
+    """
+    columns = ['employee_id', 'cycle_no', 'period_start', 'period_end', 'entitled_days']
+    entry = pd.to_datetime(employees['entry_date'], errors='coerce').dt.normalize()
+    resign = pd.to_datetime(employees['resign_date'], errors='coerce').dt.normalize()
+    limit = resign.where(resign < pd.Timestamp(as_of), pd.Timestamp(as_of))
+    valid = entry.notna() & (limit >= entry)
+    if not valid.any():
+        return pd.DataFrame(columns=columns)
+
+    entry, limit, ids = entry[valid], limit[valid], employees.loc[valid, 'id']
+    delta = relative_delta(limit, entry)
+    # 滿半年才有第一個週期，之後每滿一年多一個週期
+    counts = np.where(delta['years'] * 12 + delta['months'] >= 6, delta['years'] + 1, 0)
+    owner = np.repeat(np.arange(len(entry)), counts)
+    cycle_no = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    entries = pd.Series(entry.to_numpy()[owner])
+    period_start = add_months(entries, np.where(cycle_no == 0, 6, 12 * cycle_no))
+    period_end = add_months(entries, 12 * (cycle_no + 1)) - pd.Timedelta(days=1)
+    entitled = np.where(cycle_no == 0, HALF_YEAR_ENTITLED_DAYS, leave_entitlement_days(pd.Series(cycle_no)))
+    return pd.DataFrame({
+        'employee_id': ids.to_numpy()[owner].astype(int),
+        'cycle_no': cycle_no.astype(int),
+        'period_start': period_start.dt.strftime('%Y-%m-%d'),
+        'period_end': period_end.dt.strftime('%Y-%m-%d'),
+        'entitled_days': entitled.astype(float),
+    })
+
+
+def _ledger_employees(conn) -> pd.DataFrame:
+    employees = q_emp.get_all_employees(conn)
+    return employees[employees['dept'].isin(ANNUAL_LEAVE_DEPTS)]
+
+
+def _build_ledger_rows(conn, cycles: pd.DataFrame, as_of: date, known_hours: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    為週期補上已休時數、剩餘天數、結算月份與狀態。
+    known_hours (employee_id、cycle_no、period_start、period_end、used_hours) 中的週期沿用其已休時數，
+    其餘週期以一次區間查詢取得。
+    """
+    if cycles.empty:
+        return cycles.reindex(columns=q_al.LEDGER_COLUMNS)
+    keys = ['employee_id', 'cycle_no', 'period_start', 'period_end']
+    if known_hours is None:
+        known_hours = pd.DataFrame(columns=keys + ['used_hours'])
+    rows = cycles.merge(known_hours[keys + ['used_hours']].astype({'employee_id': int, 'cycle_no': int}),
+                        on=keys, how='left')
+    pending = rows['used_hours'].isna()
+    if pending.any():
+        used = q_att.get_leave_hours_for_windows(conn, rows[pending], ANNUAL_LEAVE_TYPE)
+        queried = rows.loc[pending, ['employee_id', 'period_start']].merge(
+            used, on=['employee_id', 'period_start'], how='left'
+        )['hours'].fillna(0).to_numpy(dtype=float)
+        rows.loc[pending, 'used_hours'] = queried
+    rows['used_hours'] = rows['used_hours'].astype(float)
+    rows['used_days'] = rows['used_hours'] / HOURS_PER_DAY
+    rows['remaining_days'] = rows['entitled_days'] - rows['used_days']
+    # 週期結束隔天 (下一個週年日) 所在月份的薪資折發未休天數
+    settle = pd.to_datetime(rows['period_end']) + pd.Timedelta(days=1)
+    rows['settle_year'] = settle.dt.year
+    rows['settle_month'] = settle.dt.month
+    expired = rows['period_end'] < as_of.strftime('%Y-%m-%d')
+    rows['status'] = np.select(
+        [~expired, rows['remaining_days'] > 0], [STATUS_CURRENT, STATUS_SETTLEABLE], default=STATUS_USED_UP
+    )
+    return rows
+
+
+def _unchanged_hours(stored: pd.DataFrame, changes: pd.DataFrame) -> pd.DataFrame:
+    """台帳中沒有請假異動落在週期內的列 (已休時數可直接沿用，不必重新查詢)。"""
+    stored = stored.astype({'employee_id': int})
+    touched = np.zeros(len(stored), dtype=bool)
+    if not changes.empty:
+        changes = changes.dropna(subset=['employee_id'])
+        located = changes.dropna(subset=['year', 'month'])
+        # 無法判斷月份的異動，該員工所有週期都重新查詢
+        touched |= stored['employee_id'].isin(changes.loc[changes[['year', 'month']].isna().any(axis=1), 'employee_id'])
+        months = pd.DataFrame({
+            'employee_id': located['employee_id'].astype(int),
+            'ym': located['year'].astype(int).astype(str) + "-" + located['month'].astype(int).map('{:02d}'.format),
+        }).drop_duplicates()
+        spans = stored[['employee_id']].assign(
+            row=np.arange(len(stored)), start=stored['period_start'].str[:7], end=stored['period_end'].str[:7]
+        ).merge(months, on='employee_id')
+        hit = spans.loc[(spans['ym'] >= spans['start']) & (spans['ym'] <= spans['end']), 'row']
+        touched[hit.to_numpy(dtype=int)] = True
+    return stored[~touched]
+
+
+def _archived_hours(conn, stored: pd.DataFrame) -> pd.DataFrame:
+    """台帳中整個週期都落在已封存年度的列 (封存年度為唯讀，已休時數不會再變動)。"""
+    archived = [str(y) for y in q_archive.get_archived_years(conn)]
+    if stored.empty or not archived:
+        return None
+    # 週期不超過一年，起訖年度都已封存即代表整個週期都在封存範圍內
+    return stored[stored['period_start'].str[:4].isin(archived) & stored['period_end'].str[:4].isin(archived)]
+
+
+def _stale_employees(stored: pd.DataFrame, expected: pd.DataFrame, as_of: date) -> set:
+    """週期與應有的不同 (到職/離職日、部門變更或跨入新週期)，或進行中的週期已過期的員工。"""
+    if stored.empty:
+        return set(expected['employee_id'].astype(int))
+    keys = ['employee_id', 'cycle_no', 'period_start', 'period_end', 'entitled_days']
+    diff = stored[keys].merge(expected[keys], how='outer', indicator=True)
+    stale = set(diff.loc[diff['_merge'] != 'both', 'employee_id'].astype(int))
+    expired = (stored['status'] == STATUS_CURRENT) & (stored['period_end'] < as_of.strftime('%Y-%m-%d'))
+    return stale | set(stored.loc[expired, 'employee_id'].astype(int))
+
+
+def sync_annual_leave_ledger(conn, as_of: date = None) -> int:
+    """
+    將特休台帳更新到 as_of (預設今天)，回傳重算的員工數。
+    - 尚未建立或 change_log 水位已過期：所有員工整批重建。
+    - 其他情況：只重算水位之後有請假異動，或週期與員工資料不符的員工。
+    """
+    as_of = as_of or date.today()
+    state = q_al.get_ledger_state(conn)
+    # 先記下水位再讀取來源資料，計算期間的新異動會在下次同步時處理
+    watermark = q_cl.get_latest_watermark(conn)
+    expected = ledger_cycles(_ledger_employees(conn), as_of)
+
+    if state is None or state['watermark'] is None or q_cl.is_watermark_expired(conn, state['watermark']):
+        rows = _build_ledger_rows(conn, expected, as_of, _archived_hours(conn, q_al.get_ledger_cycles(conn)))
+        q_al.replace_ledger_rows(conn, rows, None, watermark, str(as_of))
+        return int(expected['employee_id'].nunique())
+
+    changes = q_cl.get_changes_since(conn, state['watermark'], tables=LEDGER_SOURCE_TABLES)
+    affected = set(changes['employee_id'].dropna().astype(int))
+    stored = q_al.get_ledger_cycles(conn)
+    affected |= _stale_employees(stored, expected, as_of)
+    if not affected and watermark == state['watermark']:
+        return 0
+    # 只重新查詢新週期與有請假異動的週期，其餘週期沿用台帳中的已休時數
+    cycles = expected[expected['employee_id'].isin(affected)]
+    rows = _build_ledger_rows(conn, cycles, as_of, _unchanged_hours(stored, changes))
+    q_al.replace_ledger_rows(conn, rows, sorted(affected), watermark, str(as_of))
+    return len(affected)
+
+
+def get_employee_leave_history(conn, employee_id) -> pd.DataFrame:
+    """同步台帳後取得單一員工歷年的特休週期 (新到舊)。"""
+    sync_annual_leave_ledger(conn)
+    ledger = q_al.get_employee_ledger(conn, employee_id)
+    return pd.DataFrame({
+        '年資': np.where(ledger['cycle_no'] == 0, "滿半年 (6個月-1年)", "滿 " + ledger['cycle_no'].astype(str) + " 年"),
+        '週期開始': ledger['period_start'],
+        '週期結束': ledger['period_end'],
+        '特休總額': ledger['entitled_days'],
+        '已休天數': ledger['used_days'],
+        '剩餘天數': ledger['remaining_days'],
+        '結算薪資月份': ledger['settle_year'].astype(str) + "-" + ledger['settle_month'].map('{:02d}'.format),
+        '狀態': ledger['status'],
+    })
+
+
+def get_unused_leave_settlements(conn, year: int, month: int) -> dict:
+    """同步台帳後取得指定薪資月份應折發的未休特休天數 {employee_id: 天數}。"""
+    sync_annual_leave_ledger(conn)
+    settlements = q_al.get_unused_leave_for_settlement(conn, year, month)
+    return dict(zip(settlements['employee_id'].astype(int), settlements['remaining_days'].astype(float)))
@@ -1,148 +1,374 @@
 # services/attendance_logic.py
 import pandas as pd
+import numpy as np
 import io
+import os
 import re
-import warnings
-from datetime import time, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import time
+from lxml import etree
 from db import queries_employee as q_emp
+from db import queries_config as q_config
+from db import queries_attendance as q_att
 
-def read_attendance_file(file):
+ATTENDANCE_CHUNK_ROWS = 5000
+EMPLOYEE_ID_PATTERN = re.compile(r'^A[0-9]')
+MINUTES_PATTERN = re.compile(r'(\d+)')
+
+ATTENDANCE_COLUMN_MAPPING = {
+    '人員ID': 'hr_code', '名稱': 'name_ch', '日期': 'date', '簽到': 'checkin_time',
+    '簽退': 'checkout_time', '遲到': 'late_minutes', '早退': 'early_leave_minutes',
+    '缺席': 'absent_minutes', '加班1': 'overtime1_minutes', '加班2': 'overtime2_minutes',
+    '加班3': 'overtime3_minutes', '請假': 'leave_minutes'
+}
+ATTENDANCE_NUMERIC_COLS = [
+    'late_minutes', 'early_leave_minutes', 'absent_minutes',
+    'overtime1_minutes', 'overtime2_minutes', 'overtime3_minutes',
+    'leave_minutes'
+]
+
+
+def _cell_text(cell):
+    text = ''.join(cell.itertext()).strip()
+    return text if text else None
+
+
+def _extract_minutes(value) -> int:
+    """取出儲存格中的第一段數字作為分鐘數，沒有數字時為 0。"""
+    if value is None:
+        return 0
+    match = MINUTES_PATTERN.search(value)
+    return int(match.group(1)) if match else 0
+
+
+def _rows_to_chunk(rows, columns) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=columns)
+    for col in ATTENDANCE_NUMERIC_COLS:
+        df[col] = df[col].astype(int)
+    return df
+
+
+def iter_attendance_chunks(file, chunk_size: int = ATTENDANCE_CHUNK_ROWS):
     """
-    從上傳的類 Excel 檔案中讀取並解析出勤資料。(使用 read_html)
+    以串流方式逐列解析打卡機匯出檔 (本質上是 HTML 表格)，每累積 chunk_size 筆有效紀錄就產出一個 DataFrame。
+    第 1 個表格的第 2 列為欄位名稱，第 2 個表格為出勤資料；讀取時即篩選員工 ID 並轉換分鐘數，
+    已處理的列會立即釋放，因此記憶體用量不隨檔案大小成長。
+    格式不符時拋出 ValueError。
     """
     file.seek(0)
-    # 忽略 pandas 讀取 html 時可能出現的 UserWarning
-    warnings.filterwarnings("ignore", category=UserWarning, module="pandas")
+    table_index = -1
+    header_row_index = 0
+    headers = None
+    columns = None
+    missing_numeric = []
+    id_pos = None
+    numeric_pos = {}
+    rows = []
+
+    for event, elem in etree.iterparse(file, events=('start', 'end'), tag=('table', 'tr'), html=True, encoding='utf-8'):
+        if elem.tag == 'table':
+            if event == 'start':
+                table_index += 1
+            continue
+        if event != 'end':
+            continue
+
+        if table_index == 0:
+            if header_row_index == 1:
+                headers = [str(_cell_text(c) or '').replace(' ', '') for c in elem.iterchildren('td', 'th')]
+                if '人員ID' not in headers:
+                    raise ValueError("檔案中缺少 '人員 ID' 欄位，無法處理。")
+                file_columns = [ATTENDANCE_COLUMN_MAPPING.get(h, h) for h in headers]
+                # 檔案中缺少的分鐘數欄位補在最後 (值為 0)
+                missing_numeric = [c for c in ATTENDANCE_NUMERIC_COLS if c not in file_columns]
+                columns = file_columns + missing_numeric
+                id_pos = headers.index('人員ID')
+                numeric_pos = [i for i, col in enumerate(file_columns) if col in ATTENDANCE_NUMERIC_COLS]
+            header_row_index += 1
+        elif table_index == 1 and headers is not None:
+            values = [_cell_text(c) for c in elem.iterchildren('td', 'th')][:len(headers)]
+            if len(values) > id_pos and values[id_pos] and EMPLOYEE_ID_PATTERN.match(values[id_pos]):
+                values += [None] * (len(headers) - len(values))
+                for i in numeric_pos:
+                    values[i] = _extract_minutes(values[i])
+                rows.append(values + [0] * len(missing_numeric))
+
+        # 釋放已處理的列，避免整份文件留在記憶體中
+        elem.clear()
+        parent = elem.getparent()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
+
+        if len(rows) >= chunk_size:
+            yield _rows_to_chunk(rows, columns)
+            rows = []
+
+    if table_index < 1 or headers is None:
+        raise ValueError("檔案格式不符，找不到主要的資料表格。")
+    if rows:
+        yield _rows_to_chunk(rows, columns)
+
+
+def read_attendance_file(file):
+    """
+    從上傳的類 Excel 檔案中讀取並解析出勤資料。(串流解析，見 iter_attendance_chunks)
+    """
     try:
-        # 使用 read_html 是因為舊版的打卡機檔案本質上是 HTML 表格
-        tables = pd.read_html(io.StringIO(file.read().decode('utf-8')), flavor='bs4', header=None)
-        if len(tables) < 2:
-            return None, "檔案格式不符，找不到主要的資料表格。"
-        
-        header_row = tables[0].iloc[1]
-        sanitized_headers = [str(h).strip() for h in header_row]
-        
-        df = tables[1].copy()
-        # 校正欄位數量不一致的問題
-        if len(df.columns) != len(sanitized_headers):
-            min_cols = min(len(df.columns), len(sanitized_headers))
-            df = df.iloc[:, :min_cols]
-            df.columns = sanitized_headers[:min_cols]
-        else:
-            df.columns = sanitized_headers
-            
-        if '人員 ID' not in df.columns:
-            return None, "檔案中缺少 '人員 ID' 欄位，無法處理。"
-            
-        # 篩選出有效的員工紀錄 (例如以 'A' 開頭的ID)
-        df = df[df['人員 ID'].astype(str).str.contains('^A[0-9]', na=False)].reset_index(drop=True)
-        df.columns = df.columns.str.replace(' ', '') # 移除欄位名稱中的空格
-
-        # 【修改】在欄位對應中加入 "請假"
-        column_mapping = {
-            '人員ID': 'hr_code', '名稱': 'name_ch', '日期': 'date', '簽到': 'checkin_time',
-            '簽退': 'checkout_time', '遲到': 'late_minutes', '早退': 'early_leave_minutes',
-            '缺席': 'absent_minutes', '加班1': 'overtime1_minutes', '加班2': 'overtime2_minutes',
-            '加班3': 'overtime3_minutes', '請假': 'leave_minutes' # 新增此行
-        }
-        df = df.rename(columns=column_mapping)
-        
-        # 【修改】將 leave_minutes 加入數字處理列表
-        numeric_cols = [
-            'late_minutes', 'early_leave_minutes', 'absent_minutes', 
-            'overtime1_minutes', 'overtime2_minutes', 'overtime3_minutes',
-            'leave_minutes' # 新增此行
-        ]
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = df[col].astype(str).str.extract(r'(\d+)').fillna(0)
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
-            else:
-                # 如果檔案中缺少某個欄位，則新增並補 0
-                df[col] = 0
-                
+        chunks = list(iter_attendance_chunks(file))
+        if not chunks:
+            return pd.DataFrame(columns=list(ATTENDANCE_COLUMN_MAPPING.values())), "檔案解析成功"
+        df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
         return df, "檔案解析成功"
+    except ValueError as e:
+        return None, str(e)
     except Exception as e:
         return None, f"解析出勤檔案時發生未知錯誤：{e}"
     
-def match_employees_by_name(conn, attendance_df: pd.DataFrame):
+def _parse_attendance_bytes(file_name: str, data: bytes):
+    """(於子行程中執行) 解析單一檔案內容，回傳 (檔名, DataFrame 或 None, 訊息)。"""
+    df, message = read_attendance_file(io.BytesIO(data))
+    return file_name, df, message
+
+
+def read_attendance_files(files, max_workers: int = None):
+    """
+    以行程池平行解析多個打卡機檔案 (各分點打卡機各自的匯出檔)。
+    回傳 (合併後的 DataFrame，含 source_index (上傳順序) 與 source_name 欄位; 各檔案的解析結果清單)，
+    解析失敗的檔案不納入合併結果。不同分點的匯出檔常同名，因此以 source_index 區分來源，檔名僅供顯示。
+    """
+    payloads = []
+    for file in files:
+        file.seek(0)
+        payloads.append((getattr(file, 'name', f'檔案{len(payloads) + 1}'), file.read()))
+        file.seek(0)
+
+    if len(payloads) > 1:
+        try:
+            workers = min(len(payloads), max_workers or os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_parse_attendance_bytes, *zip(*payloads)))
+        except (BrokenProcessPool, OSError):
+            # 無法建立子行程的環境 (例如受限的執行環境) 改為依序解析
+            results = [_parse_attendance_bytes(name, data) for name, data in payloads]
+    else:
+        results = [_parse_attendance_bytes(name, data) for name, data in payloads]
+
+    frames, file_reports = [], []
+    for index, (name, df, message) in enumerate(results):
+        file_reports.append({'index': index, 'file': name, 'ok': df is not None, 'rows': 0 if df is None else len(df), 'message': message})
+        if df is not None and not df.empty:
+            frames.append(df.assign(source_index=index, source_name=name))
+    combined = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return combined, file_reports
+
+
+def deduplicate_attendance(df: pd.DataFrame) -> tuple:
     """
-    V2: 新增對 "服務" 部門的特殊規則處理。
+    依 (employee_id, date) 去除重複的紀錄，以上傳順序中較後面的檔案為準。
+    回傳 (去重後的 DataFrame, 各來源檔案被取代的筆數 {source_index: 筆數})。
+    """
+    matched = df['employee_id'].notna()
+    duplicated = matched & df.duplicated(['employee_id', 'date'], keep='last')
+    dropped = df.loc[duplicated, 'source_index'].value_counts().to_dict() if 'source_index' in df.columns else {}
+    return df[~duplicated].reset_index(drop=True), dropped
+
+
+DEFAULT_DEPT_CHECKOUT_RULES = "服務=17:30:00/17:29:59"
+OVERTIME_COLS = ['overtime1_minutes', 'overtime2_minutes', 'overtime3_minutes']
+
+
+def parse_dept_checkout_rules(text: str) -> dict:
+    """
+    解析部門簽退規則設定，格式為「部門=簽退上限/修正時間」，多個部門以逗號分隔，
+    例如 "服務=17:30/17:29:59"。回傳 {部門: (上限 timedelta, 修正時間字串)}。
+    """
+    rules = {}
+    for item in str(text or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            dept, times = item.split('=', 1)
+            limit, correction = (t.strip() for t in times.split('/', 1))
+            if limit.count(':') == 1:
+                limit += ':00'
+            rules[dept.strip()] = (pd.to_timedelta(limit), correction)
+        except ValueError:
+            raise ValueError(f"部門簽退規則格式錯誤: '{item}' (應為 部門=簽退上限/修正時間)")
+    return rules
+
+
+def get_dept_checkout_rules(conn) -> dict:
+    """從系統參數 DEPT_CHECKOUT_RULES 讀取部門簽退規則。"""
+    configs = q_config.get_all_configs(conn)
+    return parse_dept_checkout_rules(configs.get('DEPT_CHECKOUT_RULES', DEFAULT_DEPT_CHECKOUT_RULES))
+
+
+def apply_dept_checkout_rules(attendance_df: pd.DataFrame, dept: pd.Series, rules: dict) -> pd.DataFrame:
+    """
+    套用部門簽退規則：該部門簽退晚於上限時，簽退時間改為修正時間，並將加班分鐘數歸零。
+    時間格式錯誤的紀錄不受影響。
+    """
+    if not rules or 'checkout_time' not in attendance_df.columns:
+        return attendance_df
+    checkout = pd.to_timedelta(attendance_df['checkout_time'].astype('string'), errors='coerce')
+    overtime_cols = [c for c in OVERTIME_COLS if c in attendance_df.columns]
+    for dept_name, (limit, correction) in rules.items():
+        mask = (dept == dept_name) & (checkout > limit)
+        if mask.any():
+            attendance_df.loc[mask, 'checkout_time'] = correction
+            attendance_df.loc[mask, overtime_cols] = 0
+    return attendance_df
+
+
+def match_employees_by_name(conn, attendance_df: pd.DataFrame, dept_rules: dict = None):
+    """
+    以去除空白後的姓名比對員工，並套用部門簽退規則 (預設讀取系統參數 DEPT_CHECKOUT_RULES)。
     """
     if attendance_df.empty: return attendance_df
     try:
-        emp_df = q_emp.s(conn)
-        if emp_df.empty:
+        emp_index = q_emp.get_employee_match_index(conn)
+        if emp_index.empty:
             attendance_df['employee_id'] = None
             return attendance_df
-            
-        attendance_df['match_key'] = attendance_df['name_ch'].astype(str).apply(lambda x: re.sub(r'\s+', '', x))
-        emp_df['match_key'] = emp_df['name_ch'].astype(str).apply(lambda x: re.sub(r'\s+', '', x))
-        
-        # 建立姓名到ID和部門的映射
-        emp_id_map = dict(zip(emp_df['match_key'], emp_df['id']))
-        emp_dept_map = dict(zip(emp_df['match_key'], emp_df['dept']))
-        
-        attendance_df['employee_id'] = attendance_df['match_key'].map(emp_id_map)
-        attendance_df['dept'] = attendance_df['match_key'].map(emp_dept_map)
-        
-        # --- 服務部門規則 ---
-        service_dept_time_limit = time(17, 30)
-        service_dept_correction_time = "17:29:59" # 改為 17:29:59 更精準
-        
-        for index, row in attendance_df.iterrows():
-            if row['dept'] == '服務' and pd.notna(row['checkout_time']):
-                try:
-                    checkout_t = datetime.strptime(str(row['checkout_time']), '%H:%M:%S').time()
-                    if checkout_t > service_dept_time_limit:
-                        attendance_df.loc[index, 'checkout_time'] = service_dept_correction_time
-                        # 將加班時數歸零
-                        attendance_df.loc[index, 'overtime1_minutes'] = 0
-                        attendance_df.loc[index, 'overtime2_minutes'] = 0
-                        attendance_df.loc[index, 'overtime3_minutes'] = 0
-                except (ValueError, TypeError):
-                    continue # 如果時間格式錯誤，跳過
-
-        attendance_df.drop(columns=['match_key', 'dept'], inplace=True)
-        return attendance_df
+
+        match_key = attendance_df['name_ch'].astype(str).str.replace(r'\s+', '', regex=True)
+        attendance_df['employee_id'] = match_key.map(emp_index['id'])
+        dept = match_key.map(emp_index['dept'])
+
+        if dept_rules is None:
+            dept_rules = get_dept_checkout_rules(conn)
+        return apply_dept_checkout_rules(attendance_df, dept, dept_rules)
     except Exception as e:
         raise Exception(f"員工姓名匹配過程中發生錯誤: {e}")
 
-def recalculate_attendance_minutes(checkin: time, checkout: time) -> dict:
+DEFAULT_SHIFT_KEY = '預設'
+DEFAULT_SHIFT_SCHEDULES = "預設=08:00-17:00;17:30-19:30;19:30-23:59"
+MINUTE_COLS = ['late_minutes', 'early_leave_minutes', 'overtime1_minutes', 'overtime2_minutes', 'overtime3_minutes']
+# 每個班表以秒數表示的邊界：上班、下班、加班1起訖、加班2起訖、加班3起訖 (未設定的加班時段起訖皆為 -1，不計算)
+_SHIFT_FIELDS = ['work_start', 'work_end', 'ot1_start', 'ot1_end', 'ot2_start', 'ot2_end', 'ot3_start', 'ot3_end']
+
+
+def _clock_to_seconds(text: str) -> int:
+    parts = [int(p) for p in str(text).strip().split(':')]
+    parts += [0] * (3 - len(parts))
+    return parts[0] * 3600 + parts[1] * 60 + parts[2]
+
+
+def parse_shift_schedules(text: str) -> dict:
     """
-    根據新的簽到簽退時間，重新計算遲到、早退、加班分鐘數。
+    解析部門班表設定，每行 (或以 | 分隔) 一個班表，格式為
+    「部門=上班-下班;加班1起-迄;加班2起-迄[;加班3起-迄]」，例如 "預設=08:00-17:00;17:30-19:30;19:30-23:59"。
+    未列出的部門使用「預設」班表。回傳 {部門: [各邊界秒數]}。
     """
-    work_start, lunch_start = time(8, 0), time(12, 0)
-    lunch_end, work_end = time(13, 0), time(17, 0)
-    overtime_start_1, overtime_end_1 = time(17, 30), time(19, 30)
-    overtime_start_2, overtime_end_2 = time(19, 30), time(23, 59)
+    schedules = {}
+    for line in str(text or '').replace('|', '\n').splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            dept, spec = line.split('=', 1)
+            bounds = []
+            for window in filter(None, (w.strip() for w in spec.split(';'))):
+                start, end = window.split('-', 1)
+                bounds += [_clock_to_seconds(start), _clock_to_seconds(end)]
+            if len(bounds) < 2 or len(bounds) > len(_SHIFT_FIELDS):
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"班表格式錯誤: '{line}' (應為 部門=上班-下班;加班1起-迄;加班2起-迄)")
+        schedules[dept.strip()] = bounds + [-1] * (len(_SHIFT_FIELDS) - len(bounds))
+    if DEFAULT_SHIFT_KEY not in schedules:
+        schedules[DEFAULT_SHIFT_KEY] = parse_shift_schedules(DEFAULT_SHIFT_SCHEDULES)[DEFAULT_SHIFT_KEY]
+    return schedules
 
-    # 將 time 物件轉換為 timedelta 以便計算
-    def to_timedelta(t):
-        return timedelta(hours=t.hour, minutes=t.minute, seconds=t.second)
 
-    checkin_td = to_timedelta(checkin)
-    checkout_td = to_timedelta(checkout)
+def get_shift_schedules(conn) -> dict:
+    """從系統參數 DEPT_SHIFT_SCHEDULES 讀取部門班表。"""
+    configs = q_config.get_all_configs(conn)
+    return parse_shift_schedules(configs.get('DEPT_SHIFT_SCHEDULES', DEFAULT_SHIFT_SCHEDULES))
 
-    # 計算遲到
-    late_minutes = max(0, (checkin_td - to_timedelta(work_start)).total_seconds() / 60)
-    
-    # 計算早退
-    early_leave_minutes = max(0, (to_timedelta(work_end) - checkout_td).total_seconds() / 60)
-
-    # 計算加班
-    overtime1_minutes = 0
-    if checkout_td > to_timedelta(overtime_start_1):
-        overtime1_minutes = ((min(checkout_td, to_timedelta(overtime_end_1)) - to_timedelta(overtime_start_1)).total_seconds() / 60)
-
-    overtime2_minutes = 0
-    if checkout_td > to_timedelta(overtime_start_2):
-        overtime2_minutes = ((min(checkout_td, to_timedelta(overtime_end_2)) - to_timedelta(overtime_start_2)).total_seconds() / 60)
-
-    return {
-        "late_minutes": int(round(late_minutes)),
-        "early_leave_minutes": int(round(early_leave_minutes)),
-        "overtime1_minutes": int(round(overtime1_minutes)),
-        "overtime2_minutes": int(round(overtime2_minutes)),
-        "overtime3_minutes": 0 # 假設手動修改不考慮第三段加班
-    }
\ No newline at end of file
+
+def time_strings_to_seconds(values) -> np.ndarray:
+    """將 'HH:MM:SS' 字串欄位一次轉為當日秒數 (float)，無法解析者為 NaN。"""
+    td = pd.to_timedelta(pd.Series(values).astype('string'), errors='coerce')
+    return td.dt.total_seconds().to_numpy(dtype=float)
+
+
+def compute_shift_minutes(checkin_seconds, checkout_seconds, depts=None, schedules: dict = None) -> pd.DataFrame:
+    """
+    依班表一次計算整批紀錄的遲到、早退與加班 1/2/3 分鐘數 (輸入為當日秒數陣列)。
+    簽到或簽退無法解析的紀錄，其所有分鐘數為 NaN，由呼叫端決定保留原值或補值。
+    """
+    if schedules is None:
+        schedules = parse_shift_schedules(DEFAULT_SHIFT_SCHEDULES)
+    cin = np.asarray(checkin_seconds, dtype=float)
+    cout = np.asarray(checkout_seconds, dtype=float)
+
+    names = list(schedules.keys())
+    table = np.array([schedules[n] for n in names], dtype=float)
+    default_idx = names.index(DEFAULT_SHIFT_KEY)
+    if depts is None:
+        idx = np.full(len(cin), default_idx)
+    else:
+        idx = pd.Series(depts).map({n: i for i, n in enumerate(names)}).fillna(default_idx).to_numpy(dtype=int)
+    b = dict(zip(_SHIFT_FIELDS, table[idx].T))
+
+    def _window(start, end):
+        minutes = np.maximum(0, np.minimum(cout, end) - start) / 60
+        return np.where(start < 0, 0, minutes)
+
+    result = pd.DataFrame({
+        'late_minutes': np.maximum(0, cin - b['work_start']) / 60,
+        'early_leave_minutes': np.maximum(0, b['work_end'] - cout) / 60,
+        'overtime1_minutes': _window(b['ot1_start'], b['ot1_end']),
+        'overtime2_minutes': _window(b['ot2_start'], b['ot2_end']),
+        'overtime3_minutes': _window(b['ot3_start'], b['ot3_end']),
+    })
+    result = result.round(0)
+    result[np.isnan(cin) | np.isnan(cout)] = np.nan
+    return result
+
+
+def recalculate_attendance_frame(df: pd.DataFrame, dept_col: str = 'dept', schedules: dict = None) -> pd.DataFrame:
+    """
+    依 checkin_time / checkout_time 重新計算整批出勤紀錄的分鐘數 (就地更新並回傳)。
+    df 有 dept_col 欄位時依部門班表計算；時間無法解析的列保留原本的分鐘數。
+    """
+    if df.empty:
+        return df
+    minutes = compute_shift_minutes(
+        time_strings_to_seconds(df['checkin_time']), time_strings_to_seconds(df['checkout_time']),
+        depts=df[dept_col].to_numpy() if dept_col in df.columns else None, schedules=schedules,
+    )
+    minutes.index = df.index
+    for col in MINUTE_COLS:
+        original = df[col] if col in df.columns else 0
+        df[col] = minutes[col].fillna(original).fillna(0).astype(int)
+    return df
+
+
+def recalculate_attendance_minutes(checkin: time, checkout: time, dept: str = None, schedules: dict = None) -> dict:
+    """
+    根據新的簽到簽退時間，重新計算遲到、早退、加班分鐘數 (單筆，與 recalculate_attendance_frame 相同規則)。
+    """
+    to_seconds = lambda t: t.hour * 3600 + t.minute * 60 + t.second
+    minutes = compute_shift_minutes([to_seconds(checkin)], [to_seconds(checkout)], depts=[dept], schedules=schedules)
+    return {col: int(minutes[col].iloc[0]) for col in MINUTE_COLS}
+
+
+def rederive_attendance_minutes(conn, year: int, month: int, employee_ids=None, schedules: dict = None) -> int:
+    """
+    依目前的部門班表重新計算整個月份 (可限定員工) 的遲到、早退與加班分鐘數，
+    只寫回有變動的紀錄，回傳更新筆數。班表規則調整後使用。
+    """
+    df = q_att.get_attendance_for_recalculation(conn, year, month, employee_ids)
+    if df.empty:
+        return 0
+    if schedules is None:
+        schedules = get_shift_schedules(conn)
+    original = df[MINUTE_COLS].copy()
+    recalculate_attendance_frame(df, schedules=schedules)
+    changed = (df[MINUTE_COLS] != original).any(axis=1)
+    return q_att.batch_update_attendance_minutes(conn, df[changed])
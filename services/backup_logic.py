@@ -0,0 +1,231 @@
+# services/backup_logic.py
+"""
+資料庫線上備份與還原。
+- 備份使用 SQLite backup API (sqlite3.Connection.backup)，每次只複製一小段頁面並在段與段之間讓出時間，
+  備份期間其他使用者仍可正常讀寫；備份完成後會先做完整性檢查再壓縮 (gzip) 保存。
+- 依系統參數 BACKUP_INTERVAL_HOURS / BACKUP_KEEP_COUNT 定期自動備份並輪替舊檔。
+- 還原前會先解壓縮並檢查備份檔的完整性與必要資料表，通過後自動備份目前的資料庫，再透過寫入執行緒覆寫。
+- 封存年度檔 (data/archive/) 封存後即不再變動，不包含在此備份中。
+"""
+import gzip
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from db.db_manager import DATA_DIR, DB_PATH, SCHEMA_PATH
+from db import queries_config as q_config
+from db.queries_monthly_summary import rebuild_monthly_summaries
+from db.reference_cache import clear_cache
+from db.writer import get_writer
+
+BACKUP_DIR = DATA_DIR / "backups"
+BACKUP_PREFIX = "hr_system_"
+BACKUP_SUFFIX = ".db.gz"
+PAGES_PER_STEP = 256
+STEP_SLEEP_SECONDS = 0.005
+DEFAULT_INTERVAL_HOURS = 24
+DEFAULT_KEEP_COUNT = 14
+REQUIRED_TABLES = ('employee', 'company', 'salary', 'salary_item', 'attendance')
+
+_backup_lock = threading.Lock()
+_scheduler_started = False
+_scheduler_lock = threading.Lock()
+
+
+def _integrity_check(path: Path) -> str:
+    """對 SQLite 檔案執行 PRAGMA integrity_check，回傳結果字串 ('ok' 代表正常)。"""
+    conn = sqlite3.connect(f"file:{path.as_posix()}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("PRAGMA integrity_check").fetchall()
+        return "\n".join(str(r[0]) for r in rows)
+    finally:
+        conn.close()
+
+
+def create_backup(progress_callback=None, label: str = "", keep: int = None) -> Path:
+    """
+    建立一份壓縮後的線上備份，回傳備份檔路徑。
+    progress_callback(copied_pages, total_pages) 會在每一段複製後被呼叫。
+    keep 有值時，完成後只保留最新的 keep 份備份。
+    """
+    BACKUP_DIR.mkdir(exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    name = f"{BACKUP_PREFIX}{timestamp}{'_' + label if label else ''}"
+    tmp_path = BACKUP_DIR / f"{name}.db.tmp"
+    final_path = BACKUP_DIR / f"{name}{BACKUP_SUFFIX}"
+
+    def _progress(status, remaining, total):
+        if progress_callback:
+            progress_callback(total - remaining, total)
+
+    with _backup_lock:
+        src = sqlite3.connect(DB_PATH, check_same_thread=False)
+        dst = sqlite3.connect(tmp_path)
+        try:
+            src.execute("PRAGMA busy_timeout = 30000")
+            src.backup(dst, pages=PAGES_PER_STEP, progress=_progress, sleep=STEP_SLEEP_SECONDS)
+            # 備份檔改回一般的 rollback journal，還原或單獨開啟時不需要 -wal 檔
+            dst.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            dst.close()
+            src.close()
+
+        try:
+            result = _integrity_check(tmp_path)
+            if result != "ok":
+                raise Exception(f"備份檔完整性檢查失敗: {result}")
+            with open(tmp_path, 'rb') as f_in, gzip.open(final_path, 'wb', compresslevel=6) as f_out:
+                shutil.copyfileobj(f_in, f_out, length=1024 * 1024)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    if keep:
+        rotate_backups(keep)
+    return final_path
+
+
+def list_backups() -> pd.DataFrame:
+    """列出所有備份檔 (新到舊)。"""
+    BACKUP_DIR.mkdir(exist_ok=True)
+    records = []
+    for path in BACKUP_DIR.glob(f"{BACKUP_PREFIX}*{BACKUP_SUFFIX}"):
+        stat = path.stat()
+        records.append({
+            '檔名': path.name,
+            '建立時間': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+            '大小(MB)': round(stat.st_size / 1024 / 1024, 2),
+            'path': str(path),
+        })
+    if not records:
+        return pd.DataFrame(columns=['檔名', '建立時間', '大小(MB)', 'path'])
+    return pd.DataFrame(records).sort_values('建立時間', ascending=False).reset_index(drop=True)
+
+
+def rotate_backups(keep: int) -> int:
+    """只保留最新的 keep 份備份 (還原前的自動備份不計入)，回傳刪除的檔案數。"""
+    backups = list_backups()
+    backups = backups[~backups['檔名'].str.contains('_pre_restore')]
+    removed = 0
+    for path in backups['path'].iloc[int(keep):]:
+        Path(path).unlink(missing_ok=True)
+        removed += 1
+    return removed
+
+
+def verify_backup(backup_path) -> Path:
+    """
+    解壓縮並檢查備份檔，通過後回傳解壓縮後的暫存檔路徑。
+    檢查項目：SQLite 完整性檢查、必要資料表是否存在。
+    """
+    backup_path = Path(backup_path)
+    if not backup_path.exists():
+        raise FileNotFoundError(f"找不到備份檔: {backup_path}")
+    tmp_path = BACKUP_DIR / f"{backup_path.name}.restore.tmp"
+    if backup_path.suffix == '.gz':
+        with gzip.open(backup_path, 'rb') as f_in, open(tmp_path, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out, length=1024 * 1024)
+    else:
+        shutil.copyfile(backup_path, tmp_path)
+
+    try:
+        result = _integrity_check(tmp_path)
+        if result != "ok":
+            raise ValueError(f"備份檔完整性檢查失敗: {result}")
+        conn = sqlite3.connect(f"file:{tmp_path.as_posix()}?mode=ro", uri=True)
+        try:
+            tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()}
+        finally:
+            conn.close()
+        missing = [t for t in REQUIRED_TABLES if t not in tables]
+        if missing:
+            raise ValueError(f"備份檔缺少必要的資料表: {', '.join(missing)}")
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return tmp_path
+
+
+def _apply_restore(conn, source_path: str):
+    """(於寫入執行緒中以獨佔工作執行) 以 backup API 將驗證過的檔案覆寫到主資料庫。"""
+    src = sqlite3.connect(source_path)
+    try:
+        src.backup(conn, pages=PAGES_PER_STEP * 4)
+    finally:
+        src.close()
+    conn.execute("PRAGMA journal_mode = WAL")
+    # 舊版本的備份可能缺少新的資料表或觸發器，還原後補齊
+    with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
+        conn.executescript(f.read())
+    # 彙總表與特休台帳可能與還原後的資料不一致 (或是舊備份中還沒有這些資料表)：
+    # 月彙總直接重建，特休台帳清空後由下次讀取時整批重建
+    rebuild_monthly_summaries(conn)
+    conn.execute("DELETE FROM annual_leave_ledger")
+    conn.execute("DELETE FROM annual_leave_ledger_state")
+    conn.commit()
+
+
+def restore_backup(backup_path) -> Path:
+    """
+    還原指定的備份檔，回傳還原前自動建立的安全備份路徑。
+    還原期間所有寫入會在寫入執行緒中排隊等待。
+    """
+    tmp_path = verify_backup(backup_path)
+    try:
+        safety_backup = create_backup(label="pre_restore")
+        get_writer().submit_exclusive(_apply_restore, str(tmp_path)).result()
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    clear_cache()
+    return safety_backup
+
+
+def get_backup_settings(conn) -> tuple:
+    """回傳 (自動備份間隔小時數, 保留份數)；間隔為 0 代表停用自動備份。"""
+    configs = q_config.get_all_configs(conn)
+    interval = float(configs.get('BACKUP_INTERVAL_HOURS', DEFAULT_INTERVAL_HOURS))
+    keep = int(float(configs.get('BACKUP_KEEP_COUNT', DEFAULT_KEEP_COUNT)))
+    return interval, keep
+
+
+def _last_backup_time():
+    backups = list_backups()
+    if backups.empty:
+        return None
+    return datetime.strptime(backups['建立時間'].iloc[0], '%Y-%m-%d %H:%M:%S')
+
+
+def run_scheduled_backup_if_due(conn) -> Path:
+    """若距離上次備份已超過設定的間隔，建立備份並輪替舊檔；未到期時回傳 None。"""
+    interval, keep = get_backup_settings(conn)
+    if interval <= 0:
+        return None
+    last = _last_backup_time()
+    if last is not None and (datetime.now() - last).total_seconds() < interval * 3600:
+        return None
+    return create_backup(label="auto", keep=keep)
+
+
+def start_backup_scheduler(check_every_seconds: int = 600):
+    """啟動背景自動備份執行緒 (每個行程只會啟動一次)。"""
+    global _scheduler_started
+    with _scheduler_lock:
+        if _scheduler_started:
+            return
+        _scheduler_started = True
+
+    def _loop():
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        while True:
+            try:
+                run_scheduled_backup_if_due(conn)
+            except Exception as e:
+                print(f"--- [WARNING] 自動備份失敗: {e} ---")
+            time.sleep(check_every_seconds)
+
+    threading.Thread(target=_loop, name="hr-backup-scheduler", daemon=True).start()
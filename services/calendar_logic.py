@@ -0,0 +1,191 @@
+# services/calendar_logic.py
+"""
+國定假日行事曆。
+- 行事曆保存在資料庫 calendar_day 中，來源為政府資料開放平臺的「中華民國政府行政機關辦公日曆表」：
+  可上傳該 CSV 匯入，或以 sync_calendar_year() 線上下載後存入。
+- 計算請假時數等邏輯只讀取資料庫中的行事曆 (HolidayCalendar)，計算時不需要連網。
+- 行事曆沒有資料的年度一律以「週一至週五上班」判斷，呼叫端可用 missing_years() 提示使用者補齊。
+"""
+import io
+
+import numpy as np
+import pandas as pd
+import requests
+from bs4 import BeautifulSoup
+
+from db import queries_calendar as q_cal
+
+CALENDAR_DATASET_URL = "https://data.gov.tw/dataset/14718"
+CALENDAR_SOURCE_ONLINE = "data.gov.tw"
+REQUEST_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+CSV_ENCODINGS = ('utf-8-sig', 'cp950')
+
+
+class HolidayCalendar:
+    """
+    上班日位元陣列：從行事曆最早年度的 1/1 到最晚年度的 12/31，每天一格，True 代表上班日。
+    週末與放假日為 False，補班日為 True；範圍外或行事曆缺漏的年度以週一至週五為上班日。
+    另保存上班日數的前綴和，任意兩日之間的上班日數只需兩次查表。
+    """
+
+    def __init__(self, calendar_df: pd.DataFrame = None):
+        if calendar_df is None or calendar_df.empty:
+            self.years = []
+            self.start = np.datetime64('1970-01-01', 'D')
+            self._workdays = np.zeros(0, dtype=bool)
+            self._cumulative = np.zeros(1, dtype=np.int64)
+            return
+        days = pd.to_datetime(calendar_df['date']).to_numpy().astype('datetime64[D]')
+        years = pd.DatetimeIndex(days).year
+        self.years = sorted(set(int(y) for y in years))
+        self.start = np.datetime64(f"{self.years[0]}-01-01", 'D')
+        end = np.datetime64(f"{self.years[-1] + 1}-01-01", 'D')
+        workdays = np.is_busday(np.arange(self.start, end, dtype='datetime64[D]'))
+        offsets = (days - self.start).astype(np.int64)
+        workdays[offsets[calendar_df['is_holiday'].to_numpy(dtype=bool)]] = False
+        workdays[offsets[calendar_df['is_makeup_workday'].to_numpy(dtype=bool)]] = True
+        self._workdays = workdays
+        self._cumulative = np.concatenate(([0], np.cumsum(workdays, dtype=np.int64)))
+
+    def workday_mask(self, dates) -> np.ndarray:
+        """整批判斷是否為上班日；dates 可為日期字串、datetime 或 Series，無效日期回傳 False。"""
+        days = pd.to_datetime(pd.Series(dates), errors='coerce').to_numpy().astype('datetime64[D]')
+        mask = np.zeros(len(days), dtype=bool)
+        valid = ~np.isnat(days)
+        mask[valid] = np.is_busday(days[valid])
+        offsets = (days - self.start).astype(np.int64)
+        inside = valid & (offsets >= 0) & (offsets < len(self._workdays))
+        mask[inside] = self._workdays[offsets[inside]]
+        return mask
+
+    def is_workday(self, day) -> bool:
+        """判斷單一日期是否為上班日。"""
+        day = np.datetime64(pd.Timestamp(day).date(), 'D')
+        offset = int((day - self.start).astype(np.int64))
+        if 0 <= offset < len(self._workdays):
+            return bool(self._workdays[offset])
+        return bool(np.is_busday(day))
+
+    def workdays_before(self, days) -> np.ndarray:
+        """
+        各日期之前 (不含當日) 的累計上班日數，以行事曆起始日為 0 (更早的日期為負數)；
+        兩個日期相減即為其間的上班日數。days 需為不含 NaT 的 datetime64[D] 陣列。
+        """
+        days = np.asarray(days, dtype='datetime64[D]')
+        end = self.start + len(self._workdays)
+        offsets = np.clip((days - self.start).astype(np.int64), 0, len(self._workdays))
+        counts = self._cumulative[offsets]
+        # 行事曆範圍外以週一至週五計算
+        counts = counts - np.busday_count(np.minimum(days, self.start), self.start)
+        return counts + np.busday_count(end, np.maximum(days, end))
+
+    def missing_years(self, years) -> list:
+        """回傳行事曆中沒有資料的年度。"""
+        return sorted(set(int(y) for y in years) - set(self.years))
+
+
+def load_holiday_calendar(conn) -> HolidayCalendar:
+    """從資料庫載入行事曆 (查詢結果依 calendar_day 的資料版本快取)。"""
+    return HolidayCalendar(q_cal.get_calendar_days(conn))
+
+
+def _decode_csv(raw) -> str:
+    if isinstance(raw, str):
+        return raw
+    for encoding in CSV_ENCODINGS:
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("無法辨識行事曆檔案的編碼 (支援 UTF-8 與 Big5)。")
+
+
+def parse_calendar_csv(source) -> pd.DataFrame:
+    """
+    解析行政機關辦公日曆表 CSV (欄位：西元日期/date、是否放假/isHoliday、備註/description)。
+    是否放假為 '2' 者為放假日，為 '0' 且落在週末者為補班日。
+    回傳欄位：date (YYYY-MM-DD)、is_holiday、is_makeup_workday、description。
+    """
+    raw = source if isinstance(source, (bytes, str)) else source.getvalue()
+    df = pd.read_csv(io.StringIO(_decode_csv(raw)), dtype=str).fillna("")
+    df.columns = df.columns.str.strip()
+    date_col = next((c for c in ('西元日期', 'date') if c in df.columns), None)
+    flag_col = next((c for c in ('是否放假', 'isHoliday') if c in df.columns), None)
+    desc_col = next((c for c in ('備註', 'description') if c in df.columns), None)
+    if not date_col or not flag_col:
+        raise ValueError("行事曆檔案缺少「西元日期」或「是否放假」欄位。")
+
+    dates = pd.to_datetime(df[date_col].str.strip(), format='%Y%m%d', errors='coerce')
+    flags = df[flag_col].str.strip()
+    valid = dates.notna() & flags.isin(['0', '2'])
+    if not valid.any():
+        raise ValueError("行事曆檔案中沒有任何有效的日期資料。")
+
+    dates, flags = dates[valid], flags[valid]
+    return pd.DataFrame({
+        'date': dates.dt.strftime('%Y-%m-%d'),
+        'is_holiday': (flags == '2').astype(int),
+        'is_makeup_workday': ((flags == '0') & (dates.dt.weekday >= 5)).astype(int),
+        'description': df.loc[valid, desc_col].str.strip() if desc_col else "",
+    }).drop_duplicates('date', keep='last').sort_values('date').reset_index(drop=True)
+
+
+def import_calendar_file(conn, file) -> dict:
+    """匯入上傳的行事曆 CSV，檔案涵蓋的年度整年覆蓋，回傳 {年度: 天數}。"""
+    days = parse_calendar_csv(file)
+    return q_cal.replace_calendar_years(conn, days, getattr(file, 'name', None) or 'csv')
+
+
+def download_calendar_csv(year: int) -> bytes:
+    """從政府資料開放平臺下載指定年度的辦公日曆表 CSV (有「修正版」時優先使用)。"""
+    roc_year = year - 1911
+    page_res = requests.get(CALENDAR_DATASET_URL, headers=REQUEST_HEADERS, timeout=15)
+    page_res.raise_for_status()
+    soup = BeautifulSoup(page_res.text, 'lxml')
+
+    candidates = []
+    unwanted_keywords = ["Google", "iCal", "PDF", "ODS", "XML", "JSON"]
+    for item in soup.select("li.resource-item"):
+        link_element = item.select_one("a")
+        if not link_element or not link_element.has_attr('href'):
+            continue
+        link_url = link_element['href']
+        link_text = item.get_text(strip=True)
+        if f"{roc_year}年" not in link_text or 'csv' not in link_url.lower():
+            continue
+        if any(keyword.lower() in link_text.lower() for keyword in unwanted_keywords):
+            continue
+        candidates.append({"text": link_text, "url": link_url})
+
+    if not candidates:
+        raise ValueError(f"在資料集頁面上找不到民國 {roc_year} 年的通用 CSV 檔案。")
+    best_choice = next((c for c in candidates if "修正版" in c["text"]), candidates[0])
+
+    response = requests.get(best_choice["url"], headers=REQUEST_HEADERS, timeout=15)
+    response.raise_for_status()
+    return response.content
+
+
+def sync_calendar_year(conn, year: int) -> str:
+    """線上下載指定年度的行事曆並存入資料庫 (整年覆蓋)，回傳狀態訊息。"""
+    try:
+        days = parse_calendar_csv(download_calendar_csv(year))
+    except requests.RequestException as e:
+        raise ValueError(f"抓取 {year} 年行事曆時發生網路錯誤: {e}")
+    days = days[days['date'].str.startswith(f"{year}-")]
+    if days.empty:
+        raise ValueError(f"下載的行事曆中沒有 {year} 年的資料。")
+    q_cal.replace_calendar_years(conn, days, CALENDAR_SOURCE_ONLINE)
+    workday_holidays = int((days['is_holiday'].astype(bool) & (pd.to_datetime(days['date']).dt.weekday < 5)).sum())
+    return f"成功同步 {year} 年行事曆！(共 {workday_holidays} 個平日放假日與 {int(days['is_makeup_workday'].sum())} 個補班日)"
+
+
+def describe_missing_years(calendar: HolidayCalendar, years) -> str:
+    """行事曆缺少年度時的提示訊息；沒有缺漏時回傳空字串。"""
+    missing = calendar.missing_years(years)
+    if not missing:
+        return ""
+    return (f"行事曆缺少 {', '.join(str(y) for y in missing)} 年的資料，這些年度僅以週末判斷假日；"
+            f"請至「特殊日期管理」匯入或同步國定假日行事曆。")
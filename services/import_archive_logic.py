@@ -0,0 +1,94 @@
+# services/import_archive_logic.py
+"""
+上傳檔案的匯入封存與重複上傳偵測。
+- 每個上傳檔案以 SHA-256 內容雜湊值辨識，原始內容以 gzip 壓縮保存在 data/imports/ (相同內容只存一份)。
+- 匯入前先以雜湊值查詢 import_archive，同一檔案重複上傳時可在解析前就提示並略過。
+- 匯入完成後記錄匯入結果與匯入前後的 change_log 水位，之後也可以不需原始檔，直接從封存重新套用。
+"""
+import gzip
+import hashlib
+import io
+import shutil
+
+from db.db_manager import DATA_DIR
+from db import queries_change_log as q_cl
+from db import queries_import_archive as q_import
+
+IMPORT_DIR = DATA_DIR / "imports"
+HASH_CHUNK_SIZE = 1024 * 1024
+RESULT_LABELS = {'processed': '處理', 'inserted': '新增', 'updated': '更新', 'unchanged': '未變動', 'count': '匯入'}
+
+
+def compute_content_hash(file) -> str:
+    """以串流方式計算上傳檔案內容的 SHA-256 (計算後檔案指標回到開頭)。"""
+    file.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _stored_path(content_hash: str):
+    return IMPORT_DIR / content_hash[:2] / f"{content_hash}.gz"
+
+
+def find_previous_import(conn, file, import_type: str):
+    """回傳 (內容雜湊值, 先前的匯入紀錄或 None)。"""
+    content_hash = compute_content_hash(file)
+    return content_hash, q_import.get_import_by_hash(conn, content_hash, import_type)
+
+
+def archive_upload(file, content_hash: str = None) -> str:
+    """將上傳檔案壓縮保存到匯入封存目錄 (已存在則略過)，回傳相對於封存目錄的路徑。"""
+    content_hash = content_hash or compute_content_hash(file)
+    path = _stored_path(content_hash)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        file.seek(0)
+        with gzip.open(tmp_path, 'wb', compresslevel=6) as f_out:
+            shutil.copyfileobj(file, f_out, length=HASH_CHUNK_SIZE)
+        tmp_path.replace(path)
+        file.seek(0)
+    return str(path.relative_to(IMPORT_DIR))
+
+
+def begin_import(conn) -> int:
+    """匯入前呼叫，回傳目前的 change_log 水位，完成後交給 record_import()。"""
+    return q_cl.get_latest_watermark(conn)
+
+
+def record_import(conn, file, import_type: str, watermark_before: int, result: dict, content_hash: str = None):
+    """匯入完成後保存原始檔並記錄匯入結果與水位。"""
+    content_hash = content_hash or compute_content_hash(file)
+    stored_file = archive_upload(file, content_hash)
+    file.seek(0, io.SEEK_END)
+    file_size = file.tell()
+    file.seek(0)
+    q_import.upsert_import_record(
+        conn, content_hash, import_type, getattr(file, 'name', None), file_size, stored_file,
+        watermark_before, q_cl.get_latest_watermark(conn), result
+    )
+
+
+def open_archived_upload(conn, record_id: int) -> io.BytesIO:
+    """從匯入封存取出原始檔內容 (BytesIO，name 屬性為原始檔名)，供重新套用匯入。"""
+    record = q_import.get_import_by_id(conn, record_id)
+    if record is None:
+        raise ValueError(f"找不到匯入紀錄 ID: {record_id}")
+    path = IMPORT_DIR / record['stored_file']
+    if not path.exists():
+        raise FileNotFoundError(f"匯入封存檔已不存在: {path}")
+    with gzip.open(path, 'rb') as f:
+        data = io.BytesIO(f.read())
+    data.name = record['file_name'] or path.stem
+    return data
+
+
+def describe_import(record: dict) -> str:
+    """將匯入紀錄整理成一行說明文字。"""
+    result = record.get('result') or {}
+    parts = [f"{RESULT_LABELS.get(k, k)} {v} 筆" for k, v in result.items() if isinstance(v, (int, float))]
+    summary = f"（{'、'.join(parts)}）" if parts else ""
+    return f"此檔案已於 {record['imported_at']} 匯入過 {record['import_count']} 次{summary}。"
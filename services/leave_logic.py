@@ -5,238 +5,189 @@
 - 精確計算請假時數（扣除午休、假日）。
 """
 import pandas as pd
+import numpy as np
 import requests
 import io
-import csv
-from datetime import datetime, time, date, timedelta
-from dateutil.relativedelta import relativedelta
+from datetime import time
 import traceback
-import streamlit as st
-from bs4 import BeautifulSoup
 from db import queries_attendance as q_att
+from services import calendar_logic as logic_calendar
 
 # --- 核心功能函式 ---
 
-@st.cache_data
-def fetch_taiwan_calendar(year: int):
+# 每日上班時段 (扣除午休)
+WORK_BLOCKS = ((time(8, 0), time(12, 0)), (time(13, 0), time(17, 0)))
+_WORK_BLOCK_SECONDS = tuple((s.hour * 3600 + s.minute * 60, e.hour * 3600 + e.minute * 60) for s, e in WORK_BLOCKS)
+WORKDAY_SECONDS = sum(e - s for s, e in _WORK_BLOCK_SECONDS)
+
+
+def _work_seconds_until(seconds_of_day: np.ndarray) -> np.ndarray:
+    """當日 00:00 到指定時刻 (當日秒數) 之間落在上班時段內的秒數。"""
+    return sum(np.clip(seconds_of_day - s, 0, e - s) for s, e in _WORK_BLOCK_SECONDS)
+
+
+def _round_hours(seconds):
+    """以秒數直接四捨五入到 0.01 小時 (36 秒)，不受浮點數累加誤差影響。"""
+    return np.floor(np.asarray(seconds, dtype=float) / 36 + 0.5) / 100
+
+
+def cumulative_work_seconds(timestamps: pd.Series, calendar) -> np.ndarray:
     """
-    【二次修正版】根據您提供的最新HTML結構，能夠更精準地尋找下載連結，
-    並排除掉非必要的檔案版本(如Google專用版)。
-    【三次修正版】移除所有 st.info/success/error 提示，只回傳結果與狀態訊息。
+    從行事曆起始日到各時間點為止的累計上班秒數 (前綴和)：
+    之前的上班日數 x 每日上班秒數 + 當日 (若為上班日) 已經過的上班秒數。
+    兩個時間點相減即為其間的上班時間；timestamps 不可含 NaT。
     """
-    try:
-        roc_year = year - 1911
-        dataset_url = "https://data.gov.tw/dataset/14718"
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-
-        page_res = requests.get(dataset_url, headers=headers, timeout=15)
-        page_res.raise_for_status()
-        
-        soup = BeautifulSoup(page_res.text, 'lxml')
-
-        candidates = []
-        for item in soup.select("li.resource-item"):
-            link_element = item.select_one("a")
-            if not link_element or not link_element.has_attr('href'):
-                continue
-            
-            link_url = link_element['href']
-            link_text = item.get_text(strip=True)
-
-            if f"{roc_year}年" not in link_text: continue
-            if 'csv' not in link_url.lower(): continue
-            unwanted_keywords = ["Google", "iCal", "PDF", "ODS", "XML", "JSON"]
-            if any(keyword.lower() in link_text.lower() for keyword in unwanted_keywords): continue
-
-            candidates.append({"text": link_text, "url": link_url})
-        
-        if not candidates:
-            return set(), set(), f"錯誤：在資料集頁面上找不到民國 {roc_year} 年的通用 CSV 檔案。"
-        
-        best_choice = candidates[0]
-        for candidate in candidates:
-            if "修正版" in candidate["text"]:
-                best_choice = candidate
-                break
-        
-        target_link = best_choice["url"]
-        
-        response = requests.get(target_link, headers=headers, timeout=15)
-        response.raise_for_status()
-        
-        holidays = set()
-        workdays = set()
-
-        csv_file = io.StringIO(response.text)
-        reader = csv.DictReader(csv_file)
-        
-        for row in reader:
-            try:
-                date_str = row.get("西元日期") or row.get("date")
-                is_holiday_str = row.get("是否放假") or row.get("isHoliday")
-                
-                if not date_str or not is_holiday_str: continue
-
-                d = datetime.strptime(date_str, "%Y%m%d").date()
-                
-                if is_holiday_str == '2': holidays.add(d)
-                elif is_holiday_str == '0': workdays.add(d)
-                
-            except (ValueError, KeyError, TypeError): continue
-        
-        status_message = f"成功同步 {year} 年行事曆！(共 {len(holidays)} 個假日與 {len(workdays)} 個上班日)"
-        return holidays, workdays, status_message
-        
-    except requests.RequestException as e:
-        return set(), set(), f"抓取 {year} 年行事曆時發生網路錯誤: {e}"
-    except Exception as e:
-        return set(), set(), f"處理 {year} 年行事曆資料時發生未知錯誤: {e}"
+    days = timestamps.dt.normalize()
+    seconds_of_day = (timestamps - days).dt.total_seconds().to_numpy()
+    day_values = days.to_numpy().astype('datetime64[D]')
+    worked_today = np.where(calendar.workday_mask(days), _work_seconds_until(seconds_of_day), 0.0)
+    return calendar.workdays_before(day_values) * WORKDAY_SECONDS + worked_today
 
-def calculate_leave_hours(start_dt, end_dt, calendar_status_messages):
+
+def calculate_leave_hours_series(start, end, calendar) -> pd.Series:
+    """
+    一次核算整批假單的請假時數 (扣除午休、週末與國定假日，補班日照常計算)。
+    start / end 為開始與結束時間 (Series 或可轉為日期時間的序列)，回傳與 start 相同索引的時數。
+    開始時間為 00:00 的假單視為全天假，以起訖日期間的上班日數 x 8 小時計算；
+    其餘假單以累計上班秒數相減，每筆只需兩次查表。起訖時間無效或結束早於開始時為 0。
+    """
+    start = pd.to_datetime(pd.Series(start), errors='coerce')
+    end = pd.Series(pd.to_datetime(pd.Series(end), errors='coerce').to_numpy(), index=start.index)
+    valid = start.notna() & end.notna() & (end >= start)
+    hours = pd.Series(0.0, index=start.index)
+    if not valid.any():
+        return hours
+
+    start, end = start[valid], end[valid]
+    start_day, end_day = start.dt.normalize(), end.dt.normalize()
+    is_full_day = (start == start_day).to_numpy()
+    full_day_seconds = (
+        calendar.workdays_before((end_day + pd.Timedelta(days=1)).to_numpy().astype('datetime64[D]'))
+        - calendar.workdays_before(start_day.to_numpy().astype('datetime64[D]'))
+    ) * WORKDAY_SECONDS
+    partial_seconds = cumulative_work_seconds(end, calendar) - cumulative_work_seconds(start, calendar)
+    seconds = np.where(is_full_day, full_day_seconds, partial_seconds)
+    hours[valid] = _round_hours(seconds)
+    return hours
+
+
+def calculate_leave_hours(start_dt, end_dt, calendar):
     """
-    接收 datetime 物件，精確計算請假時數。
+    接收 datetime 物件，精確計算請假時數 (單筆版，規則同 calculate_leave_hours_series)。
+    calendar 為預先載入的 HolidayCalendar (calendar_logic.load_holiday_calendar)，計算時不需連網。
     """
     if pd.isna(start_dt) or pd.isna(end_dt) or end_dt < start_dt:
         return 0.0
+    start_dt, end_dt = pd.Timestamp(start_dt), pd.Timestamp(end_dt)
+    start_day, end_day = start_dt.normalize(), end_dt.normalize()
+    if start_dt == start_day:
+        before = calendar.workdays_before(np.array([end_day + pd.Timedelta(days=1), start_day], dtype='datetime64[D]'))
+        seconds = (before[0] - before[1]) * WORKDAY_SECONDS
+    else:
+        before = calendar.workdays_before(np.array([end_day, start_day], dtype='datetime64[D]'))
+        end_today = _work_seconds_until((end_dt - end_day).total_seconds()) if calendar.is_workday(end_day) else 0.0
+        start_today = _work_seconds_until((start_dt - start_day).total_seconds()) if calendar.is_workday(start_day) else 0.0
+        seconds = (before[0] - before[1]) * WORKDAY_SECONDS + end_today - start_today
+    return float(_round_hours(seconds))
+
+
+def _calendar_status_messages(calendar, years) -> list:
+    """列出本次核算用到的行事曆年度狀態 (資料庫中已有的年度與缺漏的年度)。"""
+    messages = [f"成功讀取 {y} 年行事曆 (資料庫)" for y in sorted(set(years) & set(calendar.years))]
+    missing_message = logic_calendar.describe_missing_years(calendar, years)
+    if missing_message:
+        messages.append(missing_message)
+    return messages
+
+
+LEAVE_CHECK_COLUMNS = [
+    'Employee Name', 'Type of Leave', 'Start Date', 'End Date',
+    'Duration', 'Duration (Hours)', '核算時數', '備註', 'Request ID', 'Status'
+]
+
+
+def read_leave_source(source_input) -> pd.DataFrame:
+    """讀取 Google Sheet 連結或上傳的 CSV 假單，所有欄位皆為字串 (空值為空字串)。"""
+    if isinstance(source_input, str) and "docs.google.com/spreadsheets" in source_input:
+        csv_export_url = source_input.replace('/edit?usp=sharing', '/export?format=csv')
+        response = requests.get(csv_export_url)
+        response.raise_for_status()
+        source_bytes = response.content
+    else:
+        source_bytes = source_input.getvalue()
+    content = source_bytes.decode('utf-8-sig')
+    return pd.read_csv(io.StringIO(content), dtype=str).fillna("")
 
-    is_full_day = start_dt.time() == time(0, 0)
-
-    years_to_fetch = set(range(start_dt.year, end_dt.year + 1))
-    all_holidays, all_makeup_workdays = set(), set()
-    for year_to_fetch in years_to_fetch:
-        h, w, status_msg = fetch_taiwan_calendar(year_to_fetch)
-        all_holidays.update(h)
-        all_makeup_workdays.update(w)
-        if status_msg not in calendar_status_messages:
-            calendar_status_messages.append(status_msg)
-        
-    total_hours = 0.0
-    work_start, lunch_start = time(8, 0), time(12, 0)
-    lunch_end, work_end = time(13, 0), time(17, 0)
-    
-    current_date = start_dt.date()
-    while current_date <= end_dt.date():
-        is_weekend = current_date.weekday() >= 5
-        is_holiday = current_date in all_holidays
-        is_makeup_workday = current_date in all_makeup_workdays
-        
-        if (is_weekend and not is_makeup_workday) or (is_holiday and not is_makeup_workday):
-            current_date += timedelta(days=1)
-            continue
-
-        day_leave_start = start_dt.time() if current_date == start_dt.date() else time.min
-        day_leave_end = end_dt.time() if current_date == end_dt.date() else time.max
-        
-        if is_full_day:
-            day_leave_start, day_leave_end = work_start, work_end
-        
-        am_overlap_start = max(day_leave_start, work_start)
-        am_overlap_end = min(day_leave_end, lunch_start)
-        if am_overlap_end > am_overlap_start:
-            duration = datetime.combine(date.today(), am_overlap_end) - datetime.combine(date.today(), am_overlap_start)
-            total_hours += duration.total_seconds() / 3600
-
-        pm_overlap_start = max(day_leave_start, lunch_end)
-        pm_overlap_end = min(day_leave_end, work_end)
-        if pm_overlap_end > pm_overlap_start:
-            duration = datetime.combine(date.today(), pm_overlap_end) - datetime.combine(date.today(), pm_overlap_start)
-            total_hours += duration.total_seconds() / 3600
-            
-        current_date += timedelta(days=1)
-        
-    return round(total_hours, 2)
-
-
-def process_leave_file(source_input, year=None, month=None):
+
+def check_leave_records(df: pd.DataFrame, calendar, year=None, month=None) -> tuple:
     """
-    整合了讀取、篩選、計算的單一主函式。
+    篩選「已通過」的假單並逐欄核算請假時數 (不依賴 Streamlit，可單獨測試)。
+    - 開始/結束時間一次解析；缺少或無法解析的假單略過並記錄原因。
+    - 指定 year/month 時只保留開始時間落在該月份的假單。
+    - 核算時數與原單據時數 (Duration (Hours)，沒有時用 Duration) 相差超過 0.1 小時者於「備註」標示。
+    回傳 (核對結果, 報告)；報告包含 'skipped' [(Request ID, 原因)] 與 'calendar_messages'。
+    """
+    df = df[df['Status'].str.strip() == '已通過']
+    if df.empty:
+        raise ValueError("在整個資料來源中找不到任何「已通過」的假單。")
+
+    start = pd.to_datetime(df['Start Date'], format='mixed', errors='coerce')
+    end = pd.to_datetime(df['End Date'], format='mixed', errors='coerce')
+    unparsable = start.isna() | end.isna()
+    request_ids = df['Request ID'] if 'Request ID' in df.columns else pd.Series('N/A', index=df.index)
+    skipped = [(request_id, "缺少或無法解析開始/結束時間") for request_id in request_ids[unparsable]]
+
+    keep = ~unparsable
+    if year is not None and month is not None:
+        keep &= (start.dt.year == year) & (start.dt.month == month)
+    df, start, end = df[keep].copy(), start[keep], end[keep]
+
+    report = {'skipped': skipped, 'calendar_messages': []}
+    if df.empty:
+        return df, report
+
+    hours = calculate_leave_hours_series(start, end, calendar)
+    df['Start Date'] = start
+    df['End Date'] = end
+    df['核算時數'] = hours
+
+    duration_col = next((c for c in ('Duration (Hours)', 'Duration') if c in df.columns), None)
+    if duration_col:
+        original_text = df[duration_col].str.strip()
+        original = pd.to_numeric(original_text, errors='coerce')
+        mismatch = original.notna() & ((original - hours).abs() > 0.1)
+        df['備註'] = np.where(
+            mismatch, "系統核算時數(" + hours.astype(str) + ")與原單據時數(" + original_text + ")不符", ""
+        )
+    else:
+        df['備註'] = ""
+
+    valid_dates = pd.concat([start, end]).dropna()
+    years = set(range(valid_dates.dt.year.min(), valid_dates.dt.year.max() + 1)) if not valid_dates.empty else set()
+    report['calendar_messages'] = _calendar_status_messages(calendar, years)
+
+    existing_cols = [col for col in LEAVE_CHECK_COLUMNS if col in df.columns]
+    other_cols = [col for col in df.columns if col not in existing_cols]
+    return df[existing_cols + other_cols].reset_index(drop=True), report
+
+
+def process_leave_file(conn, source_input, year=None, month=None):
+    """
+    整合了讀取、篩選、計算的單一主函式，回傳 (核對結果, 報告)，報告格式同 check_leave_records。
+    假日判斷使用資料庫中的國定假日行事曆 (calendar_day)，核算時不需連網。
     """
-    calendar_sync_messages = []
-    
     try:
-        source_bytes = None
-        if isinstance(source_input, str) and "docs.google.com/spreadsheets" in source_input:
-            csv_export_url = source_input.replace('/edit?usp=sharing', '/export?format=csv')
-            response = requests.get(csv_export_url)
-            response.raise_for_status()
-            source_bytes = response.content
-        else:
-            source_bytes = source_input.getvalue()
-
-        content = source_bytes.decode('utf-8-sig')
-        df = pd.read_csv(io.StringIO(content), dtype=str).fillna("")
-        df.dropna(how='all', inplace=True)
-        df = df[df['Status'].str.strip() == '已通過'].copy()
-        
-        if df.empty:
-            raise ValueError("在整個資料來源中找不到任何「已通過」的假單。")
-
-        processed_records = []
-        for _, row in df.iterrows():
-            try:
-                start_date_obj = pd.to_datetime(row['Start Date'])
-                end_date_obj = pd.to_datetime(row['End Date'])
-
-                if year is not None and month is not None:
-                    if not (start_date_obj.year == year and start_date_obj.month == month):
-                        continue
-
-                leave_hours = calculate_leave_hours(start_date_obj, end_date_obj, calendar_sync_messages)
-                
-                new_row = row.to_dict()
-                new_row['Start Date'] = start_date_obj
-                new_row['End Date'] = end_date_obj
-                new_row["核算時數"] = leave_hours
-                
-                original_duration = pd.to_numeric(row.get('Duration (Hours)', row.get('Duration')), errors='coerce')
-                if pd.notna(original_duration) and abs(original_duration - leave_hours) > 0.1:
-                    new_row["備註"] = f"系統核算時數({leave_hours})與原單據時數({original_duration})不符"
-                else:
-                    new_row["備註"] = ""
-                
-                processed_records.append(new_row)
-
-            except Exception as e:
-                st.warning(f"跳過一筆無法處理的假單。Request ID: {row.get('Request ID', 'N/A')}, 錯誤: {e}")
-                continue
-        
-        if calendar_sync_messages:
-            with st.expander("行事曆同步狀態", expanded=True):
-                for msg in calendar_sync_messages:
-                    if "成功" in msg:
-                        st.write(f"✔️ {msg}")
-                    else:
-                        st.warning(f"⚠️ {msg}")
-
-        if not processed_records:
-            if year and month:
-                raise ValueError(f"在 {year} 年 {month} 月中，找不到任何有效的「已通過」假單紀錄。")
-            else:
-                raise ValueError("找不到任何有效的「已通過」假單紀錄。")
-
-        result_df = pd.DataFrame(processed_records)
-        
-        cols_order = [
-            'Employee Name', 'Type of Leave', 'Start Date', 'End Date',
-            'Duration', 'Duration (Hours)', '核算時數', '備註', 'Request ID', 'Status'
-        ]
-        existing_cols = [col for col in cols_order if col in result_df.columns]
-        other_cols = [col for col in result_df.columns if col not in existing_cols]
-        
-        return result_df[existing_cols + other_cols]
-
+        calendar = logic_calendar.load_holiday_calendar(conn)
+        result_df, report = check_leave_records(read_leave_source(source_input), calendar, year, month)
     except Exception as e:
-        if calendar_sync_messages:
-            with st.expander("行事曆同步狀態", expanded=True):
-                for msg in calendar_sync_messages:
-                    if "成功" in msg:
-                        st.write(f"✔️ {msg}")
-                    else:
-                        st.warning(f"⚠️ {msg}")
         raise ValueError(f"處理請假檔案時發生錯誤: {e}")
 
+    if result_df.empty:
+        if year and month:
+            raise ValueError(f"處理請假檔案時發生錯誤: 在 {year} 年 {month} 月中，找不到任何有效的「已通過」假單紀錄。")
+        raise ValueError("處理請假檔案時發生錯誤: 找不到任何有效的「已通過」假單紀錄。")
+    return result_df, report
+
 # --- 【V5 版邏輯】 ---
 def is_time_present(time_val):
     """
@@ -247,225 +198,164 @@ def is_time_present(time_val):
     time_val_str = str(time_val).strip()
     return not (not time_val_str or time_val_str == '-' or time_val_str == '--')
 
+def describe_leave_types(leave_df: pd.DataFrame) -> pd.Series:
+    """
+    依請假時間產生假別描述：
+    時數 >= 8 為「全天」、中午前開始且 13:00 前結束為「上午」、中午後開始為「下午」。
+    """
+    leave_type = leave_df['leave_type']
+    start_time = leave_df['start_date'] - leave_df['start_date'].dt.normalize()
+    end_time = leave_df['end_date'] - leave_df['end_date'].dt.normalize()
+    noon, one_pm = pd.Timedelta(hours=12), pd.Timedelta(hours=13)
+    text = leave_type.astype('string').fillna('')
+    described = np.select(
+        [leave_type.isna(), leave_df['duration'] >= 8, (start_time < noon) & (end_time <= one_pm), start_time >= noon],
+        ['', '全天' + text, '上午' + text, '下午' + text],
+        default=text,
+    )
+    return pd.Series(described, index=leave_df.index, dtype=object)
+
+
+def expand_leave_days(leave_df: pd.DataFrame, columns: list = None) -> pd.DataFrame:
+    """
+    將假單展開為每日一列 (開始日到結束日，含首尾)，新增 'date' 欄位 (YYYY-MM-DD 字串)。
+    start_date / end_date 需為日期時間格式；columns 指定要保留的其他欄位 (預設保留全部)。
+    """
+    if columns is not None:
+        leave_df = leave_df[list(dict.fromkeys(['start_date', 'end_date'] + list(columns)))]
+    if leave_df.empty:
+        return leave_df.assign(date=pd.Series(dtype=object))
+    start_day = leave_df['start_date'].dt.normalize()
+    days = (leave_df['end_date'].dt.normalize() - start_day).dt.days.add(1).clip(lower=0).fillna(0).astype(int)
+    expanded = leave_df.loc[leave_df.index.repeat(days)]
+    offsets = expanded.groupby(level=0).cumcount().to_numpy()
+    dates = start_day.loc[expanded.index] + pd.to_timedelta(offsets, unit='D')
+    return expanded.assign(date=dates.dt.strftime('%Y-%m-%d').to_numpy()).reset_index(drop=True)
+
+
+FULL_DAY_START = pd.Timedelta(hours=8)
+FULL_DAY_END = pd.Timedelta(hours=17)
+# 與 datetime.time.max (23:59:59.999999) 相同的當日最晚時間
+END_OF_DAY = pd.Timedelta(hours=23, minutes=59, seconds=59, microseconds=999999)
+
+
+def _is_time_present_series(values: pd.Series) -> pd.Series:
+    """is_time_present 的向量化版本。"""
+    text = values.astype('string').str.strip()
+    return (values.notna() & text.notna() & ~text.isin(['', '-', '--'])).fillna(False).astype(bool)
+
+
+def _clock_offsets(values: pd.Series, present: pd.Series) -> tuple:
+    """將 'HH:MM:SS' 打卡時間轉為當日時間差；回傳 (時間差, 有值但格式錯誤的遮罩)。"""
+    parsed = pd.to_datetime(values.where(present).astype('string'), format='%H:%M:%S', errors='coerce')
+    offsets = parsed - parsed.dt.normalize()
+    return offsets, present & parsed.isna()
+
+
+def _join_leaves_to_attendance(att: pd.DataFrame, leave_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    區間合併：以員工為鍵合併後，一次篩選出涵蓋出勤日期的假單 (開始日 <= 出勤日 <= 結束日)，
+    回傳每一組 (出勤列, 假單) 及其在出勤當日的請假起訖時間。
+    """
+    leaves = leave_df.reset_index(drop=True)
+    leaves['leave_idx'] = leaves.index
+    leaves['start_day'] = leaves['start_dt'].dt.normalize()
+    leaves['end_day'] = leaves['end_dt'].dt.normalize()
+    pairs = att[['att_idx', 'employee_id', 'day']].merge(
+        leaves[['leave_idx', 'employee_id', 'leave_type', 'duration', 'start_dt', 'end_dt', 'start_day', 'end_day']],
+        on='employee_id'
+    )
+    pairs = pairs[(pairs['start_day'] <= pairs['day']) & (pairs['end_day'] >= pairs['day'])]
+    pairs = pairs.sort_values(['att_idx', 'leave_idx']).reset_index(drop=True)
+
+    starts_today = pairs['start_day'] == pairs['day']
+    ends_today = pairs['end_day'] == pairs['day']
+    start_offset = pairs['start_dt'] - pairs['start_day']
+    end_offset = pairs['end_dt'] - pairs['end_day']
+    pairs['is_full_day'] = (
+        (~starts_today & ~ends_today)
+        | (starts_today & ~ends_today & (start_offset <= FULL_DAY_START))
+        | (~starts_today & ends_today & (end_offset >= FULL_DAY_END))
+        | (starts_today & ends_today & (pairs['duration'] >= 8))
+    )
+    pairs['day_start'] = start_offset.where(starts_today, pd.Timedelta(0))
+    pairs['day_end'] = end_offset.where(ends_today, END_OF_DAY)
+    return pairs
+
+
 def analyze_attendance_leave_conflicts(conn, year: int, month: int):
     """
     交叉比對指定月份的出勤與假單，找出異常情況，並回傳所有紀錄。
     - V6: 修正為回傳所有出勤紀錄，並附加分析結果欄位。
+    - V7: 改以區間合併一次比對整個月份，不再逐筆掃描假單。
     """
     attendance_df, leave_df = q_att.get_monthly_attendance_and_leave_data(conn, year, month)
     
     if attendance_df.empty:
         return pd.DataFrame({'分析結果': ['該月份無任何出勤紀錄可供分析。']})
 
-    all_records = []
     # --- 預處理 ---
-    attendance_df['date'] = pd.to_datetime(attendance_df['date']).dt.date
-    if not leave_df.empty:
-        leave_df['start_dt'] = pd.to_datetime(leave_df['start_date'])
-        leave_df['end_dt'] = pd.to_datetime(leave_df['end_date'])
-
-    # --- 遍歷每一筆出勤紀錄 ---
-    for _, att_row in attendance_df.iterrows():
-        # 為每筆紀錄建立一個包含預設值的字典
-        record = {
-            '員工姓名': att_row['name_ch'],
-            '日期': att_row['date'].strftime('%Y-%m-%d'),
-            '簽到時間': att_row.get('checkin_time'),
-            '簽退時間': att_row.get('checkout_time'),
-            '假別': '無',
-            '請假時間': '無',
-            '分析結果': '✅ 正常' # 預設狀態為正常
-        }
-        current_day = att_row['date']
-        
-        employee_leaves = pd.DataFrame()
-        if not leave_df.empty:
-            employee_leaves = leave_df[
-                (leave_df['employee_id'] == att_row['employee_id']) &
-                (leave_df['start_dt'].dt.date <= current_day) &
-                (leave_df['end_dt'].dt.date >= current_day)
-            ].copy()
-        
-        has_leave = not employee_leaves.empty
-        if has_leave:
-            record['假別'] = ", ".join(employee_leaves['leave_type'].unique())
-        
-        is_full_day_leave = False
-        if has_leave:
-            for _, leave_row in employee_leaves.iterrows():
-                leave_start, leave_end = leave_row['start_dt'], leave_row['end_dt']
-                if (leave_start.date() < current_day < leave_end.date() or
-                    (leave_start.date() == current_day < leave_end.date() and leave_start.time() <= time(8, 0)) or
-                    (leave_start.date() < current_day == leave_end.date() and leave_end.time() >= time(17, 0)) or
-                    (leave_start.date() == current_day == leave_end.date() and leave_row['duration'] >= 8)):
-                    is_full_day_leave = True
-                    break
-            
-            if is_full_day_leave:
-                record['請假時間'] = "全天"
-            else:
-                day_start = employee_leaves['start_dt'].min()
-                day_end = employee_leaves['end_dt'].max()
-                day_start_time = day_start.time() if day_start.date() == current_day else time.min
-                day_end_time = day_end.time() if day_end.date() == current_day else time.max
-                record['請假時間'] = f"{day_start_time.strftime('%H:%M')} - {day_end_time.strftime('%H:%M')}"
-
-        has_checkin = is_time_present(att_row['checkin_time'])
-        has_checkout = is_time_present(att_row['checkout_time'])
-        has_any_clock = has_checkin or has_checkout
-        
-        # --- 開始分析，並覆寫 '分析結果' ---
-        if is_full_day_leave and not has_any_clock:
-            record['分析結果'] = '✅ 全天請假'
-        elif att_row['absent_minutes'] > 0 and not has_leave:
-            record['分析結果'] = f"⚠️ 異常：缺席 {att_row['absent_minutes']} 分鐘，但查無假單。"
-        elif has_leave:
-            if is_full_day_leave and has_any_clock:
-                record['分析結果'] = f"⚠️ 異常：請了全天假，但仍有打卡紀錄。"
-            elif not is_full_day_leave and has_any_clock:
-                is_conflict, conflict_details = False, []
-                try:
-                    clock_in_time = datetime.strptime(str(att_row['checkin_time']), '%H:%M:%S').time() if has_checkin else None
-                    clock_out_time = datetime.strptime(str(att_row['checkout_time']), '%H:%M:%S').time() if has_checkout else None
-                    for _, leave_row in employee_leaves.iterrows():
-                        leave_start, leave_end = leave_row['start_dt'], leave_row['end_dt']
-                        leave_day_start = leave_start.time() if leave_start.date() == current_day else time.min
-                        leave_day_end = leave_end.time() if leave_end.date() == current_day else time.max
-                        if clock_in_time and leave_day_start <= clock_in_time < leave_day_end:
-                            is_conflict = True
-                            conflict_details.append("簽到時間在假單內")
-                        if clock_out_time and leave_day_start < clock_out_time <= leave_day_end:
-                            is_conflict = True
-                            conflict_details.append("簽退時間在假單內")
-                except (ValueError, TypeError):
-                    is_conflict = True
-                    conflict_details.append("打卡時間格式錯誤")
-                if is_conflict:
-                    record['分析結果'] = f"❓ 提醒：{', '.join(list(set(conflict_details)))}。"
-
-        # 將處理完的紀錄 (無論是否異常) 都加入最終列表
-        all_records.append(record)
-    
-    # 用包含所有紀錄的列表建立 DataFrame
-    if not all_records:
-         return pd.DataFrame({'分析結果': ['✅ 完美！該月份的出勤與請假紀錄沒有發現明顯衝突。']})
-
-    return pd.DataFrame(all_records)
-
-def get_employee_annual_leave_history(self, employee_id, hire_date_str):
-        """
-        計算該員工歷年的特休週期、應給、已休、剩餘 (週年制)
-        """
-        if not hire_date_str:
-            return []
-
-        try:
-            hire_date = datetime.strptime(str(hire_date_str), '%Y-%m-%d').date()
-        except ValueError:
-            return []
-
-        today = datetime.now().date()
-        history_records = []
-        
-        # 台灣勞基法特休規則 (年資 -> 天數)
-        def get_entitled_days(years_of_service):
-            if years_of_service < 0.5: return 0
-            if 0.5 <= years_of_service < 1: return 3
-            if 1 <= years_of_service < 2: return 7
-            if 2 <= years_of_service < 3: return 10
-            if 3 <= years_of_service < 5: return 14
-            if 5 <= years_of_service < 10: return 15
-            # 10年以上，每一年加1天，上限30天
-            days = 15 + (int(years_of_service) - 9)
-            return min(days, 30)
-
-        # 從到職日開始推算每一個週期，直到超過今天的一年後
-        # 邏輯：
-        # 1. 滿半年: hire_date + 6m ~ hire_date + 1y
-        # 2. 滿一年: hire_date + 1y ~ hire_date + 2y
-        # 3. 滿兩年: hire_date + 2y ~ hire_date + 3y ...
-        
-        # 處理滿半年的特殊情況 (6個月~1年)
-        date_6m = hire_date + relativedelta(months=6)
-        date_1y = hire_date + relativedelta(years=1)
-        
-        if date_6m <= today or True: # 只要有這段歷史都算
-            # 查詢這段期間的請假天數 (需呼叫 DB 查詢特定區間的特休)
-            used_days = self.get_used_annual_leave_in_period(employee_id, date_6m, date_1y)
-            entitled = 3
-            
-            history_records.append({
-                "年資": "滿半年 (6個月-1年)",
-                "週期開始": date_6m,
-                "週期結束": date_1y,
-                "特休總額": entitled,
-                "已休天數": used_days,
-                "剩餘天數": entitled - used_days,
-                "狀態": "過期" if date_1y < today else "進行中"
-            })
-
-        # 處理滿 N 年的迴圈
-        current_check_date = date_1y
-        years_count = 1
-        
-        while current_check_date <= today + relativedelta(years=1):
-            period_start = current_check_date
-            period_end = current_check_date + relativedelta(years=1)
-            
-            # 計算該年度應給天數
-            entitled = get_entitled_days(years_count)
-            
-            # 查詢區間內已用特休
-            used_days = self.get_used_annual_leave_in_period(employee_id, period_start, period_end)
-            
-            status = "未開始"
-            if period_start <= today <= period_end:
-                status = "進行中 (目前年度)"
-            elif period_end < today:
-                status = "過期 (可結算)"
-            
-            history_records.append({
-                "年資": f"滿 {years_count} 年",
-                "週期開始": period_start,
-                "週期結束": period_end,
-                "特休總額": entitled,
-                "已休天數": used_days,
-                "剩餘天數": entitled - used_days,
-                "狀態": status
-            })
-            
-            current_check_date = period_end
-            years_count += 1
-
-        # 反轉列表，讓最近的年度在最上面
-        return history_records[::-1]
-
-def get_used_annual_leave_in_period(self, employee_id, start_date, end_date):
-    """
-    輔助函數：查詢某員工在特定日期區間內，請了多少天'特休'
-    這需要呼叫 db/queries_attendance.py 或直接執行 SQL
-    """
-    from db.db_manager import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # 假設 leave_records 表有 leave_type='特休'，並且有 start_date, end_date, total_days
-    # 注意：這裡簡化了跨天計算，假設資料庫存的是單筆請假紀錄
-    query = """
-        SELECT SUM(days) 
-        FROM leave_records 
-        WHERE employee_id = %s 
-            AND leave_type = '特休'
-            AND status = 'Approved'
-            AND start_date >= %s 
-            AND start_date < %s
-    """
-    # 注意: end_date 通常是不包含的，或是看您的系統設計
-    
-    cursor.execute(query, (employee_id, start_date, end_date))
-    result = cursor.fetchone()
-    conn.close()
-    
-    return result[0] if result and result[0] else 0.0
-
+    att = attendance_df.reset_index(drop=True)
+    att['att_idx'] = att.index
+    att['day'] = pd.to_datetime(att['date']).dt.normalize()
+    leave_df['start_dt'] = pd.to_datetime(leave_df['start_date'])
+    leave_df['end_dt'] = pd.to_datetime(leave_df['end_date'])
+    pairs = _join_leaves_to_attendance(att, leave_df)
+
+    # --- 每筆出勤彙總其假單 (att_idx 即 att 的索引) ---
+    grouped = pairs.groupby('att_idx')
+    has_leave = att['att_idx'].isin(pairs['att_idx'])
+    is_full_day = grouped['is_full_day'].any().reindex(att.index, fill_value=False).astype(bool)
+    leave_types = pairs.drop_duplicates(['att_idx', 'leave_type']).groupby('att_idx')['leave_type'].agg(', '.join).reindex(att.index)
+    range_start = grouped['start_dt'].min().reindex(att.index)
+    range_end = grouped['end_dt'].max().reindex(att.index)
+    start_text = range_start.dt.strftime('%H:%M').where(range_start.dt.normalize() == att['day'], '00:00')
+    end_text = range_end.dt.strftime('%H:%M').where(range_end.dt.normalize() == att['day'], '23:59')
+    leave_time = np.where(is_full_day, '全天', start_text + ' - ' + end_text)
+
+    # --- 打卡時間是否落在假單內 ---
+    has_checkin = _is_time_present_series(att['checkin_time'])
+    has_checkout = _is_time_present_series(att['checkout_time'])
+    has_any_clock = has_checkin | has_checkout
+    checkin_offset, checkin_bad = _clock_offsets(att['checkin_time'], has_checkin)
+    checkout_offset, checkout_bad = _clock_offsets(att['checkout_time'], has_checkout)
+    format_error = checkin_bad | checkout_bad
+
+    if not pairs.empty:
+        pair_checkin = pairs['att_idx'].map(checkin_offset)
+        pair_checkout = pairs['att_idx'].map(checkout_offset)
+        pairs['checkin_in_leave'] = (pairs['day_start'] <= pair_checkin) & (pair_checkin < pairs['day_end'])
+        pairs['checkout_in_leave'] = (pairs['day_start'] < pair_checkout) & (pair_checkout <= pairs['day_end'])
+        checkin_in_leave = pairs.groupby('att_idx')['checkin_in_leave'].any().reindex(att.index, fill_value=False)
+        checkout_in_leave = pairs.groupby('att_idx')['checkout_in_leave'].any().reindex(att.index, fill_value=False)
+    else:
+        checkin_in_leave = checkout_in_leave = pd.Series(False, index=att.index)
+
+    def _reminder(i):
+        if format_error.iat[i]:
+            details = ["打卡時間格式錯誤"]
+        else:
+            details = (["簽到時間在假單內"] if checkin_in_leave.iat[i] else []) + \
+                      (["簽退時間在假單內"] if checkout_in_leave.iat[i] else [])
+        return f"❓ 提醒：{', '.join(list(set(details)))}。"
+
+    # --- 分析結果 (依原本的判斷優先順序) ---
+    partial_with_clock = has_leave & ~is_full_day & has_any_clock
+    needs_reminder = partial_with_clock & (format_error | checkin_in_leave | checkout_in_leave)
+    absent_values = att['absent_minutes'].astype(object)
+    result = pd.Series('✅ 正常', index=att.index, dtype=object)
+    result[needs_reminder] = [_reminder(i) for i in np.flatnonzero(needs_reminder)]
+    result[has_leave & is_full_day & has_any_clock] = '⚠️ 異常：請了全天假，但仍有打卡紀錄。'
+    absent_no_leave = (att['absent_minutes'] > 0) & ~has_leave
+    result[absent_no_leave] = [f"⚠️ 異常：缺席 {v} 分鐘，但查無假單。" for v in absent_values[absent_no_leave]]
+    result[is_full_day & ~has_any_clock] = '✅ 全天請假'
+
+    return pd.DataFrame({
+        '員工姓名': att['name_ch'],
+        '日期': att['day'].dt.strftime('%Y-%m-%d'),
+        '簽到時間': att['checkin_time'],
+        '簽退時間': att['checkout_time'],
+        '假別': leave_types.where(has_leave, '無'),
+        '請假時間': np.where(has_leave, leave_time, '無'),
+        '分析結果': result,
+    })
@@ -0,0 +1,139 @@
+# services/maintenance_logic.py
+"""
+資料庫定期維護。
+每月反覆刪除、重建薪資與獎金草稿後，資料庫會產生大量空頁，查詢規劃器也缺少統計資訊。
+維護工作會依序執行：
+1. ANALYZE 與 PRAGMA optimize：更新查詢規劃器的統計資訊。
+2. 空間回收：資料庫尚未啟用 auto_vacuum=INCREMENTAL 時，先做一次完整 VACUUM 轉換；
+   之後每次只需執行 PRAGMA incremental_vacuum 即可回收空頁。
+3. WAL checkpoint 並截斷 -wal 檔。
+4. PRAGMA integrity_check 完整性檢查。
+維護以獨佔工作交給寫入執行緒執行，並只在寫入佇列閒置一段時間 (quiet period) 後才自動啟動，
+執行結果 (耗時、回收空間、檢查結果) 記錄於 maintenance_log，可在系統參數設定頁檢視。
+"""
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from db.db_manager import DB_PATH
+from db import queries_config as q_config
+from db import queries_maintenance as q_maint
+from db.writer import get_writer
+
+DEFAULT_INTERVAL_HOURS = 24
+DEFAULT_QUIET_MINUTES = 10
+FAILURE_RETRY_HOURS = 1  # 維護失敗後的重試間隔，連續失敗時加倍，最長為原本的維護間隔
+AUTO_VACUUM_INCREMENTAL = 2
+
+_scheduler_started = False
+_scheduler_lock = threading.Lock()
+
+
+def _database_size(conn) -> int:
+    """資料庫目前佔用的大小 (bytes) = 頁數 × 每頁大小。"""
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return page_count * page_size
+
+
+def _run_maintenance_job(conn, trigger_source: str):
+    """(寫入執行緒中的獨佔工作) 執行維護並寫入紀錄，回傳紀錄內容。"""
+    started = time.monotonic()
+    record = {
+        'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'trigger_source': trigger_source,
+        'size_before_bytes': _database_size(conn),
+    }
+    tasks = []
+    try:
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+        tasks.append("ANALYZE")
+
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if auto_vacuum != AUTO_VACUUM_INCREMENTAL:
+            # 切換 auto_vacuum 模式必須搭配一次完整 VACUUM 才會生效 (只需做一次)
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            tasks.append("VACUUM (啟用增量回收)")
+        else:
+            freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if freelist:
+                conn.execute("PRAGMA incremental_vacuum")
+            tasks.append(f"incremental_vacuum ({freelist} 頁)")
+
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        tasks.append("WAL checkpoint")
+
+        rows = conn.execute("PRAGMA integrity_check").fetchall()
+        integrity = "\n".join(str(r[0]) for r in rows)
+        tasks.append("integrity_check")
+
+        record.update({
+            'integrity_result': integrity,
+            'status': 'success' if integrity == 'ok' else 'failed',
+            'message': None if integrity == 'ok' else '完整性檢查發現問題，請盡快從備份還原或聯絡系統管理員。',
+        })
+    except Exception as e:
+        record.update({'status': 'failed', 'message': str(e)})
+
+    size_after = _database_size(conn)
+    record.update({
+        'tasks': ', '.join(tasks),
+        'duration_seconds': round(time.monotonic() - started, 2),
+        'size_after_bytes': size_after,
+        'reclaimed_bytes': max(0, record['size_before_bytes'] - size_after),
+    })
+    q_maint.add_maintenance_log(conn, record)
+    return record
+
+
+def run_maintenance(trigger_source: str = 'manual') -> dict:
+    """立即執行一次維護 (排入寫入佇列，等待目前的寫入完成後執行)，回傳維護紀錄。"""
+    return get_writer().submit_exclusive(_run_maintenance_job, trigger_source).result()
+
+
+def get_maintenance_settings(conn) -> tuple:
+    """回傳 (維護間隔小時數, 需閒置的分鐘數)；間隔為 0 代表停用自動維護。"""
+    configs = q_config.get_all_configs(conn)
+    interval = float(configs.get('MAINTENANCE_INTERVAL_HOURS', DEFAULT_INTERVAL_HOURS))
+    quiet = float(configs.get('MAINTENANCE_QUIET_MINUTES', DEFAULT_QUIET_MINUTES))
+    return interval, quiet
+
+
+def run_scheduled_maintenance_if_due(conn):
+    """到期且寫入佇列已閒置足夠時間時執行維護；否則回傳 None。"""
+    interval, quiet_minutes = get_maintenance_settings(conn)
+    if interval <= 0:
+        return None
+    # 以最近一次嘗試 (含失敗) 計算下次執行時間，失敗時依連續失敗次數退避，避免每次檢查都重跑完整維護
+    last, failures = q_maint.get_last_maintenance_attempt(conn)
+    wait_hours = min(interval, FAILURE_RETRY_HOURS * 2 ** (failures - 1)) if failures else interval
+    if last and (datetime.now() - datetime.strptime(last, '%Y-%m-%d %H:%M:%S')).total_seconds() < wait_hours * 3600:
+        return None
+    writer = get_writer()
+    if writer.pending_jobs() > 0 or time.monotonic() - writer.last_activity < quiet_minutes * 60:
+        return None
+    return run_maintenance('scheduled')
+
+
+def start_maintenance_scheduler(check_every_seconds: int = 300):
+    """啟動背景自動維護執行緒 (每個行程只會啟動一次)。"""
+    global _scheduler_started
+    with _scheduler_lock:
+        if _scheduler_started:
+            return
+        _scheduler_started = True
+
+    def _loop():
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        while True:
+            time.sleep(check_every_seconds)
+            try:
+                run_scheduled_maintenance_if_due(conn)
+            except Exception as e:
+                print(f"--- [WARNING] 資料庫自動維護失敗: {e} ---")
+
+    threading.Thread(target=_loop, name="hr-db-maintenance", daemon=True).start()
@@ -1,14 +1,24 @@
 # services/report_generator.py
 import pandas as pd
+import numpy as np
 import io
-from datetime import time, datetime
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import PatternFill, Font
+from openpyxl.utils import get_column_letter
 from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.worksheet.page import PageMargins
+from openpyxl.worksheet.worksheet import Worksheet
 from openpyxl.worksheet.pagebreak import Break
 
 from db import queries_attendance as q_att
+from db import queries_report as q_report
+from services import leave_logic as logic_leave
 
 def _write_styled_excel(df: pd.DataFrame, sheet_name: str) -> io.BytesIO:
     """將 DataFrame 寫入一個帶有格式化表頭的 Excel 檔案中。"""
@@ -44,15 +54,27 @@ def _write_styled_excel(df: pd.DataFrame, sheet_name: str) -> io.BytesIO:
     output.seek(0)
     return output.getvalue()
 
+CJK_PATTERN = '[\u4e00-\u9fff]'
+FIXED_WIDTH_COLUMNS = ['I', 'J', 'K', 'L', 'M', 'N']
+
+
+def display_width(values: pd.Series) -> pd.Series:
+    """計算每個值的顯示寬度 (中文字算 2 個字元寬)，空值 (None、空字串、0) 寬度為 0。"""
+    text = values.where(values.notna() & (values != '') & (values != 0)).astype('string')
+    return (text.str.len() + text.str.count(CJK_PATTERN)).fillna(0).astype(int)
+
+
 def dataframe_to_report_excel(df_all_employees: pd.DataFrame, final_columns: list, numeric_columns: list):
-    """將包含所有員工的單一 DataFrame 轉換為格式化的、可分頁列印的 Excel 檔案。"""
+    """
+    將包含所有員工的單一 DataFrame 轉換為格式化的、可分頁列印的 Excel 檔案。
+    使用 openpyxl 的 write-only 模式逐列串流寫出；每位員工的小計公式列、分頁位置與欄寬都先計算好。
+    """
     output = io.BytesIO()
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "出勤月報表"
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("出勤月報表")
 
-    ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
-    ws.page_setup.paperSize = ws.PAPERSIZE_A4
+    ws.page_setup.orientation = Worksheet.ORIENTATION_LANDSCAPE
+    ws.page_setup.paperSize = Worksheet.PAPERSIZE_A4
     ws.page_setup.fitToWidth = 1
     ws.page_setup.fitToHeight = 0
     ws.page_margins = PageMargins(left=0.5, right=0.5, top=0.7, bottom=0.7)
@@ -61,90 +83,80 @@ def dataframe_to_report_excel(df_all_employees: pd.DataFrame, final_columns: lis
 
     header_fill = PatternFill(start_color="CCFFCC", end_color="CCFFCC", fill_type="solid")
     bold_font = Font(bold=True)
-    
-    for col_num, column_title in enumerate(final_columns, 1):
-        cell = ws.cell(row=1, column=col_num, value=column_title)
-        cell.fill = header_fill
+
+    # groupby 預設會略過沒有名稱的資料列
+    df_all_employees = df_all_employees[df_all_employees['名稱'].notna()]
+    df = df_all_employees.reindex(columns=final_columns)
+    names = df_all_employees['名稱']
+    # 依 groupby(sort=False) 的順序 (第一次出現的順序) 排列各員工的資料列
+    group_order = pd.Series(pd.factorize(names)[0], index=df.index)
+    df = df.loc[group_order.sort_values(kind='stable').index]
+    group_names = names.loc[df.index]
+    group_sizes = group_names.groupby(group_names, sort=False).size()
+
+    numeric_positions = [(i, get_column_letter(i + 1)) for i, col in enumerate(final_columns) if col in numeric_columns]
+    subtotal_labels = [f"{name}_小計" for name in group_sizes.index]
+
+    # --- 欄寬：標題、資料與小計列的最大顯示寬度 (寫入前先計算，write-only 模式無法事後調整) ---
+    for c_idx, col_name in enumerate(final_columns):
+        col_letter = get_column_letter(c_idx + 1)
+        if col_letter in FIXED_WIDTH_COLUMNS:
+            ws.column_dimensions[col_letter].width = 7
+            continue
+        widths = [display_width(pd.Series([col_name])).max()]
+        if not df.empty:
+            widths.append(display_width(df[col_name]).max())
+        if c_idx == 2 and subtotal_labels:
+            widths.append(display_width(pd.Series(subtotal_labels)).max())
+        ws.column_dimensions[col_letter].width = min(max(max(widths) + 2, 8), 50)
+
+    def _styled(value, fill=None):
+        cell = WriteOnlyCell(ws, value=value)
         cell.font = bold_font
+        if fill is not None:
+            cell.fill = fill
+        return cell
 
+    ws.append([_styled(title, header_fill) for title in final_columns])
+
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
     current_row = 2
-    for name, df_employee in df_all_employees.groupby('名稱', sort=False):
-        for _, row_data in df_employee.iterrows():
-            for c_idx, col_name in enumerate(final_columns, 1):
-                ws.cell(row=current_row, column=c_idx, value=row_data.get(col_name))
-            current_row += 1
-        
-        subtotal_row_idx = current_row
-        ws.cell(row=subtotal_row_idx, column=3, value=f"{name}_小計").font = bold_font
-        for c_idx, col_name in enumerate(final_columns, 1):
-            if col_name in numeric_columns:
-                col_letter = ws.cell(row=1, column=c_idx).column_letter
-                start_range = subtotal_row_idx - len(df_employee)
-                end_range = subtotal_row_idx - 1
-                ws.cell(row=subtotal_row_idx, column=c_idx, value=f"=SUM({col_letter}{start_range}:{col_letter}{end_range})").font = bold_font
-        
-        current_row += 1
+    for name, size in group_sizes.items():
+        for _ in range(size):
+            ws.append(list(next(rows)))
+        subtotal = [None] * len(final_columns)
+        subtotal[2] = _styled(f"{name}_小計")
+        for c_idx, col_letter in numeric_positions:
+            subtotal[c_idx] = _styled(f"=SUM({col_letter}{current_row}:{col_letter}{current_row + size - 1})")
+        ws.append(subtotal)
+        current_row += size + 1
         ws.row_breaks.append(Break(id=current_row - 1))
 
-    column_widths = {}
-    for row in ws.iter_rows(min_row=1, max_row=ws.max_row):
-        for cell in row:
-            if cell.value:
-                length = sum(2 if '\u4e00' <= char <= '\u9fff' else 1 for char in str(cell.value))
-                column_widths[cell.column_letter] = max(column_widths.get(cell.column_letter, 0), length)
-    
-    for col, width in column_widths.items():
-        if col in ['I', 'J', 'K', 'L', 'M', 'N']:
-            ws.column_dimensions[col].width = 7
-        else:
-            ws.column_dimensions[col].width = min(max(width + 2, 8), 50)
-
     wb.save(output)
     output.seek(0)
     return output.getvalue()
 
 
-def get_descriptive_leave_type(row):
-    """根據請假時間判斷假別描述"""
-    leave_type = row['leave_type']
-    start_time = row['start_date'].time()
-    end_time = row['end_date'].time()
-    duration = row['duration']
+def get_attendance_statuses(df: pd.DataFrame) -> pd.Series:
+    """依 缺席 > 請假/出差 > 遲到/早退 > 遲到 > 早退 的優先順序，一次判斷所有紀錄的出席狀態。"""
+    is_late = df['遲到'] > 0
+    is_early = df['早退'] > 0
+    statuses = np.select(
+        [df['缺席'] > 0, df['請假'] > 0, is_late & is_early, is_late, is_early],
+        ['缺席', '請假/出差', '遲到/早退', '遲到', '早退'],
+        default='一般',
+    )
+    return pd.Series(statuses, index=df.index, dtype=object)
 
-    if pd.isna(leave_type):
-        return ''
-    
-    if duration >= 8:
-        return f"全天{leave_type}"
-    if start_time < time(12, 0) and end_time <= time(13, 0):
-        return f"上午{leave_type}"
-    if start_time >= time(12, 0):
-        return f"下午{leave_type}"
-    
-    return leave_type
-
-def get_attendance_status(row):
-    """根據紀錄決定出席狀態的優先級"""
-    if row['缺席'] > 0:
-        return '缺席'
-    if row['請假'] > 0:
-        return '請假/出差'
-    
-    is_late = row['遲到'] > 0
-    is_early = row['早退'] > 0
-    
-    if is_late and is_early:
-        return '遲到/早退'
-    if is_late:
-        return '遲到'
-    if is_early:
-        return '早退'
-        
-    return '一般'
+ATTENDANCE_REPORT_COLUMNS = ['星期', '人員 ID', '名稱', '日期', '出席狀態', '請假類型', '簽到', '簽退',
+                             '遲到', '早退', '缺席', '加班 1', '加班23', '請假']
+ATTENDANCE_REPORT_NUMERIC_COLUMNS = ['遲到', '早退', '缺席', '加班 1', '加班23', '請假']
+SPLIT_OPTIONS = {'dept': '部門', 'company': '加保公司'}
+UNGROUPED_LABEL = '未分類'
 
 
-def generate_attendance_excel(conn, year, month):
-    """從資料庫獲取資料並產生 Excel 報表。"""
+def build_attendance_report_frame(conn, year, month) -> pd.DataFrame:
+    """從資料庫獲取指定月份的出勤與請假資料，整理成出勤日報表所需的 DataFrame。"""
     
     df_att_raw = q_att.get_attendance_by_month(conn, year, month)
     if df_att_raw.empty:
@@ -167,31 +179,94 @@ def generate_attendance_excel(conn, year, month):
     df['星期'] = df['日期_dt'].dt.weekday.map(weekday_map)
     
     if not df_leave_raw.empty:
-        daily_leaves = []
-        for _, leave in df_leave_raw.iterrows():
-            d = leave['start_date'].date()
-            while d <= leave['end_date'].date():
-                daily_leaves.append({
-                    'employee_id': leave['employee_id'],
-                    'date_str': d.strftime('%Y-%m-%d'),
-                    'leave_type': get_descriptive_leave_type(leave)
-                })
-                d += pd.Timedelta(days=1)
-        df_daily_leaves = pd.DataFrame(daily_leaves).rename(columns={'date_str': '日期'})
+        df_leave_raw['leave_type'] = logic_leave.describe_leave_types(df_leave_raw)
+        df_daily_leaves = logic_leave.expand_leave_days(df_leave_raw, columns=['employee_id', 'leave_type'])
+        df_daily_leaves = df_daily_leaves[['employee_id', 'date', 'leave_type']].rename(columns={'date': '日期'})
         
         df = pd.merge(df, df_daily_leaves, on=['employee_id', '日期'], how='left')
         df['請假類型'] = df['leave_type'].fillna('')
     else:
         df['請假類型'] = ''
         
-    df['出席狀態'] = df.apply(get_attendance_status, axis=1)
-    
-    df = df.sort_values(by=['人員 ID', '日期_dt'])
-    
-    final_columns = ['星期', '人員 ID', '名稱', '日期', '出席狀態', '請假類型', '簽到', '簽退',
-                     '遲到', '早退', '缺席', '加班 1', '加班23', '請假']
-    numeric_columns = ['遲到', '早退', '缺席', '加班 1', '加班23', '請假']
+    df['出席狀態'] = get_attendance_statuses(df)
     
-    excel_file = dataframe_to_report_excel(df, final_columns, numeric_columns)
-    
-    return excel_file
\ No newline at end of file
+    return df.sort_values(by=['人員 ID', '日期_dt'])
+
+
+def generate_attendance_excel(conn, year, month):
+    """從資料庫獲取資料並產生 Excel 報表。"""
+    df = build_attendance_report_frame(conn, year, month)
+    return dataframe_to_report_excel(df, ATTENDANCE_REPORT_COLUMNS, ATTENDANCE_REPORT_NUMERIC_COLUMNS)
+
+
+def attendance_report_file_name(year: int, month: int, group: str = None) -> str:
+    """出勤日報表檔名 (民國年)，分組匯出時放在以組別命名的資料夾中。"""
+    name = f"出勤日報表_民國{year - 1911}年{month:02d}月"
+    if group is None:
+        return f"{name}.xlsx"
+    safe_group = re.sub(r'[\\/:*?"<>|]', '_', str(group))
+    return f"{safe_group}/{name}_{safe_group}.xlsx"
+
+
+def _render_attendance_workbook(df: pd.DataFrame) -> bytes:
+    """(於子行程中執行) 將整理好的月報資料轉為 Excel。"""
+    return dataframe_to_report_excel(df, ATTENDANCE_REPORT_COLUMNS, ATTENDANCE_REPORT_NUMERIC_COLUMNS)
+
+
+def _collect_report_tasks(conn, months, split_by):
+    """讀取各月份資料並依部門或加保公司分組，回傳 ([(檔名, DataFrame)], 無資料的月份)。"""
+    tasks, skipped = [], []
+    for year, month in months:
+        try:
+            df = build_attendance_report_frame(conn, year, month)
+        except ValueError:
+            skipped.append((year, month))
+            continue
+        if split_by is None:
+            tasks.append((attendance_report_file_name(year, month), df))
+            continue
+        groups = q_report.get_employee_groups_for_month(conn, year, month).set_index('employee_id')[split_by]
+        group_labels = df['employee_id'].map(groups).fillna(UNGROUPED_LABEL).replace('', UNGROUPED_LABEL)
+        for group, df_group in df.groupby(group_labels, sort=True):
+            tasks.append((attendance_report_file_name(year, month, group), df_group))
+    return tasks, skipped
+
+
+def generate_attendance_reports_zip(conn, months, split_by: str = None, progress_callback=None, max_workers: int = None):
+    """
+    批次產生多個月份 (可依部門 'dept' 或加保公司 'company' 分檔) 的出勤日報表，打包成單一 ZIP。
+    資料在主行程讀取後交由行程池平行產生 Excel，完成一份就寫入 ZIP 一份。
+    progress_callback(已完成數, 總數, 檔名) 會在每份報表完成後被呼叫。
+    回傳 (ZIP 內容 bytes, 報表檔名清單, 無出勤資料而略過的 (年, 月) 清單)。
+    """
+    if split_by is not None and split_by not in SPLIT_OPTIONS:
+        raise ValueError(f"不支援的分檔方式: {split_by}")
+    tasks, skipped = _collect_report_tasks(conn, months, split_by)
+    if not tasks:
+        raise ValueError("所選月份皆沒有任何出勤紀錄可供匯出。")
+
+    output = io.BytesIO()
+    file_names = []
+    # xlsx 本身已是壓縮格式，ZIP 內不再重複壓縮
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as zf:
+        def _write(name, data):
+            zf.writestr(name, data)
+            file_names.append(name)
+            if progress_callback:
+                progress_callback(len(file_names), len(tasks), name)
+
+        workers = min(len(tasks), max_workers or os.cpu_count() or 1)
+        if workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = {executor.submit(_render_attendance_workbook, df): name for name, df in tasks}
+                    for future in as_completed(futures):
+                        _write(futures[future], future.result())
+            except (BrokenProcessPool, OSError):
+                # 無法使用子行程時改為依序產生 (已完成的檔案不重複產生)
+                pass
+        for name, df in tasks:
+            if name not in file_names:
+                _write(name, _render_attendance_workbook(df))
+
+    return output.getvalue(), sorted(file_names), skipped
\ No newline at end of file
@@ -8,6 +8,8 @@ from db import queries_salary_base as q_base
 from db import queries_config as q_config
 from db import queries_insurance as q_ins
 from db import queries_employee as q_emp
+from db import queries_archive as q_archive
+from db.db_manager import memory_snapshot
 
 def generate_annual_salary_summary(conn, year: int, item_ids: list):
     """產生年度薪資總表的核心邏輯。"""
@@ -39,7 +41,11 @@ def generate_annual_salary_summary(conn, year: int, item_ids: list):
     return final_df
 
 def generate_nhi_employer_summary(conn, year: int):
-    """計算公司應負擔的二代健保補充保費。"""
+    """計算公司應負擔的二代健保補充保費 (於該年度的記憶體快照上計算)。"""
+    with memory_snapshot(conn, year=year) as snapshot_conn:
+        return _generate_nhi_employer_summary(snapshot_conn, year)
+
+def _generate_nhi_employer_summary(conn, year: int):
     db_configs = q_config.get_all_configs(conn)
     NHI_SUPPLEMENT_RATE = float(db_configs.get('NHI_SUPPLEMENT_RATE', '0.0211'))
     results = []
@@ -85,14 +91,15 @@ def get_salary_preview_data(conn, year: int, month: int):
     """為薪資基礎審核頁面準備資料。(V2: 使用獨立查詢，與總表脫鉤)"""
     
     # 1. 直接查詢當月的薪資主表和明細表
-    query = """
+    detail_src = q_archive.archived_source(conn, 'salary_detail', [year])
+    query = f"""
     SELECT 
         s.employee_id,
         e.name_ch as '員工姓名',
         si.name as item_name,
         sd.amount,
         s.employer_pension_contribution as '勞退提撥'
-    FROM salary_detail sd
+    FROM {detail_src} sd
     JOIN salary s ON sd.salary_id = s.id
     JOIN salary_item si ON sd.salary_item_id = si.id
     JOIN employee e ON s.employee_id = e.id
@@ -132,7 +139,8 @@ def calculate_nhi_personal_bonus_for_period(conn, year: int, start_month: int, e
     NHI_BONUS_MULTIPLIER = int(float(db_configs.get('NHI_BONUS_MULTIPLIER', '4')))
     NHI_BONUS_ITEMS = [item.strip() for item in db_configs.get('NHI_BONUS_ITEMS', '').split(',')]
 
-    salary_details_query = "SELECT s.employee_id, e.name_ch, si.name as item_name, sd.amount FROM salary_detail sd JOIN salary s ON sd.salary_id = s.id JOIN salary_item si ON sd.salary_item_id = si.id JOIN employee e ON s.employee_id = e.id WHERE s.year = ? AND s.status = 'final' AND s.month BETWEEN ? AND ?"
+    detail_src = q_archive.archived_source(conn, 'salary_detail', [year])
+    salary_details_query = f"SELECT s.employee_id, e.name_ch, si.name as item_name, sd.amount FROM {detail_src} sd JOIN salary s ON sd.salary_id = s.id JOIN salary_item si ON sd.salary_item_id = si.id JOIN employee e ON s.employee_id = e.id WHERE s.year = ? AND s.status = 'final' AND s.month BETWEEN ? AND ?"
     df_details = pd.read_sql_query(salary_details_query, conn, params=(year, start_month, end_month))
     if df_details.empty: return pd.DataFrame()
 
@@ -149,10 +157,13 @@ def calculate_nhi_personal_bonus_for_period(conn, year: int, start_month: int, e
     return result_df[result_df['應繳補充保費'] > 0].sort_values(by='應繳補充保費', ascending=False)
 
 def generate_nhi_accountant_summary(conn, year: int, item_ids: list):
-    """為會計事務所產生年度二代健保計算用的獎金總表 (基於原始版本修改)。"""
+    """為會計事務所產生年度二代健保計算用的獎金總表 (於該年度的記憶體快照上計算)。"""
     if not item_ids:
         return pd.DataFrame()
+    with memory_snapshot(conn, year=year) as snapshot_conn:
+        return _generate_nhi_accountant_summary(snapshot_conn, year, item_ids)
 
+def _generate_nhi_accountant_summary(conn, year: int, item_ids: list):
     # 1. 查詢薪資資料，確保包含 employee_id, 員工編號, 員工姓名, 身分證字號
     #    假設 q_read.get_annual_salary_summary_data 已按要求修改
     df_raw = q_read.get_annual_salary_summary_data(conn, year, item_ids, include_id_no=True)
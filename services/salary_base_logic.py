@@ -3,6 +3,7 @@ import pandas as pd
 import re
 from db import queries_salary_base as q_base
 from db import queries_insurance as q_ins
+from db import queries_employee as q_emp
 
 def batch_import_salary_base(conn, uploaded_file):
     """
@@ -39,9 +40,7 @@ def batch_import_salary_base(conn, uploaded_file):
 
         df.rename(columns=column_rename_map, inplace=True)
 
-        emp_df_db = pd.read_sql("SELECT name_ch, id FROM employee", conn)
-        emp_df_db['clean_name'] = emp_df_db['name_ch'].astype(str).str.replace(r'\s+', '', regex=True)
-        emp_map = emp_df_db.set_index('clean_name')['id'].to_dict()
+        emp_map = q_emp.get_employee_map(conn).set_index('clean_name')['employee_id'].to_dict()
 
         errors = []
         valid_rows = []
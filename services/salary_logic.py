@@ -1,7 +1,6 @@
 # services/salary_logic.py
 import pandas as pd
 from datetime import datetime, date
-from dateutil.relativedelta import relativedelta
 import os
 import math
 
@@ -16,8 +15,9 @@ from db import queries_performance_bonus as q_perf
 from db import queries_loan as q_loan
 from db import queries_allowances as q_allow
 from db import queries_config as q_config
+from db import queries_salary_items as q_items
 from services import overtime_logic
-from views.annual_leave import calculate_leave_entitlement
+from services import annual_leave_logic
 
 def calculate_single_employee_insurance(conn, insurance_salary, dependents_under_18, dependents_over_18, nhi_status, nhi_status_expiry, year, month):
     # 此函式維持不變
@@ -64,7 +64,8 @@ def calculate_salary_df(conn, year, month):
     if not employees: return pd.DataFrame(), {}
     
     monthly_attendance = q_att.get_monthly_attendance_summary(conn, year, month)
-    item_types = pd.read_sql("SELECT name, type FROM salary_item", conn).set_index('name')['type'].to_dict()
+    item_types = q_items.get_item_types(conn)
+    unused_annual_leave = annual_leave_logic.get_unused_leave_settlements(conn, year, month)
     
     all_salary_data = []
 
@@ -99,19 +100,11 @@ def calculate_salary_df(conn, year, month):
             details[item['name']] = -abs(item['amount']) if item['type'] == 'deduction' else abs(item['amount'])
 
         # 2. 其他計算項目
-        if emp['dept'] in ['服務', '行政']:
-            entry_date_str = emp['entry_date']
-            if pd.notna(entry_date_str):
-                entry_date = pd.to_datetime(entry_date_str).date()
-                if entry_date.month == month:
-                    last_anniversary_year_start = date(year - 1, entry_date.month, entry_date.day)
-                    last_anniversary_year_end = last_anniversary_year_start + relativedelta(years=1) - relativedelta(days=1)
-                    service_years = (last_anniversary_year_start - entry_date).days / 365.25
-                    total_entitled_days = calculate_leave_entitlement(service_years)
-                    used_hours = q_att.get_leave_hours_for_period(conn, emp_id, '特休', last_anniversary_year_start, last_anniversary_year_end)
-                    unused_days = total_entitled_days - (used_hours / 8)
-                    if unused_days > 0:
-                        details['特休未休'] = int(round(unused_days * (base_salary / 30)))
+        # 特休週期於本月屆滿 (週年日在本月) 的未休天數，由特休台帳讀取
+        if emp['dept'] in annual_leave_logic.ANNUAL_LEAVE_DEPTS:
+            unused_days = unused_annual_leave.get(emp_id, 0)
+            if unused_days > 0:
+                details['特休未休'] = int(round(unused_days * (base_salary / 30)))
 
         if emp_id in monthly_attendance.index:
             emp_att = monthly_attendance.loc[emp_id]
@@ -259,8 +252,8 @@ def process_batch_salary_update_excel(conn, year: int, month: int, uploaded_file
     try:
         df = pd.read_excel(uploaded_file)
         if '員工姓名' not in df.columns: raise ValueError("Excel 檔案中缺少 '員工姓名' 欄位。")
-        emp_map = pd.read_sql("SELECT id, name_ch FROM employee", conn).set_index('name_ch')['id'].to_dict()
-        item_map_df = pd.read_sql("SELECT id, name, type FROM salary_item", conn)
+        emp_map = q_emp.get_employee_id_map(conn)
+        item_map_df = q_items.get_all_salary_items(conn)
         item_map = {row['name']: {'id': row['id'], 'type': row['type']} for _, row in item_map_df.iterrows()}
         salary_main_df = pd.read_sql("SELECT id, employee_id FROM salary WHERE year = ? AND month = ?", conn, params=(year, month))
         salary_id_map = salary_main_df.set_index('employee_id')['id'].to_dict()
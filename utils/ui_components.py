@@ -2,9 +2,12 @@
 import streamlit as st
 import pandas as pd
 import io
+from pathlib import Path
 
 # 修正 import 路徑
 from db import queries_employee as q_emp
+from db import queries_import_archive as q_import
+from services import import_archive_logic as import_archive
 
 def employee_selector(conn, key_prefix="", pre_selected_ids=None):
     """
@@ -91,12 +94,39 @@ def create_batch_import_section(info_text: str, template_columns: dict, template
     st.markdown("---")
     
     uploaded_file = st.file_uploader("上傳填寫好的 Excel 檔案", type=['xlsx'], key=f"uploader_{template_file_name}")
+    # 批次匯入的檔案同樣保存到匯入封存，依範本區分匯入類型
+    import_type = f"batch:{Path(template_file_name).stem}"
+    from_archive = False
+
+    with st.expander("從匯入封存重新套用 (不需原始檔)"):
+        archive_df = q_import.get_import_archive(conn, import_type)
+        if archive_df.empty:
+            st.caption("目前沒有已封存的檔案。")
+        else:
+            archive_options = {f"{row.imported_at} - {row.file_name}": row.id for row in archive_df.itertuples()}
+            selected_archive = st.selectbox("選擇先前匯入的檔案", options=archive_options.keys(), index=None,
+                                            key=f"archive_select_{template_file_name}")
+            if selected_archive:
+                uploaded_file = import_archive.open_archived_upload(conn, archive_options[selected_archive])
+                from_archive = True
 
     if uploaded_file:
-        if st.button("開始匯入", type="primary", key=f"import_btn_{template_file_name}"):
+        # 以內容雜湊值偵測重複上傳，在匯入前就提示 (從封存重新套用時不需提示)
+        proceed = True
+        if from_archive:
+            content_hash = import_archive.compute_content_hash(uploaded_file)
+        else:
+            content_hash, previous = import_archive.find_previous_import(conn, uploaded_file, import_type)
+            if previous:
+                st.warning(import_archive.describe_import(previous))
+                proceed = st.checkbox("仍要重新匯入此檔案", key=f"reimport_{template_file_name}")
+
+        if st.button("開始匯入", type="primary", key=f"import_btn_{template_file_name}", disabled=not proceed):
             with st.spinner("正在處理上傳的檔案..."):
                 try:
+                    watermark = import_archive.begin_import(conn)
                     report = import_logic_func(conn, uploaded_file)
+                    import_archive.record_import(conn, uploaded_file, import_type, watermark, report, content_hash)
                     st.session_state[session_key] = report
                     st.rerun()
 
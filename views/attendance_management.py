@@ -9,13 +9,15 @@ from dateutil.relativedelta import relativedelta
 from db import queries_attendance as q_att
 from db import queries_employee as q_emp
 from db import queries_common as q_common
+from db import queries_import_archive as q_import
 from services import attendance_logic as logic_att
+from services import import_archive_logic as import_archive
 
 def show_page(conn):
     st.header("📅 出勤紀錄管理")
     st.info("您可以在此查詢、批次匯入、或手動修改單筆出勤紀錄。")
 
-    tab1, tab2 = st.tabs(["查詢與手動管理", "從檔案批次匯入"])
+    tab1, tab2, tab3 = st.tabs(["查詢與手動管理", "從檔案批次匯入", "多分點檔案合併匯入"])
 
     with tab1:
         st.subheader("查詢與手動編輯紀錄")
@@ -54,13 +56,24 @@ def show_page(conn):
                             new_checkout = c2_edit.time_input("新的簽退時間", value=current_checkout, step=60)
                             if st.form_submit_button("確認修改並重新計算時數", type="primary"):
                                 with st.spinner("正在重新計算並儲存..."):
-                                    new_minutes = logic_att.recalculate_attendance_minutes(new_checkin, new_checkout)
+                                    emp_info = q_common.get_by_id(conn, 'employee', record_data['employee_id']) or {}
+                                    new_minutes = logic_att.recalculate_attendance_minutes(
+                                        new_checkin, new_checkout, dept=emp_info.get('dept'),
+                                        schedules=logic_att.get_shift_schedules(conn))
                                     q_att.update_attendance_record(conn, record_id, new_checkin, new_checkout, new_minutes)
                                     st.success(f"紀錄 ID:{record_id} 已更新！")
                                     st.rerun()
                 else:
                     st.info("目前沒有可供修改的紀錄。")
 
+            with st.expander("依班表重新計算本月時數 (適用於調整部門班表後)"):
+                st.caption("依「系統參數設定」中的部門班表，重新計算本月所有紀錄的遲到、早退與加班分鐘數；簽到退時間不會變更。")
+                if st.button(f"重新計算 {year} 年 {month} 月", key="rederive_attendance"):
+                    with st.spinner("正在重新計算..."):
+                        updated = logic_att.rederive_attendance_minutes(conn, year, month)
+                    st.success(f"重新計算完成，共更新 {updated} 筆紀錄。")
+                    st.rerun()
+
             st.markdown("---")
             st.subheader("批次修改出勤紀錄 (Excel)")
             st.info("此功能允許您下載特定員工的出勤紀錄範本，在 Excel 中修改後再上傳，系統會自動更新變更的紀錄。")
@@ -135,38 +148,132 @@ def show_page(conn):
         st.subheader("從打卡機檔案批次匯入")
         st.info("系統將使用「姓名」作為唯一匹配依據，並自動忽略姓名中的所有空格。請確保打卡檔姓名與員工資料庫中的姓名一致。")
         uploaded_file = st.file_uploader("上傳打卡機檔案 (通常為 .xls 格式)", type=['xls', 'xlsx'])
+        from_archive = False
+
+        with st.expander("從匯入封存重新套用 (不需原始檔)"):
+            archive_df = q_import.get_import_archive(conn, 'attendance')
+            if archive_df.empty:
+                st.caption("目前沒有已封存的打卡機檔案。")
+            else:
+                archive_options = {f"{row.imported_at} - {row.file_name}": row.id for row in archive_df.itertuples()}
+                selected_archive = st.selectbox("選擇先前匯入的檔案", options=archive_options.keys(), index=None, key="att_archive_select")
+                if selected_archive:
+                    uploaded_file = import_archive.open_archived_upload(conn, archive_options[selected_archive])
+                    from_archive = True
+
         if uploaded_file:
-            st.markdown("---")
-            st.markdown("#### 步驟 1: 檔案解析與預覽")
-            with st.spinner("正在解析您上傳的檔案..."):
-                df, message = logic_att.read_attendance_file(uploaded_file)
-            if df is None:
-                st.error(f"檔案解析失敗：{message}")
+            # 以內容雜湊值偵測重複上傳，在解析前就提示 (從封存重新套用時不需提示)
+            if from_archive:
+                content_hash, previous = import_archive.compute_content_hash(uploaded_file), None
             else:
-                st.success(f"{message}，共讀取到 {len(df)} 筆原始紀錄。")
-                st.dataframe(df.head())
+                content_hash, previous = import_archive.find_previous_import(conn, uploaded_file, 'attendance')
+            proceed = True
+            if previous:
+                st.warning(import_archive.describe_import(previous))
+                proceed = st.checkbox("仍要重新解析並匯入此檔案", key="att_reimport")
+            if proceed:
+                _import_attendance_file(conn, uploaded_file, content_hash)
+
+
+    with tab3:
+        st.subheader("一次匯入多個分點的打卡機檔案")
+        st.info("可同時選取多個分點的打卡機匯出檔，系統會平行解析、合併後依「員工 + 日期」去除重複 (以較後面的檔案為準)，再一次寫入資料庫。")
+        uploaded_files = st.file_uploader("上傳打卡機檔案 (可多選)", type=['xls', 'xlsx'], accept_multiple_files=True, key="att_multi_uploader")
+        if uploaded_files:
+            # 與單檔匯入相同，以內容雜湊值偵測重複上傳的檔案
+            content_hashes = {}
+            duplicates = []
+            for file in uploaded_files:
+                content_hash, previous = import_archive.find_previous_import(conn, file, 'attendance')
+                content_hashes[id(file)] = content_hash
+                if previous:
+                    duplicates.append(id(file))
+                    st.warning(f"{getattr(file, 'name', '')}：{import_archive.describe_import(previous)}")
+            if duplicates and not st.checkbox("仍要重新解析並匯入已匯入過的檔案", key="att_multi_reimport"):
+                uploaded_files = [f for f in uploaded_files if id(f) not in duplicates]
+        if uploaded_files:
+            with st.spinner(f"正在平行解析 {len(uploaded_files)} 個檔案..."):
+                combined_df, file_reports = logic_att.read_attendance_files(uploaded_files)
+            report_df = pd.DataFrame(file_reports).set_index('index').rename(
+                columns={'file': '檔名', 'ok': '解析成功', 'rows': '筆數', 'message': '訊息'})
+
+            if combined_df.empty:
+                st.dataframe(report_df, width='stretch', hide_index=True)
+                st.error("沒有任何檔案解析出有效的出勤紀錄。")
+            else:
+                try:
+                    df_matched = logic_att.match_employees_by_name(conn, combined_df)
+                    df_final, dropped = logic_att.deduplicate_attendance(df_matched)
+                    # 以上傳順序 (source_index) 統計，同名的檔案也各自計算
+                    matched = df_matched.groupby('source_index')['employee_id'].apply(lambda s: int(s.notna().sum()))
+                    report_df['匹配成功'] = report_df.index.map(matched).fillna(0).astype(int)
+                    report_df['重複略過'] = report_df.index.map(dropped).fillna(0).astype(int)
+                    st.dataframe(report_df, width='stretch', hide_index=True)
+
+                    unmatched = df_final[df_final['employee_id'].isnull()]
+                    if not unmatched.empty:
+                        st.error(f"以下 {len(unmatched)} 筆紀錄因姓名無法匹配，將不會被匯入：")
+                        st.dataframe(unmatched[['source_name', 'hr_code', 'name_ch', 'date']])
+
+                    matched_count = int(df_final['employee_id'].notna().sum())
+                    if st.button(f"確認匯入 {matched_count} 筆紀錄", type="primary", disabled=(matched_count == 0), key="att_multi_import"):
+                        with st.spinner("正在寫入資料庫..."):
+                            # 依上傳順序逐檔寫入 (去重後較後面的檔案為準，結果與合併寫入相同)，
+                            # 讓每個檔案的匯入封存各自記錄自己的筆數與異動範圍
+                            totals = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+                            for index, file in enumerate(uploaded_files):
+                                file_rows = df_final[df_final['source_index'] == index]
+                                watermark = import_archive.begin_import(conn)
+                                report = q_att.batch_insert_or_update_attendance(conn, file_rows)
+                                import_archive.record_import(conn, file, 'attendance', watermark, report, content_hashes[id(file)])
+                                for key in totals:
+                                    totals[key] += report[key]
+                        st.success(f"處理完成！新增 {totals['inserted']} 筆、更新 {totals['updated']} 筆，"
+                                   f"{totals['unchanged']} 筆與資料庫相同已略過。")
+                except Exception as e:
+                    st.error(f"匹配或匯入過程中發生嚴重錯誤：{e}")
+                    st.code(traceback.format_exc())
+
+
+def _import_attendance_file(conn, uploaded_file, content_hash):
+    """解析、匹配並匯入一個打卡機檔案，匯入後記錄到匯入封存。"""
+    st.markdown("---")
+    st.markdown("#### 步驟 1: 檔案解析與預覽")
+    with st.spinner("正在解析您上傳的檔案..."):
+        df, message = logic_att.read_attendance_file(uploaded_file)
+    if df is None:
+        st.error(f"檔案解析失敗：{message}")
+    else:
+        st.success(f"{message}，共讀取到 {len(df)} 筆原始紀錄。")
+        st.dataframe(df.head())
+        st.markdown("---")
+        st.markdown("#### 步驟 2: 員工姓名匹配")
+        with st.spinner("正在與資料庫員工進行姓名匹配..."):
+            try:
+                df_matched = logic_att.match_employees_by_name(conn, df)
+                matched_count = df_matched['employee_id'].notnull().sum()
+                unmatched_count = df_matched['employee_id'].isnull().sum()
+                st.info(f"匹配結果：成功 **{matched_count}** 筆 / 失敗 **{unmatched_count}** 筆。")
+                if unmatched_count > 0:
+                    st.error(f"以下 {unmatched_count} 筆紀錄因姓名無法匹配，將不會被匯入：")
+                    st.dataframe(df_matched[df_matched['employee_id'].isnull()][['hr_code', 'name_ch', 'date']])
                 st.markdown("---")
-                st.markdown("#### 步驟 2: 員工姓名匹配")
-                with st.spinner("正在與資料庫員工進行姓名匹配..."):
-                    try:
-                        df_matched = logic_att.match_employees_by_name(conn, df)
-                        matched_count = df_matched['employee_id'].notnull().sum()
-                        unmatched_count = df_matched['employee_id'].isnull().sum()
-                        st.info(f"匹配結果：成功 **{matched_count}** 筆 / 失敗 **{unmatched_count}** 筆。")
-                        if unmatched_count > 0:
-                            st.error(f"以下 {unmatched_count} 筆紀錄因姓名無法匹配，將不會被匯入：")
-                            st.dataframe(df_matched[df_matched['employee_id'].isnull()][['hr_code', 'name_ch', 'date']])
-                        st.markdown("---")
-                        st.markdown("#### 步驟 3: 確認並匯入資料庫")
-                        st.warning("匯入操作將會新增紀錄，如果員工在同一天的紀錄已存在，則會以檔案中的新資料覆蓋。")
-                        if st.button("確認匯入", type="primary", disabled=(matched_count == 0)):
-                            with st.spinner("正在寫入資料庫..."):
-                                affected_rows = q_att.batch_insert_or_update_attendance(conn, df_matched)
-                            st.success(f"處理完成！共新增/更新了 {affected_rows} 筆出勤紀錄！")
-                            st.info("您可以切換回「查詢與手動管理」頁籤查看最新結果。")
-                    except Exception as e:
-                        st.error(f"匹配或匯入過程中發生嚴重錯誤：{e}")
-                        st.code(traceback.format_exc())
+                st.markdown("#### 步驟 3: 確認並匯入資料庫")
+                st.warning("匯入操作將會新增紀錄，如果員工在同一天的紀錄已存在，則會以檔案中的新資料覆蓋。")
+                if st.button("確認匯入", type="primary", disabled=(matched_count == 0)):
+                    with st.spinner("正在寫入資料庫..."):
+                        watermark = import_archive.begin_import(conn)
+                        report = q_att.batch_insert_or_update_attendance(conn, df_matched)
+                        import_archive.record_import(conn, uploaded_file, 'attendance', watermark, report, content_hash)
+                    st.success(f"處理完成！新增 {report['inserted']} 筆、更新 {report['updated']} 筆，"
+                               f"{report['unchanged']} 筆與資料庫相同已略過。")
+                    field_changes = {k: v for k, v in report['field_changes'].items() if v}
+                    if field_changes:
+                        st.dataframe(pd.DataFrame({'欄位': list(field_changes.keys()), '變動筆數': list(field_changes.values())}), hide_index=True)
+                    st.info("您可以切換回「查詢與手動管理」頁籤查看最新結果。")
+            except Exception as e:
+                st.error(f"匹配或匯入過程中發生嚴重錯誤：{e}")
+                st.code(traceback.format_exc())
 
 
 def display_bulk_edit_interface(conn, emp_id_list, year, month, file_name_prefix):
@@ -227,42 +334,32 @@ def display_bulk_edit_interface(conn, emp_id_list, year, month, file_name_prefix
                         # 將編輯後的資料與原始資料合併，以便逐行比對
                         merged_df = pd.merge(original_df, edited_df, on='id', suffixes=('_orig', '_new'))
 
-                        updates_count = 0
-                        for _, row in merged_df.iterrows():
-                            
-                            # 預設使用原始資料庫中的時間
-                            final_checkin_str = row.get('checkin_time_orig')
-                            final_checkout_str = row.get('checkout_time_orig')
-
-                            # 檢查 Excel 中的簽到時間是否為有效值
-                            new_checkin_val = row.get('checkin_time_new')
-                            if pd.notna(new_checkin_val) and str(new_checkin_val).strip() not in ['-', '']:
-                                final_checkin_str = str(new_checkin_val)
-                            
-                            # 檢查 Excel 中的簽退時間是否為有效值
-                            new_checkout_val = row.get('checkout_time_new')
-                            if pd.notna(new_checkout_val) and str(new_checkout_val).strip() not in ['-', '']:
-                                final_checkout_str = str(new_checkout_val)
-
-                            # 只有在時間實際發生變更時才更新
-                            if final_checkin_str != row.get('checkin_time_orig') or final_checkout_str != row.get('checkout_time_orig'):
-                                
-                                # 將最終確認的時間字串轉換為 time 物件
-                                try:
-                                    final_checkin_time = datetime.strptime(final_checkin_str, '%H:%M:%S').time() if final_checkin_str else time(0, 0)
-                                except (TypeError, ValueError):
-                                    final_checkin_time = time(0, 0)
-
-                                try:
-                                    final_checkout_time = datetime.strptime(final_checkout_str, '%H:%M:%S').time() if final_checkout_str else time(0, 0)
-                                except (TypeError, ValueError):
-                                    final_checkout_time = time(0, 0)
-
-                                # 重新計算分鐘數並更新資料庫
-                                new_minutes = logic_att.recalculate_attendance_minutes(final_checkin_time, final_checkout_time)
-                                q_att.update_attendance_record(conn, row['id'], final_checkin_time, final_checkout_time, new_minutes)
-                                updates_count += 1
+                        # 預設使用原始資料庫中的時間，Excel 中為有效值 (非空白或 '-') 時才採用新值
+                        final_df = merged_df[['id', 'employee_id']].copy()
+                        for col in ['checkin_time', 'checkout_time']:
+                            new_vals = merged_df[f'{col}_new'].astype('string').str.strip()
+                            has_new = new_vals.notna() & ~new_vals.isin(['-', ''])
+                            final_df[col] = merged_df[f'{col}_orig'].where(~has_new, new_vals)
 
+                        # 只有在時間實際發生變更時才更新 (兩邊皆為空值視為未變更)
+                        changed = pd.Series(False, index=final_df.index)
+                        for col in ['checkin_time', 'checkout_time']:
+                            final_vals = final_df[col].astype('string')
+                            orig_vals = merged_df[f'{col}_orig'].astype('string')
+                            changed |= ((final_vals != orig_vals) & ~(final_vals.isna() & orig_vals.isna())).fillna(True)
+                        final_df = final_df[changed].copy()
+
+                        updates_count = 0
+                        if not final_df.empty:
+                            # 無法解析的時間視為 00:00:00，並統一格式為 HH:MM:SS
+                            for col in ['checkin_time', 'checkout_time']:
+                                seconds = logic_att.time_strings_to_seconds(final_df[col])
+                                seconds = pd.Series(seconds, index=final_df.index).fillna(0).astype(int)
+                                final_df[col] = (pd.to_datetime(seconds, unit='s')).dt.strftime('%H:%M:%S')
+                            dept_map = q_emp.get_all_employees(conn).set_index('id')['dept']
+                            final_df['dept'] = final_df['employee_id'].map(dept_map)
+                            logic_att.recalculate_attendance_frame(final_df, schedules=logic_att.get_shift_schedules(conn))
+                            updates_count = q_att.batch_update_attendance_minutes(conn, final_df, note='手動修改')
 
                         if updates_count > 0:
                             st.success(f"成功更新了 {updates_count} 筆紀錄！")
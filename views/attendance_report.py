@@ -35,4 +35,47 @@ def show_page(conn):
             except ValueError as ve:
                 st.warning(str(ve))
             except Exception as e:
-                st.error(f"產生報表時發生錯誤: {e}")
\ No newline at end of file
+                st.error(f"產生報表時發生錯誤: {e}")
+    st.markdown("---")
+    st.subheader("批次匯出多個月份")
+    st.info("一次產生一段期間內每個月的出勤日報表 (可依部門或加保公司分檔)，打包成單一 ZIP 檔下載，適用於稽核調閱整年度資料。")
+
+    b1, b2, b3, b4 = st.columns(4)
+    start_year = b1.number_input("起始年份", min_value=2020, max_value=today.year + 5, value=last_month.year, key="batch_start_year")
+    start_month = b2.number_input("起始月份", min_value=1, max_value=12, value=1, key="batch_start_month")
+    end_year = b3.number_input("結束年份", min_value=2020, max_value=today.year + 5, value=last_month.year, key="batch_end_year")
+    end_month = b4.number_input("結束月份", min_value=1, max_value=12, value=last_month.month, key="batch_end_month")
+    split_label = st.radio("分檔方式", ["不分檔", "依部門", "依加保公司"], horizontal=True, key="batch_split")
+    split_by = {"不分檔": None, "依部門": "dept", "依加保公司": "company"}[split_label]
+
+    if st.button("📦 產生 ZIP 報表包", key="batch_report_button"):
+        months = []
+        current = datetime(start_year, start_month, 1)
+        while current <= datetime(end_year, end_month, 1):
+            months.append((current.year, current.month))
+            current += relativedelta(months=1)
+        if not months:
+            st.warning("結束月份不可早於起始月份。")
+        else:
+            progress_bar = st.progress(0, text="正在讀取資料...")
+
+            def _on_progress(done, total, name):
+                progress_bar.progress(done / total, text=f"已完成 {done}/{total}：{name}")
+
+            try:
+                zip_data, file_names, skipped = logic_report.generate_attendance_reports_zip(
+                    conn, months, split_by=split_by, progress_callback=_on_progress
+                )
+                progress_bar.progress(1.0, text=f"完成，共 {len(file_names)} 份報表")
+                if skipped:
+                    st.caption("以下月份沒有出勤紀錄，已略過：" + "、".join(f"{y}/{m:02d}" for y, m in skipped))
+                st.download_button(
+                    label="✅ 點此下載 ZIP",
+                    data=zip_data,
+                    file_name=f"出勤日報表_{start_year}{start_month:02d}-{end_year}{end_month:02d}.zip",
+                    mime="application/zip"
+                )
+            except ValueError as ve:
+                st.warning(str(ve))
+            except Exception as e:
+                st.error(f"產生報表時發生錯誤: {e}")
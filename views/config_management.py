@@ -3,6 +3,10 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from db import queries_config as q_config
+from db import queries_archive as q_archive
+from services import backup_logic
+from services import maintenance_logic
+from db import queries_maintenance as q_maint
 
 # 預設值，當資料庫中找不到設定時使用
 DEFAULT_CONFIGS = {
@@ -15,12 +19,19 @@ DEFAULT_CONFIGS = {
     'NHI_BONUS_ITEMS': {'value': "津貼,津貼加班,特休未休,主管津貼,仲介師,加薪,補助,業務獎金,績效獎金", 'desc': '二代健保累計獎金項目 (用逗號分隔)', 'type': 'text_area'},
     'HEALTH_INSURANCE_URL': {'value': "https://www.nhi.gov.tw/ch/cp-19418-9eefb-2576-1.html", 'desc': '健保署保費負擔金額表網址', 'type': 'text'},
     'DEFAULT_GSHEET_URL': {'value': "請在此貼上您的Google Sheet分享連結", 'desc': '預設請假單來源 (Google Sheet)', 'type': 'text'},
+    'DEPT_CHECKOUT_RULES': {'value': "服務=17:30:00/17:29:59", 'desc': '部門簽退規則 (部門=簽退上限/修正時間，逗號分隔；超過上限時改為修正時間並將加班歸零)', 'type': 'text'},
+    'DEPT_SHIFT_SCHEDULES': {'value': "預設=08:00-17:00;17:30-19:30;19:30-23:59", 'desc': '部門班表 (每行一個：部門=上班-下班;加班1起-迄;加班2起-迄[;加班3起-迄]，未列出的部門使用「預設」)', 'type': 'text_area'},
+    'CHANGE_LOG_RETENTION_DAYS': {'value': '90', 'desc': '資料異動紀錄保留天數', 'type': 'number'},
+    'BACKUP_INTERVAL_HOURS': {'value': '24', 'desc': '自動備份間隔 (小時，0 為停用)', 'type': 'number'},
+    'BACKUP_KEEP_COUNT': {'value': '14', 'desc': '自動備份保留份數', 'type': 'number'},
+    'MAINTENANCE_INTERVAL_HOURS': {'value': '24', 'desc': '資料庫自動維護間隔 (小時，0 為停用)', 'type': 'number'},
+    'MAINTENANCE_QUIET_MINUTES': {'value': '10', 'desc': '自動維護前需閒置的分鐘數 (無人寫入資料)', 'type': 'number'},
 }
 
 def show_page(conn):
     st.header("🔧 系統參數設定")
     
-    tab1, tab2 = st.tabs(["基本工資設定", "通用系統參數"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["基本工資設定", "通用系統參數", "年度資料封存", "備份與還原", "資料庫維護"])
 
     with tab1:
         st.subheader("歷年基本工資管理")
@@ -73,4 +84,108 @@ def show_page(conn):
                 
                 q_config.batch_update_configs(conn, data_to_save)
                 st.success("通用參數已成功儲存！")
-                st.rerun()
\ No newline at end of file
+                st.rerun()
+
+    with tab3:
+        st.subheader("年度資料封存")
+        st.info("將 12 個月薪資皆已定版的過去年度，其出勤、薪資明細與請假紀錄搬移到獨立的年度封存檔 (data/archive/)，"
+                "以維持主資料庫精簡。年度報表與歷史查詢仍會自動讀取封存資料；已封存的年度將無法再修改。")
+
+        registry_df = q_archive.get_archive_registry(conn)
+        if not registry_df.empty:
+            st.markdown("##### 已封存年度")
+            st.dataframe(registry_df.rename(columns={
+                'year': '年度', 'file_name': '封存檔', 'attendance_rows': '出勤筆數',
+                'salary_detail_rows': '薪資明細筆數', 'leave_record_rows': '請假筆數', 'archived_at': '封存時間'
+            }), width='stretch', hide_index=True)
+
+        archivable_years = q_archive.get_archivable_years(conn, datetime.now().year)
+        if not archivable_years:
+            st.caption("目前沒有可封存的年度 (需為今年以前，且 1~12 月薪資皆已定版)。")
+        else:
+            year_to_archive = st.selectbox("選擇要封存的年度", options=archivable_years)
+            counts = q_archive.get_year_row_counts(conn, year_to_archive)
+            st.write(f"將搬移：出勤 {counts['attendance']} 筆、薪資明細 {counts['salary_detail']} 筆、請假 {counts['leave_record']} 筆。")
+            if st.button(f"封存 {year_to_archive} 年資料", type="primary"):
+                with st.spinner(f"正在封存 {year_to_archive} 年的資料..."):
+                    try:
+                        moved = q_archive.archive_year(conn, year_to_archive)
+                        st.success(f"{year_to_archive} 年資料封存完成！共搬移 {sum(moved.values())} 筆紀錄。")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"封存時發生錯誤: {e}")
+
+    with tab4:
+        st.subheader("資料庫備份與還原")
+        interval, keep = backup_logic.get_backup_settings(conn)
+        if interval > 0:
+            st.info(f"系統每 {interval:g} 小時自動備份一次，保留最新 {keep} 份 (可於「通用系統參數」調整)。備份期間不影響其他人使用。")
+        else:
+            st.warning("自動備份目前為停用狀態 (可於「通用系統參數」設定備份間隔)。")
+
+        if st.button("立即備份", type="primary"):
+            progress_bar = st.progress(0, text="正在備份資料庫...")
+
+            def _on_progress(copied, total):
+                progress_bar.progress(min(copied / total, 1.0) if total else 1.0, text=f"正在備份資料庫... ({copied}/{total} 頁)")
+
+            try:
+                backup_path = backup_logic.create_backup(progress_callback=_on_progress, keep=keep)
+                progress_bar.progress(1.0, text="備份完成")
+                st.success(f"備份完成：{backup_path.name}")
+            except Exception as e:
+                st.error(f"備份時發生錯誤: {e}")
+
+        backups_df = backup_logic.list_backups()
+        st.markdown("##### 現有備份")
+        if backups_df.empty:
+            st.caption("目前沒有任何備份。")
+        else:
+            st.dataframe(backups_df.drop(columns=['path']), width='stretch', hide_index=True)
+            selected_name = st.selectbox("選擇備份檔", options=backups_df['檔名'].tolist())
+            selected_path = backups_df.loc[backups_df['檔名'] == selected_name, 'path'].iloc[0]
+
+            with open(selected_path, 'rb') as f:
+                st.download_button("下載此備份", data=f.read(), file_name=selected_name, mime="application/gzip")
+
+            st.markdown("##### 還原")
+            st.warning("還原會以備份內容覆蓋目前所有資料！系統會先檢查備份檔的完整性，並在還原前自動備份目前的資料庫。")
+            confirm = st.checkbox(f"我了解後果，確定要還原至「{selected_name}」")
+            if st.button("執行還原", disabled=not confirm):
+                with st.spinner("正在檢查並還原備份..."):
+                    try:
+                        safety_path = backup_logic.restore_backup(selected_path)
+                        st.success(f"還原完成！還原前的資料已另存為 {safety_path.name}。")
+                    except Exception as e:
+                        st.error(f"還原失敗，目前資料未被變更: {e}")
+
+    with tab5:
+        st.subheader("資料庫維護")
+        interval, quiet = maintenance_logic.get_maintenance_settings(conn)
+        if interval > 0:
+            st.info(f"系統每 {interval:g} 小時、在連續 {quiet:g} 分鐘無人寫入資料時自動執行維護："
+                    "更新查詢統計 (ANALYZE)、回收刪除資料後的空間、整理 WAL 檔並檢查資料庫完整性。")
+        else:
+            st.warning("自動維護目前為停用狀態 (可於「通用系統參數」設定維護間隔)。")
+
+        if st.button("立即執行維護", type="primary"):
+            with st.spinner("正在維護資料庫 (會等待目前的寫入完成)..."):
+                try:
+                    record = maintenance_logic.run_maintenance('manual')
+                    if record['status'] == 'success':
+                        st.success(f"維護完成！耗時 {record['duration_seconds']} 秒，回收 {record['reclaimed_bytes'] / 1024 / 1024:.2f} MB。")
+                    else:
+                        st.error(f"維護未完全成功: {record.get('message') or record.get('integrity_result')}")
+                except Exception as e:
+                    st.error(f"維護時發生錯誤: {e}")
+
+        log_df = q_maint.get_maintenance_log(conn)
+        st.markdown("##### 維護紀錄")
+        if log_df.empty:
+            st.caption("目前沒有任何維護紀錄。")
+        else:
+            for col in ['維護前大小', '維護後大小', '回收空間']:
+                log_df[col] = (log_df[col].fillna(0) / 1024 / 1024).round(2)
+            st.dataframe(log_df.rename(columns={
+                '維護前大小': '維護前(MB)', '維護後大小': '維護後(MB)', '回收空間': '回收(MB)'
+            }), width='stretch', hide_index=True)
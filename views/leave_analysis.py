@@ -8,6 +8,34 @@ from dateutil.relativedelta import relativedelta
 from services import leave_logic as logic_leave
 from db import queries_attendance as q_att
 from db import queries_config as q_config
+from db import queries_import_archive as q_import
+from services import import_archive_logic as import_archive
+
+def _show_leave_check_report(report: dict):
+    """顯示假單核對時略過的假單與行事曆狀態。"""
+    for request_id, reason in report['skipped']:
+        st.warning(f"跳過一筆無法處理的假單。Request ID: {request_id}, 錯誤: {reason}")
+    if report['calendar_messages']:
+        with st.expander("行事曆狀態", expanded=True):
+            for msg in report['calendar_messages']:
+                if "成功" in msg:
+                    st.write(f"✔️ {msg}")
+                else:
+                    st.warning(f"⚠️ {msg}")
+
+def _show_leave_import_report(report: dict):
+    """顯示假單匯入結果 (新增 / 更新 / 未變動) 與各 Request ID 的處理結果。"""
+    st.success(f"匯入完成！新增 {report['inserted']} 筆、更新 {report['updated']} 筆，"
+               f"{report['unchanged']} 筆與資料庫相同已略過。")
+    if report['unmatched']:
+        st.warning(f"以下姓名在員工資料中找不到，相關假單未匯入：{', '.join(report['unmatched'])}")
+    if report['results']:
+        labels = {'inserted': '新增', 'updated': '更新', 'unchanged': '未變動'}
+        with st.expander("各假單處理結果"):
+            st.dataframe(pd.DataFrame({
+                'Request ID': list(report['results'].keys()),
+                '結果': [labels[v] for v in report['results'].values()],
+            }), width='stretch', hide_index=True)
 
 def show_page(conn):
     st.header("🌴 請假紀錄匯入與分析")
@@ -19,7 +47,7 @@ def show_page(conn):
 
         source_type = st.radio(
             "選擇資料來源",
-            ("Google Sheet (建議)", "上傳 Excel 檔案"),
+            ("Google Sheet (建議)", "上傳 Excel 檔案", "從匯入封存重新套用"),
             horizontal=True,
             key="leave_source"
         )
@@ -39,18 +67,40 @@ def show_page(conn):
             c1, c2 = st.columns(2)
             year = c1.number_input("年份", min_value=2020, max_value=today.year + 1, value=default_year)
             month = c2.number_input("月份", min_value=1, max_value=12, value=default_month)
-        else:
+        elif source_type == "上傳 Excel 檔案":
             source_input = st.file_uploader("上傳請假紀錄 Excel/CSV 檔", type=['xlsx', 'csv'])
+        else:
+            source_input = None
+            archive_df = q_import.get_import_archive(conn, 'leave')
+            if archive_df.empty:
+                st.caption("目前沒有已封存的請假檔案。")
+            else:
+                archive_options = {f"{row.imported_at} - {row.file_name}": row.id for row in archive_df.itertuples()}
+                selected_archive = st.selectbox("選擇先前匯入的檔案", options=archive_options.keys(), index=None)
+                if selected_archive:
+                    source_input = import_archive.open_archived_upload(conn, archive_options[selected_archive])
+
+        # 上傳的檔案以內容雜湊值偵測是否已匯入過，在解析前就提示 (從封存重新套用時本來就是匯入過的檔案，不需提示)
+        content_hash, previous, proceed = None, None, True
+        if source_input is not None and source_type == "從匯入封存重新套用":
+            content_hash = import_archive.compute_content_hash(source_input)
+        elif source_input is not None and not isinstance(source_input, str):
+            content_hash, previous = import_archive.find_previous_import(conn, source_input, 'leave')
+            if previous:
+                st.warning(import_archive.describe_import(previous))
+                proceed = st.checkbox("仍要重新解析並匯入此檔案", key="leave_reimport")
 
-        if st.button("讀取並核對時數", key="check_hours_button"):
+        if st.button("讀取並核對時數", key="check_hours_button", disabled=not proceed):
             if not source_input:
                 st.warning("請提供資料來源！")
             else:
                 try:
                     with st.spinner("正在讀取、篩選並核算所有假單..."):
-                        checked_df = logic_leave.process_leave_file(source_input, year=year, month=month)
+                        checked_df, check_report = logic_leave.process_leave_file(conn, source_input, year=year, month=month)
+                    _show_leave_check_report(check_report)
                     
                     st.session_state['leave_check_results'] = checked_df
+                    st.session_state['leave_source_file'] = (source_input, content_hash) if content_hash else None
                     st.success(f"成功讀取並核算了 {len(checked_df)} 筆假單！")
                     
                 except Exception as e:
@@ -59,6 +109,10 @@ def show_page(conn):
                     if 'leave_check_results' in st.session_state:
                         del st.session_state['leave_check_results']
         
+        import_report = st.session_state.pop('leave_import_report', None)
+        if import_report:
+            _show_leave_import_report(import_report)
+
         if 'leave_check_results' in st.session_state and not st.session_state['leave_check_results'].empty:
             st.markdown("---")
             st.subheader("步驟 1: 核對與編輯假單")
@@ -91,10 +145,17 @@ def show_page(conn):
                 try:
                     df_to_import = st.session_state['leave_check_results']
                     with st.spinner("正在寫入資料庫..."):
-                        count = q_att.batch_insert_or_update_leave_records(conn, df_to_import)
-                    st.success(f"成功匯入/更新了 {count} 筆請假紀錄！")
+                        watermark = import_archive.begin_import(conn)
+                        report = q_att.batch_insert_or_update_leave_records(conn, df_to_import)
+                        source_file = st.session_state.get('leave_source_file')
+                        if source_file:
+                            counts = {k: report[k] for k in ('processed', 'inserted', 'updated', 'unchanged')}
+                            import_archive.record_import(conn, source_file[0], 'leave', watermark, counts, source_file[1])
+                    # 重新整理頁面後顯示匯入報告
+                    st.session_state['leave_import_report'] = report
                     # 清除暫存資料
                     del st.session_state['leave_check_results']
+                    st.session_state.pop('leave_source_file', None)
                     st.rerun()
                 except Exception as e:
                     st.error(f"匯入時發生錯誤: {e}")
@@ -3,6 +3,8 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from db import queries_common as q_common
+from db import queries_calendar as q_cal
+from services import calendar_logic
 
 def show_page(conn):
     st.header("🌀 特殊日期管理 (不計薪假)")
@@ -28,7 +30,7 @@ def show_page(conn):
     st.markdown("---")
     
     # 簡化頁籤，移除管理例外人員的功能
-    tab1, tab2 = st.tabs([" ✨ 新增特殊日期", "🗑️ 刪除特殊日期"])
+    tab1, tab2, tab3 = st.tabs([" ✨ 新增特殊日期", "🗑️ 刪除特殊日期", "📆 國定假日行事曆"])
 
     with tab1:
         st.subheader("新增不計薪日期")
@@ -62,4 +64,38 @@ def show_page(conn):
                     st.success("已成功刪除！")
                     st.rerun()
         else:
-            st.info("目前沒有可供刪除的日期。")
\ No newline at end of file
+            st.info("目前沒有可供刪除的日期。")
+
+    with tab3:
+        st.subheader("國定假日行事曆")
+        st.info("請假時數核算會依此行事曆排除國定假日並計入補班日，核算時不需連網。"
+                "資料來源為政府資料開放平臺的「中華民國政府行政機關辦公日曆表」，可直接上傳該 CSV 或線上同步；同一年度重新匯入時會整年覆蓋。")
+
+        summary_df = q_cal.get_calendar_year_summary(conn)
+        if summary_df.empty:
+            st.warning("目前尚未建立任何年度的行事曆，請假時數只會排除週末。")
+        else:
+            st.dataframe(summary_df, width='stretch', hide_index=True)
+            view_year = st.selectbox("檢視年度的放假與補班日", options=summary_df['年度'].tolist())
+            st.dataframe(q_cal.get_calendar_exceptions(conn, int(view_year)), width='stretch', hide_index=True)
+
+        c1, c2 = st.columns(2)
+        with c1:
+            st.markdown("##### 上傳行事曆 CSV")
+            calendar_file = st.file_uploader("上傳辦公日曆表 CSV", type=['csv'], key="calendar_csv")
+            if st.button("匯入行事曆", disabled=calendar_file is None):
+                try:
+                    imported = calendar_logic.import_calendar_file(conn, calendar_file)
+                    st.success("已匯入：" + "、".join(f"{y} 年 {n} 天" for y, n in imported.items()))
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"匯入行事曆失敗: {e}")
+        with c2:
+            st.markdown("##### 線上同步")
+            sync_year = st.number_input("年份", min_value=2017, max_value=datetime.now().year + 1, value=datetime.now().year, key="calendar_sync_year")
+            if st.button("從政府資料開放平臺同步"):
+                with st.spinner(f"正在下載 {sync_year} 年行事曆..."):
+                    try:
+                        st.success(calendar_logic.sync_calendar_year(conn, int(sync_year)))
+                    except Exception as e:
+                        st.error(f"同步失敗: {e}")